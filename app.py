@@ -74,8 +74,8 @@ def create_app(config_name=None):
     
     @login_manager.user_loader
     def load_user(user_id):
-        from models.user import User
-        return db.session.get(User, int(user_id))
+        from utils.user_cache import load_user as load_cached_user  # no query while cached
+        return load_cached_user(int(user_id))
     
     # Security headers middleware
     @app.after_request
@@ -124,12 +124,20 @@ def create_app(config_name=None):
     
     @app.context_processor
     def inject_global_settings():
-        from models.settings import Settings
-        currency_symbol = Settings.get_setting('currency_symbol', '₺')
+        from utils.settings_cache import get_setting  # cached; no query per render
+        currency_symbol = get_setting('currency_symbol', '₺')
         return dict(currency_symbol=currency_symbol)
 
     # Import models for Alembic autogenerate
     from models.categorization_rule import CategorizationRule  # noqa: F401
+    from models.background_job import BackgroundJob  # noqa: F401
+    from models.import_batch import ImportBatch  # noqa: F401
+    from models.category_stats import CategoryStats  # noqa: F401
+    from models.tag_stats import TagStats  # noqa: F401
+    from models.import_preview import ImportPreview, ImportPreviewRow  # noqa: F401
+    import utils.transaction_stats  # noqa: F401  (registers the stats listeners)
+    import utils.settings_cache  # noqa: F401  (registers the settings version listener)
+    import utils.user_cache  # noqa: F401  (registers the user cache listeners)
 
     # Import blueprints
     from routes.cashflow import cashflow_bp
@@ -168,6 +176,14 @@ def create_app(config_name=None):
             # Table might not exist yet (before migrations)
             app.logger.debug(f'Could not check/create admin user: {e}')
     
+    @app.before_request
+    def purge_import_previews():
+        """Drop expired import previews (on the first request, then every few minutes)"""
+        if request.endpoint in ('static', 'health_check'):
+            return
+        from utils.import_preview import purge_expired_previews_periodically
+        purge_expired_previews_periodically()
+
     @app.route('/')
     def index():
         return redirect(url_for('cashflow.dashboard'))
@@ -0,0 +1 @@
+# Benchmarks for the statement import pipeline (python -m benchmarks.import_benchmark)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic bank statements in the real export layouts of each bank
+"""
+
+import io
+import random
+from datetime import date, datetime, timedelta
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+# (description, typical amount) - a mix of descriptions the benchmark rules match and ones they don't
+MERCHANTS = [
+    ('MIGROS KADIKOY', 350), ('A101 MODA', 120), ('BIM MAGAZACILIK', 90), ('CARREFOURSA ATASEHIR', 420),
+    ('SHELL PETROL', 1200), ('OPET AKARYAKIT', 1100), ('ISTANBULKART DOLUM', 200), ('UBER TRIP', 180),
+    ('NETFLIX.COM', 150), ('SPOTIFY', 60), ('TURKCELL FATURA', 300), ('IGDAS DOGALGAZ', 650),
+    ('STARBUCKS BAGDAT CD', 140), ('YEMEKSEPETI', 260), ('TRENDYOL', 780), ('HEPSIBURADA', 940),
+    ('ECZANE SAGLIK', 210), ('MACFIT SPOR', 900), ('THY INTERNET', 3200), ('KIRTASIYE DUNYASI', 75),
+]
+INCOME = [('MAAS ODEMESI', 45000), ('IADE - TRENDYOL', 780), ('HAVALE GELEN', 2500)]
+
+# Share of rows that are income (refunds, salary, transfers)
+INCOME_RATIO = 0.05
+
+
+def format_turkish_amount(amount, income=False):
+    """1234.5 -> '1.234,50 TL' (Yapı Kredi prefixes income with '+')"""
+    text = f'{amount:,.2f}'.replace(',', '_').replace('.', ',').replace('_', '.')
+    return f"{'+' if income else ''}{text} TL"
+
+
+def generate_transactions(rows, seed=0, start=date(2024, 1, 1)):
+    """Yield (date, description, amount, is_income) tuples, reproducible for a seed"""
+    rng = random.Random(seed)
+    for i in range(rows):
+        txn_date = start + timedelta(days=i * 365 // max(rows, 1))
+        income = rng.random() < INCOME_RATIO
+        description, typical = rng.choice(INCOME if income else MERCHANTS)
+        amount = round(typical * rng.uniform(0.5, 1.5), 2)
+        yield txn_date, description, amount, income
+
+
+def _workbook_bytes(write_rows):
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    write_rows(ws)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def yapikredi_statement(rows, seed=0):
+    """
+    Yapı Kredi credit card export: account rows above the header, two
+    previous-period rows after it, dd/mm/YYYY text dates and signed text amounts.
+    """
+    def write_rows(ws):
+        ws.append(['Yapı Kredi Bankası', None, None])
+        ws.append(['Kart No: **** **** **** 1234', None, None])
+        ws.append(['İşlem Tarihi', 'İşlemler', 'Tutar'])
+        ws.append(['01/01/2024', 'Devreden Borç', format_turkish_amount(8250.75)])
+        ws.append(['01/01/2024', 'Asgari Ödeme', format_turkish_amount(2475.23)])
+        for txn_date, description, amount, income in generate_transactions(rows, seed):
+            ws.append([txn_date.strftime('%d/%m/%Y'), description, format_turkish_amount(amount, income)])
+    return _workbook_bytes(write_rows)
+
+
+def kuveytturk_statement(rows, seed=0):
+    """
+    Kuveyt Türk export: real date cells, unsigned amounts, income rows in bold
+    and an undated card info row every 500 rows.
+    """
+    def write_rows(ws):
+        ws.append(['Kuveyt Türk Hesap Hareketleri', None, None])
+        ws.append(['Tarih', 'Açıklama', 'Tutar'])
+        bold = Font(bold=True)
+        for i, (txn_date, description, amount, income) in enumerate(generate_transactions(rows, seed)):
+            if i % 500 == 0:
+                ws.append([None, 'Kart No: **** 5678', None])
+            date_cell = WriteOnlyCell(ws, value=datetime.combine(txn_date, datetime.min.time()))
+            if income:
+                date_cell.font = bold
+            ws.append([date_cell, description, format_turkish_amount(amount)])
+    return _workbook_bytes(write_rows)
+
+
+STATEMENT_GENERATORS = {
+    'yapikredi': yapikredi_statement,
+    'kuveytturk': kuveytturk_statement,
+}
+
+
+def generate_statement(bank_code, rows, seed=0):
+    """Statement file contents (xlsx bytes) for a bank"""
+    return STATEMENT_GENERATORS[bank_code](rows, seed)
@@ -35,6 +35,17 @@ class Config:
     
     # File upload limits
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
+    IMPORT_SPOOL_MAX_SIZE = 4 * 1024 * 1024  # Uploads above 4MB spill to a temp file
+    IMPORT_MAX_UNZIPPED_SIZE = 64 * 1024 * 1024  # Total statement size inside one ZIP
+    # Processes used to parse multi-file imports; 0 parses in the job thread
+    IMPORT_PARSE_WORKERS = int(os.environ.get('IMPORT_PARSE_WORKERS', min(os.cpu_count() or 1, 4)))
+    IMPORT_PREVIEW_TTL = 3600  # Seconds a stored import preview can be paged through
+
+    # Background jobs (imports) - thread pool per gunicorn worker
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOBS_RUN_INLINE = False
+    # Unfinished jobs silent this long are failed when read (their worker went away)
+    JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS', 900))
 
     # Logging
     LOG_LEVEL = 'INFO'
@@ -69,6 +80,8 @@ class TestingConfig(Config):
     SERVER_NAME = 'localhost'
     SESSION_COOKIE_SECURE = False
     LOG_LEVEL = 'WARNING'
+    JOBS_RUN_INLINE = True  # Single shared SQLite connection, run jobs in the request
+    IMPORT_PARSE_WORKERS = 0
 
 config = {
     'development': DevelopmentConfig,
@@ -0,0 +1,37 @@
+"""Add import_preview and import_preview_row for paged import dry runs
+
+Revision ID: 0a47c15816e6
+Revises: a158f6224163
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0a47c15816e6'
+down_revision = 'a158f6224163'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('import_preview',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('summary', sa.JSON(), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_import_preview_created_at', 'import_preview', ['created_at'])
+    op.create_table('import_preview_row',
+    sa.Column('preview_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('data', sa.JSON(), nullable=False),
+    sa.ForeignKeyConstraint(['preview_id'], ['import_preview.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('preview_id', 'position')
+    )
+
+
+def downgrade():
+    op.drop_table('import_preview_row')
+    op.drop_index('ix_import_preview_created_at', table_name='import_preview')
+    op.drop_table('import_preview')
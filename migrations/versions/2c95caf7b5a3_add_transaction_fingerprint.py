@@ -0,0 +1,23 @@
+"""Add fingerprint to cashflow_transaction for duplicate-free re-imports
+
+Revision ID: 2c95caf7b5a3
+Revises: d22554015c95
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '2c95caf7b5a3'
+down_revision = 'd22554015c95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('cashflow_transaction', sa.Column('fingerprint', sa.String(length=64), nullable=True))
+    op.create_index('ix_cashflow_transaction_fingerprint', 'cashflow_transaction', ['fingerprint'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_cashflow_transaction_fingerprint', table_name='cashflow_transaction')
+    op.drop_column('cashflow_transaction', 'fingerprint')
@@ -0,0 +1,46 @@
+"""Add import_batch table and cashflow_transaction.import_batch_id
+
+Revision ID: 4dd36c98e6b7
+Revises: 2c95caf7b5a3
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '4dd36c98e6b7'
+down_revision = '2c95caf7b5a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('import_batch',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('file_name', sa.String(length=255), nullable=True),
+    sa.Column('bank_code', sa.String(length=30), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('total_rows', sa.Integer(), nullable=False),
+    sa.Column('imported_count', sa.Integer(), nullable=False),
+    sa.Column('skipped_count', sa.Integer(), nullable=False),
+    sa.Column('failed_count', sa.Integer(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('parse_ms', sa.Integer(), nullable=True),
+    sa.Column('insert_ms', sa.Integer(), nullable=True),
+    sa.Column('rolled_back_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('cashflow_transaction', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('import_batch_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key(
+            'fk_cashflow_transaction_import_batch_id', 'import_batch', ['import_batch_id'], ['id']
+        )
+        batch_op.create_index('ix_cashflow_transaction_import_batch_id', ['import_batch_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('cashflow_transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_cashflow_transaction_import_batch_id')
+        batch_op.drop_constraint('fk_cashflow_transaction_import_batch_id', type_='foreignkey')
+        batch_op.drop_column('import_batch_id')
+    op.drop_table('import_batch')
@@ -0,0 +1,27 @@
+"""Add amount range and type conditions to categorization_rule
+
+Revision ID: 581d0090f31e
+Revises: c3ddd990d93b
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '581d0090f31e'
+down_revision = 'c3ddd990d93b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('categorization_rule', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('amount_min', sa.Numeric(precision=12, scale=2), nullable=True))
+        batch_op.add_column(sa.Column('amount_max', sa.Numeric(precision=12, scale=2), nullable=True))
+        batch_op.add_column(sa.Column('condition_type', sa.String(length=10), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('categorization_rule', schema=None) as batch_op:
+        batch_op.drop_column('condition_type')
+        batch_op.drop_column('amount_max')
+        batch_op.drop_column('amount_min')
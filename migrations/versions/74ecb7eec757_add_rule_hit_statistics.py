@@ -0,0 +1,29 @@
+"""Add rule hit statistics and import categorization time
+
+Revision ID: 74ecb7eec757
+Revises: 581d0090f31e
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '74ecb7eec757'
+down_revision = '581d0090f31e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('categorization_rule', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('hit_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('last_hit_at', sa.DateTime(), nullable=True))
+    with op.batch_alter_table('import_batch', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('categorize_ms', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('import_batch', schema=None) as batch_op:
+        batch_op.drop_column('categorize_ms')
+    with op.batch_alter_table('categorization_rule', schema=None) as batch_op:
+        batch_op.drop_column('last_hit_at')
+        batch_op.drop_column('hit_count')
@@ -0,0 +1,40 @@
+"""Add tag_stats with per-tag transaction counts and sums
+
+Revision ID: a09f7f7f8adb
+Revises: e272992af3a4
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'a09f7f7f8adb'
+down_revision = 'e272992af3a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('tag_stats',
+    sa.Column('tag_id', sa.Integer(), nullable=False),
+    sa.Column('income_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('expense_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('income_total', sa.Numeric(precision=14, scale=2), server_default='0', nullable=False),
+    sa.Column('expense_total', sa.Numeric(precision=14, scale=2), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['tag_id'], ['tag.id'], ),
+    sa.PrimaryKeyConstraint('tag_id')
+    )
+    op.execute("""
+        INSERT INTO tag_stats (tag_id, income_count, expense_count, income_total, expense_total)
+        SELECT links.tag_id,
+               SUM(CASE WHEN t.type = 'income' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN t.type = 'expense' THEN 1 ELSE 0 END),
+               COALESCE(SUM(CASE WHEN t.type = 'income' THEN t.amount ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN t.type = 'expense' THEN t.amount ELSE 0 END), 0)
+        FROM cashflow_transaction_tags links
+        JOIN cashflow_transaction t ON t.id = links.cashflow_transaction_id
+        GROUP BY links.tag_id
+    """)
+
+
+def downgrade():
+    op.drop_table('tag_stats')
@@ -0,0 +1,23 @@
+"""Add a heartbeat to background jobs
+
+Revision ID: a158f6224163
+Revises: a09f7f7f8adb
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'a158f6224163'
+down_revision = 'a09f7f7f8adb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('background_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('background_job', schema=None) as batch_op:
+        batch_op.drop_column('heartbeat_at')
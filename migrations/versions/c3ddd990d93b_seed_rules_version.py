@@ -0,0 +1,37 @@
+"""Seed the categorization rules version token used by the rule cache
+
+Revision ID: c3ddd990d93b
+Revises: 4dd36c98e6b7
+Create Date: 2026-10-19
+"""
+import uuid
+from datetime import datetime, timezone
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'c3ddd990d93b'
+down_revision = '4dd36c98e6b7'
+branch_labels = None
+depends_on = None
+
+settings = sa.table(
+    'settings',
+    sa.column('key', sa.String),
+    sa.column('value', sa.Text),
+    sa.column('created_at', sa.DateTime),
+    sa.column('updated_at', sa.DateTime),
+)
+
+
+def upgrade():
+    now = datetime.now(timezone.utc)
+    op.bulk_insert(settings, [{
+        'key': 'categorization_rules_version',
+        'value': uuid.uuid4().hex,
+        'created_at': now,
+        'updated_at': now,
+    }])
+
+
+def downgrade():
+    op.execute(settings.delete().where(settings.c.key == 'categorization_rules_version'))
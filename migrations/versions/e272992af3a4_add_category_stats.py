@@ -0,0 +1,39 @@
+"""Add category_stats with per-category transaction counts and sums
+
+Revision ID: e272992af3a4
+Revises: fdf6809fb39d
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'e272992af3a4'
+down_revision = 'fdf6809fb39d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('category_stats',
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('income_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('expense_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('income_total', sa.Numeric(precision=14, scale=2), server_default='0', nullable=False),
+    sa.Column('expense_total', sa.Numeric(precision=14, scale=2), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['category.id'], ),
+    sa.PrimaryKeyConstraint('category_id')
+    )
+    op.execute("""
+        INSERT INTO category_stats (category_id, income_count, expense_count, income_total, expense_total)
+        SELECT category_id,
+               SUM(CASE WHEN type = 'income' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN type = 'expense' THEN 1 ELSE 0 END),
+               COALESCE(SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END), 0)
+        FROM cashflow_transaction
+        GROUP BY category_id
+    """)
+
+
+def downgrade():
+    op.drop_table('category_stats')
@@ -0,0 +1,60 @@
+"""Add cashflow_transaction.description_normalized with a pattern index
+
+Revision ID: fdf6809fb39d
+Revises: 74ecb7eec757
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'fdf6809fb39d'
+down_revision = '74ecb7eec757'
+branch_labels = None
+depends_on = None
+
+# Rows read and written back per backfill batch
+BACKFILL_BATCH_SIZE = 5000
+
+# Same folding as CategorizationRule.normalize(), copied so the migration stays fixed
+_I_VARIANTS = str.maketrans({'İ': 'i', 'ı': 'i', 'I': 'i'})
+
+cashflow_transaction = sa.table(
+    'cashflow_transaction',
+    sa.column('id', sa.Integer),
+    sa.column('description', sa.Text),
+    sa.column('description_normalized', sa.Text),
+)
+
+
+def upgrade():
+    op.add_column('cashflow_transaction', sa.Column('description_normalized', sa.Text(), nullable=True))
+
+    connection = op.get_bind()
+    update = cashflow_transaction.update().where(
+        cashflow_transaction.c.id == sa.bindparam('row_id')
+    ).values(description_normalized=sa.bindparam('normalized'))
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(cashflow_transaction.c.id, cashflow_transaction.c.description)
+            .where(cashflow_transaction.c.id > last_id, cashflow_transaction.c.description.isnot(None))
+            .order_by(cashflow_transaction.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(update, [
+            {'row_id': row.id, 'normalized': row.description.translate(_I_VARIANTS).lower()}
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+    op.create_index(
+        'ix_cashflow_transaction_description_normalized', 'cashflow_transaction', ['description_normalized'],
+        postgresql_ops={'description_normalized': 'text_pattern_ops'},
+    )
+
+
+def downgrade():
+    op.drop_index('ix_cashflow_transaction_description_normalized', table_name='cashflow_transaction')
+    op.drop_column('cashflow_transaction', 'description_normalized')
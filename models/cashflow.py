@@ -1,5 +1,9 @@
 from models import db
+from sqlalchemy.orm import validates
+from models.categorization_rule import CategorizationRule
 from datetime import datetime, date
+from decimal import Decimal
+import hashlib
 
 # CashflowTransaction-Tag relationship table
 cashflow_transaction_tags = db.Table('cashflow_transaction_tags',
@@ -15,6 +19,35 @@ class CashflowTransaction(db.Model):
     type = db.Column(db.String(10), nullable=False)  # 'income' or 'expense'
     amount = db.Column(db.Numeric(12, 2), nullable=False)
     description = db.Column(db.Text)
+    description_normalized = db.Column(db.Text)  # CategorizationRule.normalize(description), kept in sync on write
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
     source = db.Column(db.String(20), default='manual')  # 'manual' / 'excel_import'
-    tags = db.relationship('Tag', secondary='cashflow_transaction_tags', back_populates='transactions')
\ No newline at end of file
+    fingerprint = db.Column(db.String(64), nullable=True, unique=True, index=True)  # imported rows only
+    import_batch_id = db.Column(db.Integer, db.ForeignKey('import_batch.id'), nullable=True, index=True)
+    tags = db.relationship('Tag', secondary='cashflow_transaction_tags', back_populates='transactions')
+
+    __table_args__ = (
+        # text_pattern_ops lets PostgreSQL use the index for LIKE 'prefix%' regardless of collation
+        db.Index('ix_cashflow_transaction_description_normalized', 'description_normalized',
+                 postgresql_ops={'description_normalized': 'text_pattern_ops'}),
+    )
+
+    @validates('description')
+    def _normalize_description(self, key, description):
+        self.description_normalized = CategorizationRule.normalize(description) if description is not None else None
+        return description
+
+    @staticmethod
+    def make_fingerprint(bank_code, txn_date, amount, txn_type, description, occurrence=0):
+        """Stable identity of an imported statement row.
+
+        Built from the bank, date, signed amount and normalized description.
+        occurrence numbers identical rows within one statement so that two
+        genuine same-day purchases are not collapsed into one.
+        """
+        signed = Decimal(str(amount)).copy_abs().quantize(Decimal('0.01'))
+        if txn_type == 'expense':
+            signed = -signed
+        normalized = ' '.join(CategorizationRule.normalize(description or '').split())
+        key = f'{bank_code}|{txn_date.isoformat()}|{signed}|{normalized}|{occurrence}'
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
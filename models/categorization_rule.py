@@ -1,5 +1,9 @@
+import re
 from models import db
 
+# I-variants folded to 'i' before lower(); one translate pass instead of chained replaces
+_I_VARIANTS = str.maketrans({'İ': 'i', 'ı': 'i', 'I': 'i'})
+
 # Many-to-many association table for CategorizationRule <-> Tag
 categorization_rule_tags = db.Table('categorization_rule_tags',
     db.Column('categorization_rule_id', db.Integer, db.ForeignKey('categorization_rule.id'), primary_key=True),
@@ -17,13 +21,22 @@ class CategorizationRule(db.Model):
 
     # Condition
     field = db.Column(db.String(20), nullable=False, default='description')
-    operator = db.Column(db.String(20), nullable=False)  # contains, equals, starts_with, ends_with
-    value = db.Column(db.String(255), nullable=False)
+    operator = db.Column(db.String(20), nullable=False)  # contains, equals, starts_with, ends_with, regex
+    value = db.Column(db.String(255), nullable=False)  # normalized, except regex patterns which are kept as written
+
+    # Optional extra conditions, all of which must hold
+    amount_min = db.Column(db.Numeric(12, 2), nullable=True)  # on the unsigned amount
+    amount_max = db.Column(db.Numeric(12, 2), nullable=True)
+    condition_type = db.Column(db.String(10), nullable=True)  # income, expense, or NULL (type read from the file)
 
     # Actions
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
     type_override = db.Column(db.String(10), nullable=True)  # income, expense, or NULL
 
+    # Statistics, updated in bulk after each import (see utils.rule_stats)
+    hit_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_hit_at = db.Column(db.DateTime, nullable=True)
+
     # Relationships
     category = db.relationship('Category', backref='categorization_rules')
     tags = db.relationship('Tag', secondary='categorization_rule_tags', backref='categorization_rules')
@@ -35,13 +48,33 @@ class CategorizationRule(db.Model):
         Maps all I-variants (I, İ, ı) to 'i' so that MIGROS, Migros, MİGROS
         all match consistently. Other Turkish chars handled by standard lower().
         """
-        result = text.replace('İ', 'i').replace('ı', 'i').replace('I', 'i')
-        return result.lower()
+        return text.translate(_I_VARIANTS).lower()
+
+    @staticmethod
+    def compile_pattern(pattern):
+        """Compile a regex rule value; patterns match the normalized description case-insensitively"""
+        return re.compile(pattern, re.IGNORECASE)
+
+    def conditions_match(self, amount=None, txn_type=None):
+        """Check the amount range and type conditions; rules without them always pass"""
+        if self.condition_type and txn_type != self.condition_type:
+            return False
+        if self.amount_min is not None or self.amount_max is not None:
+            if amount is None:
+                return False
+            amount = abs(float(amount))
+            if self.amount_min is not None and amount < float(self.amount_min):
+                return False
+            if self.amount_max is not None and amount > float(self.amount_max):
+                return False
+        return True
 
-    def matches(self, description):
-        """Match description against the rule. Value is already normalized in DB."""
+    def matches(self, description, amount=None, txn_type=None):
+        """Match a transaction against the rule. Value is already normalized in DB."""
         if not description:
             return False
+        if not self.conditions_match(amount, txn_type):
+            return False
         desc = self.normalize(description)
         val = self.value  # already normalized at save time
         if self.operator == 'contains':
@@ -52,4 +85,9 @@ class CategorizationRule(db.Model):
             return desc.startswith(val)
         elif self.operator == 'ends_with':
             return desc.endswith(val)
+        elif self.operator == 'regex':
+            try:
+                return self.compile_pattern(val).search(desc) is not None
+            except re.error:
+                return False
         return False
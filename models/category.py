@@ -1,5 +1,7 @@
 from models import db
 from sqlalchemy import func
+from sqlalchemy.orm.attributes import set_committed_value
+from models.category_stats import CategoryStats
 
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -10,20 +12,43 @@ class Category(db.Model):
     subcategories = db.relationship('Category', backref=db.backref('parent', remote_side=[id]))
     transactions = db.relationship('CashflowTransaction', backref='category', lazy=True)
     
+    @classmethod
+    def load_tree(cls):
+        """
+        Top-level categories with subcategories and parent populated from one
+        SELECT, so templates can walk the tree without lazy loads.
+        """
+        categories = cls.query.order_by(cls.id).all()
+        by_id = {category.id: category for category in categories}
+        children = {category.id: [] for category in categories}
+        for category in categories:
+            if category.parent_id in children:
+                children[category.parent_id].append(category)
+        for category in categories:
+            set_committed_value(category, 'subcategories', children[category.id])
+            set_committed_value(category, 'parent', by_id.get(category.parent_id))
+        return [category for category in categories if category.parent_id is None]
+
+    def _subtree_ids(self):
+        ids = [self.id]
+        for subcategory in self.subcategories:
+            ids.extend(subcategory._subtree_ids())
+        return ids
+
+    def _stats_count(self, column):
+        """Sum of a category_stats count over this category and its subcategories"""
+        return db.session.query(func.coalesce(func.sum(column), 0)).filter(
+            CategoryStats.category_id.in_(self._subtree_ids())
+        ).scalar()
+
     def get_all_transactions_count(self):
         return self.get_income_count() + self.get_expense_count()
 
     def get_income_count(self):
-        count = len([t for t in self.transactions if t.type == 'income'])
-        for subcategory in self.subcategories:
-            count += subcategory.get_income_count()
-        return count
+        return self._stats_count(CategoryStats.income_count)
 
     def get_expense_count(self):
-        count = len([t for t in self.transactions if t.type == 'expense'])
-        for subcategory in self.subcategories:
-            count += subcategory.get_expense_count()
-        return count
+        return self._stats_count(CategoryStats.expense_count)
 
     def is_parent(self):
         return self.parent_id is None
@@ -0,0 +1,20 @@
+from models import db
+
+
+class CategoryStats(db.Model):
+    """Running income/expense counts and sums of the transactions filed directly under a category.
+
+    Maintained in the same transaction as every write to cashflow_transaction
+    (see utils.transaction_stats), so pages can read totals without scanning
+    the transaction table. Parent totals are rolled up from their subcategories.
+    """
+    __tablename__ = 'category_stats'
+
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), primary_key=True)
+    income_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    expense_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    income_total = db.Column(db.Numeric(14, 2), nullable=False, default=0, server_default='0')
+    expense_total = db.Column(db.Numeric(14, 2), nullable=False, default=0, server_default='0')
+
+    def __repr__(self):
+        return f'<CategoryStats {self.category_id}: {self.income_count} income, {self.expense_count} expense>'
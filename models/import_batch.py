@@ -0,0 +1,35 @@
+from models import db
+from datetime import datetime, timezone
+
+
+class ImportBatch(db.Model):
+    """One imported statement file; its transactions can be rolled back together"""
+    __tablename__ = 'import_batch'
+
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    ROLLED_BACK = 'rolled_back'
+
+    id = db.Column(db.Integer, primary_key=True)
+    file_name = db.Column(db.String(255), nullable=True)
+    bank_code = db.Column(db.String(30), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=RUNNING)
+
+    # Row counts
+    total_rows = db.Column(db.Integer, nullable=False, default=0)  # parsed transactions
+    imported_count = db.Column(db.Integer, nullable=False, default=0)
+    skipped_count = db.Column(db.Integer, nullable=False, default=0)  # duplicates
+    failed_count = db.Column(db.Integer, nullable=False, default=0)  # unparseable rows
+
+    # Timings
+    started_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    finished_at = db.Column(db.DateTime, nullable=True)
+    parse_ms = db.Column(db.Integer, nullable=True)
+    categorize_ms = db.Column(db.Integer, nullable=True)  # rule matching, shared by the files of one import
+    insert_ms = db.Column(db.Integer, nullable=True)
+    rolled_back_at = db.Column(db.DateTime, nullable=True)
+
+    transactions = db.relationship('CashflowTransaction', backref='import_batch', lazy='dynamic')
+
+    def __repr__(self):
+        return f'<ImportBatch {self.id} {self.file_name}: {self.status}>'
@@ -0,0 +1,27 @@
+from models import db
+from datetime import datetime, timezone
+
+
+class ImportPreview(db.Model):
+    """Dry-run result of an import, paged through without parsing the upload again"""
+    __tablename__ = 'import_preview'
+
+    id = db.Column(db.Integer, primary_key=True)
+    summary = db.Column(db.JSON, nullable=False)
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+
+    def __repr__(self):
+        return f'<ImportPreview {self.id}: {self.row_count} rows>'
+
+
+class ImportPreviewRow(db.Model):
+    """One rendered preview row; (preview_id, position) lets a page read only its own rows"""
+    __tablename__ = 'import_preview_row'
+
+    preview_id = db.Column(db.Integer, db.ForeignKey('import_preview.id', ondelete='CASCADE'), primary_key=True)
+    position = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    data = db.Column(db.JSON, nullable=False)
+
+    def __repr__(self):
+        return f'<ImportPreviewRow {self.preview_id}#{self.position}>'
@@ -1,13 +1,17 @@
 from models import db
 from models.cashflow import CashflowTransaction # Import CashflowTransaction model
+from models.tag_stats import TagStats
 
 class Tag(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), nullable=False, unique=True)
     transactions = db.relationship('CashflowTransaction', secondary='cashflow_transaction_tags', back_populates='tags')
 
+    def _stats_count(self, column):
+        return db.session.query(column).filter(TagStats.tag_id == self.id).scalar() or 0
+
     def get_income_count(self):
-        return len([t for t in self.transactions if t.type == 'income'])
+        return self._stats_count(TagStats.income_count)
 
     def get_expense_count(self):
-        return len([t for t in self.transactions if t.type == 'expense']) 
\ No newline at end of file
+        return self._stats_count(TagStats.expense_count) 
\ No newline at end of file
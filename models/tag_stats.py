@@ -0,0 +1,19 @@
+from models import db
+
+
+class TagStats(db.Model):
+    """Running income/expense counts and sums of the transactions carrying a tag.
+
+    Maintained in the same transaction as every change to transactions and
+    their tag links (see utils.transaction_stats).
+    """
+    __tablename__ = 'tag_stats'
+
+    tag_id = db.Column(db.Integer, db.ForeignKey('tag.id'), primary_key=True)
+    income_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    expense_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    income_total = db.Column(db.Numeric(14, 2), nullable=False, default=0, server_default='0')
+    expense_total = db.Column(db.Numeric(14, 2), nullable=False, default=0, server_default='0')
+
+    def __repr__(self):
+        return f'<TagStats {self.tag_id}: {self.income_count} income, {self.expense_count} expense>'
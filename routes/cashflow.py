@@ -1,25 +1,34 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, Response
 from datetime import datetime, date, timedelta
 from dateutil.relativedelta import relativedelta
 from sqlalchemy import func, extract, case
 from sqlalchemy.orm import joinedload
 from models import db
 from models.cashflow import CashflowTransaction
+from models.categorization_rule import CategorizationRule
 from models.category import Category
 from models.tag import Tag
+from models.background_job import BackgroundJob
+from models.import_batch import ImportBatch
+import json
 import logging
-import os
+import math
+import shutil
 import tempfile
-from werkzeug.utils import secure_filename
-from utils.bank_configs import get_bank_config
-from utils.excel_processor import process_excel_data, ExcelImportError
+from utils.importer import run_import, preview_import, rollback_import_batch, STATEMENT_EXTENSIONS
+from utils.jobs import JobError, submit_job, load_job
+from utils.import_preview import store_preview, load_preview_page
+from utils.bank_configs import BANK_CONFIGS
 
 logger = logging.getLogger(__name__)
 
 cashflow_bp = Blueprint('cashflow', __name__, url_prefix='/cashflow')
 
-UPLOAD_FOLDER = tempfile.gettempdir()
-ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'csv'}
+ALLOWED_EXTENSIONS = STATEMENT_EXTENSIONS | {'zip'}
+IMPORT_HISTORY_LIMIT = 20
+PREVIEW_PER_PAGE = 100
+AUTO_DETECT_BANK = 'auto'
+PREVIEW_MAX_PER_PAGE = 1000
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -243,7 +252,9 @@ def index():
     query = CashflowTransaction.query
 
     if search:
-        query = query.filter(CashflowTransaction.description.ilike(f'%{search}%'))
+        query = query.filter(CashflowTransaction.description_normalized.contains(
+            CategorizationRule.normalize(search), autoescape=True
+        ))
 
     if category_id:
         # Include subcategories as well
@@ -291,9 +302,7 @@ def index():
     )
 
     # Get all categories and tags for filter dropdowns
-    categories = Category.query.filter_by(parent_id=None).options(
-        joinedload(Category.subcategories)
-    ).all()
+    categories = Category.load_tree()
     tags = Tag.query.all()
 
     return render_template('cashflow/index.html',
@@ -348,7 +357,7 @@ def add_cashflow():
             flash('Something went wrong. Please try again.', 'error')
         return redirect(url_for('cashflow.index'))
 
-    categories = Category.query.filter_by(parent_id=None).all()
+    categories = Category.load_tree()
     tags = Tag.query.all()
     today = datetime.now().strftime('%Y-%m-%d')
     return render_template('cashflow/form.html', categories=categories, tags=tags, today=today)
@@ -374,7 +383,7 @@ def edit_cashflow(id):
             flash('Something went wrong. Please try again.', 'error')
         return redirect(url_for('cashflow.index'))
 
-    categories = Category.query.filter_by(parent_id=None).all()
+    categories = Category.load_tree()
     tags = Tag.query.all()
     return render_template('cashflow/form.html', transaction=transaction, categories=categories, tags=tags)
 
@@ -391,130 +400,235 @@ def delete_cashflow(id):
         flash('Something went wrong. Please try again.', 'error')
     return redirect(url_for('cashflow.index'))
 
+def _flash_import_result(result):
+    """Flash the summary of a finished import job"""
+    success_msg = f'{result["imported"]} transactions imported successfully.'
+    if result.get('skipped', 0) > 0:
+        success_msg += f' {result["skipped"]} duplicates skipped.'
+    if result.get('failed', 0) > 0:
+        success_msg += f' {result["failed"]} transactions failed.'
+    flash(success_msg, 'success')
+
+    # Per-file summary for multi-file and ZIP imports
+    files = result.get('files', [])
+    if len(files) > 1:
+        file_details = [
+            f"{file['file_name']}: {file['error']}" if 'error' in file
+            else f"{file['file_name']}: {file['imported']} imported, {file['skipped']} skipped, {file['failed']} failed"
+            for file in files
+        ]
+        flash('Files: ' + '; '.join(file_details), 'info')
+
+    # Show errors if any
+    if result.get('errors'):
+        error_details = [
+            f"{error['file']} row {error['row']}: {error['error']}" if 'file' in error
+            else f"Row {error['row']}: {error['error']}"
+            for error in result['errors']
+        ]
+        flash('Errors: ' + '; '.join(error_details), 'warning')
+
+
+def _close_uploads(uploads):
+    for _, upload in uploads:
+        upload.close()
+
+
+def _read_import_upload():
+    """
+    Validate the import form and buffer its files.
+    Returns (uploads, bank_code, error); uploads are (filename, file) pairs
+    owned by the caller.
+    """
+    files = [file for file in request.files.getlist('excel_file') if file.filename]
+    if not files:
+        return None, None, 'Please select an Excel file.'
+
+    if not all(allowed_file(file.filename) for file in files):
+        return None, None, 'Only Excel files (.xlsx, .xls, .csv) or ZIP archives of them are supported.'
+
+    bank_code = request.form.get('bank_code')
+    if not bank_code:
+        return None, None, 'Please select a bank.'
+    if bank_code == AUTO_DETECT_BANK:
+        bank_code = None  # detected per file from its header row
+
+    # Buffer each upload in memory, spilling to an anonymous temp file only
+    # when it is large; the buffers outlive the request when handed to a job
+    uploads = []
+    try:
+        for file in files:
+            upload = tempfile.SpooledTemporaryFile(max_size=current_app.config['IMPORT_SPOOL_MAX_SIZE'])
+            uploads.append((file.filename, upload))
+            shutil.copyfileobj(file.stream, upload)
+            upload.seek(0)
+    except Exception:
+        _close_uploads(uploads)
+        raise
+    return uploads, bank_code, None
+
+
+def _preview_row(row, category_names, tag_names):
+    return {
+        'file_name': row['file_name'],
+        'date': row['date'].isoformat(),
+        'type': row['type'],
+        'amount': f"{row['amount']:.2f}",
+        'description': row['description'],
+        'category': category_names.get(row['category_id']),
+        'tags': [tag_names[tag_id] for tag_id in row['tag_ids'] if tag_id in tag_names],
+        'rule_id': row['rule_id'],
+        'duplicate': row['duplicate'],
+    }
+
+
+def _stream_preview(summary, page_rows):
+    """JSON body written row by row, so large pages are never built as one string"""
+    yield '{"summary": ' + json.dumps(summary) + ', "rows": ['
+    for i, row in enumerate(page_rows):
+        yield (', ' if i else '') + json.dumps(row)
+    yield ']}'
+
+
+def _preview_page_args(values):
+    page = max(values.get('page', 1, type=int), 1)
+    per_page = min(max(values.get('per_page', PREVIEW_PER_PAGE, type=int), 1), PREVIEW_MAX_PER_PAGE)
+    return page, per_page
+
+
+def _preview_page_response(preview_id, summary, row_count, page_rows, page, per_page):
+    summary = dict(summary, page=page, per_page=per_page, pages=math.ceil(row_count / per_page),
+                   preview_url=url_for('cashflow.import_preview_page', preview_id=preview_id))
+    return Response(_stream_preview(summary, page_rows), mimetype='application/json')
+
+
+def _render_import_page(job=None):
+    """Import form with the recent import history"""
+    batches = ImportBatch.query.order_by(ImportBatch.id.desc()).limit(IMPORT_HISTORY_LIMIT).all()
+    return render_template('cashflow/import.html', job=job, batches=batches, banks=BANK_CONFIGS)
+
+
 @cashflow_bp.route('/import', methods=['GET', 'POST'])
 def import_excel():
     """Import transactions from Excel file"""
     
     if request.method == 'GET':
-        return render_template('cashflow/import.html')
+        job = None
+        job_id = request.args.get('job_id', type=int)
+        if job_id:
+            job = load_job(job_id)
+        return _render_import_page(job)
     
     try:
-        # File check
-        if 'excel_file' not in request.files:
-            flash('Please select an Excel file.', 'error')
-            return render_template('cashflow/import.html')
-        
-        file = request.files['excel_file']
-        
-        if file.filename == '':
-            flash('Please select an Excel file.', 'error')
-            return render_template('cashflow/import.html')
-        
-        if not allowed_file(file.filename):
-            flash('Only Excel files (.xlsx, .xls, .csv) are supported.', 'error')
-            return render_template('cashflow/import.html')
-        
-        # Bank selection check
-        bank_code = request.form.get('bank_code')
-        if not bank_code:
-            flash('Please select a bank.', 'error')
-            return render_template('cashflow/import.html')
-        
-        # Create temporary file
-        filename = secure_filename(file.filename)
-        temp_path = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(temp_path)
-        
+        uploads, bank_code, error = _read_import_upload()
+        if error:
+            flash(error, 'error')
+            return _render_import_page()
         try:
-            # Process Excel directly
-            result = process_excel_data(temp_path, bank_code)
-            
-            # Save transactions to database
-            saved_count = 0
-            
-            # Create/find default category (Import)
-            import_category = Category.query.filter_by(name='Import').first()
-            if not import_category:
-                import_category = Category(name='Import')
-                db.session.add(import_category)
-                db.session.flush()  # Get ID
-            
-            # Create/find tag for selected bank
-            bank_config = get_bank_config(bank_code)
-            bank_tag = Tag.query.filter_by(name=bank_config['name']).first()
-            if not bank_tag:
-                bank_tag = Tag(name=bank_config['name'])
-                db.session.add(bank_tag)
-                db.session.flush()  # Get ID
-            
-            # Load active categorization rules for auto-categorization
-            from models.categorization_rule import CategorizationRule
-            active_rules = CategorizationRule.query.filter_by(is_active=True).order_by(
-                CategorizationRule.priority.asc()
-            ).all()
-
-            for transaction_data in result['transactions']:
-                try:
-                    # Apply categorization rules (first match wins)
-                    matched_category_id = import_category.id
-                    matched_tags = [bank_tag]
-                    matched_type = transaction_data['type']
-
-                    for rule in active_rules:
-                        if rule.matches(transaction_data.get('description', '')):
-                            matched_category_id = rule.category_id
-                            matched_tags = [bank_tag] + list(rule.tags)
-                            if rule.type_override:
-                                matched_type = rule.type_override
-                            break
-
-                    transaction = CashflowTransaction(
-                        date=transaction_data['date'],
-                        amount=abs(transaction_data['amount']),
-                        type=matched_type,
-                        category_id=matched_category_id,
-                        description=transaction_data['description'],
-                        source='excel_import',
-                        tags=matched_tags,
-                    )
-                    
-                    db.session.add(transaction)
-                    saved_count += 1
-                    
-                except Exception as e:
-                    logger.error(f"Error saving transaction: {str(e)}")
-                    continue
-            
-            db.session.commit()
-            
-            # Success message
-            success_msg = f'{saved_count} transactions imported successfully.'
-            if result.get('failed', 0) > 0:
-                success_msg += f' {result["failed"]} transactions failed.'
-            flash(success_msg, 'success')
-            
-            # Show errors if any
-            if result.get('errors'):
-                error_details = []
-                for error in result['errors'][:5]:  # Show first 5 errors
-                    error_details.append(f"Row {error['row']}: {error['error']}")
-                flash('Errors: ' + '; '.join(error_details), 'warning')
-            
-        finally:
-            # Remove temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-        
-        return redirect(url_for('cashflow.index'))
+            job = submit_job('import', run_import, uploads, bank_code)
+        except Exception:
+            _close_uploads(uploads)
+            raise
+
+        if job.status == BackgroundJob.COMPLETED:
+            _flash_import_result(job.result)
+            return redirect(url_for('cashflow.index'))
+        if job.status == BackgroundJob.FAILED:
+            flash(job.message, 'error')
+            return _render_import_page()
+
+        flash('Import started. You can follow its progress here.', 'info')
+        return redirect(url_for('cashflow.import_excel', job_id=job.id))
     
-    except ExcelImportError as e:
-        logger.error(f"ExcelImportError: {str(e)}")
-        flash(f'Excel import error: {str(e)}', 'error')
     except Exception as e:
         logger.error(f'Import error: {str(e)}', exc_info=True)
         flash('Something unexpected happened. Please try again.', 'error')
     
-    return render_template('cashflow/import.html')
+    return _render_import_page()
+
+
+@cashflow_bp.route('/import/preview', methods=['POST'])
+def import_preview():
+    """
+    Dry-run an import: proposed rows and per-rule match counts, paginated.
+    Nothing is imported; the upload is parsed once and the rendered rows are
+    stored as an import preview that later pages are read from.
+    """
+    page, per_page = _preview_page_args(request.form)
+
+    try:
+        uploads, bank_code, error = _read_import_upload()
+        if error:
+            return jsonify({'error': error}), 400
+
+        try:
+            summary, rows = preview_import(uploads, bank_code)
+        except JobError as e:
+            return jsonify({'error': str(e)}), 400
+
+        category_ids = {row['category_id'] for row in rows}
+        tag_ids = {tag_id for row in rows for tag_id in row['tag_ids']}
+        category_names = dict(db.session.query(Category.id, Category.name).filter(Category.id.in_(category_ids)).all())
+        tag_names = dict(db.session.query(Tag.id, Tag.name).filter(Tag.id.in_(tag_ids)).all())
+        rows = [_preview_row(row, category_names, tag_names) for row in rows]
+
+        # Discard anything categorization flushed before storing the preview
+        db.session.rollback()
+        preview = store_preview(summary, rows)
+        db.session.commit()
+        preview_id = preview.id
+    except Exception as e:
+        logger.error(f'Import preview error: {str(e)}', exc_info=True)
+        return jsonify({'error': 'Something unexpected happened. Please try again.'}), 500
+    finally:
+        # Release the connection before the body is streamed
+        db.session.rollback()
+        db.session.close()
+
+    page_rows = rows[(page - 1) * per_page:page * per_page]
+    return _preview_page_response(preview_id, summary, len(rows), page_rows, page, per_page)
+
+
+@cashflow_bp.route('/import/preview/<int:preview_id>')
+def import_preview_page(preview_id):
+    """Another page of a stored import preview, without re-parsing the upload"""
+    page, per_page = _preview_page_args(request.args)
+    loaded = load_preview_page(preview_id, page, per_page)
+    if loaded is None:
+        return jsonify({'error': 'Preview expired. Please preview the file again.'}), 404
+
+    preview, page_rows = loaded
+    summary, row_count = preview.summary, preview.row_count
+    db.session.close()
+    return _preview_page_response(preview_id, summary, row_count, page_rows, page, per_page)
+
+
+@cashflow_bp.route('/import/<int:job_id>')
+def import_status(job_id):
+    """Status of a background import job"""
+    job = load_job(job_id)
+    if not job or job.kind != 'import':
+        return jsonify({'error': 'Import not found'}), 404
+    return jsonify(job.to_dict())
+
+
+@cashflow_bp.route('/import/batches/<int:batch_id>/rollback', methods=['POST'])
+def rollback_import(batch_id):
+    """Undo an import by deleting all of its transactions"""
+    batch = db.get_or_404(ImportBatch, batch_id)
+    if batch.status != ImportBatch.COMPLETED:
+        flash('This import has already been undone.', 'error')
+        return redirect(url_for('cashflow.import_excel'))
+
+    try:
+        removed = rollback_import_batch(batch)
+        db.session.commit()
+        flash(f'Import undone. {removed} transactions removed.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f'Error rolling back import batch {batch_id}: {str(e)}')
+        flash('Something went wrong. Please try again.', 'error')
+    return redirect(url_for('cashflow.import_excel'))
 
 
 @cashflow_bp.route('/bulk-edit', methods=['POST'])
@@ -1,16 +1,71 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response
+from sqlalchemy import update, case
 from sqlalchemy.orm import joinedload
 from models import db
 from models.categorization_rule import CategorizationRule
+from models.cashflow import CashflowTransaction
 from models.category import Category
 from models.tag import Tag
+from models.background_job import BackgroundJob
+from models.import_batch import ImportBatch
+from utils.jobs import submit_job, load_job
+from utils.recategorize import reapply_rules, rule_filter
+from utils.rule_cache import bump_rules_version
+from utils.rule_analysis import analyze_rules, ANALYZE_DEFAULT_LIMIT, ANALYZE_MAX_LIMIT
+from utils.rule_transfer import export_rules, import_rules, RuleImportError
+from datetime import date
+from decimal import Decimal, InvalidOperation
+import json
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
 categorization_rule_bp = Blueprint('categorization_rule', __name__, url_prefix='/rules')
 
-VALID_OPERATORS = ['contains', 'equals', 'starts_with', 'ends_with']
+VALID_OPERATORS = ['contains', 'equals', 'starts_with', 'ends_with', 'regex']
+
+
+def _parse_amount(raw):
+    """Optional non-negative amount from the form; raises ValueError if invalid"""
+    raw = (raw or '').strip().replace(',', '.')
+    if not raw:
+        return None
+    try:
+        amount = Decimal(raw)
+    except InvalidOperation:
+        raise ValueError(raw)
+    if not amount.is_finite() or amount < 0:
+        raise ValueError(raw)
+    return amount.quantize(Decimal('0.01'))
+
+
+def _read_rule_conditions(form, operator):
+    """
+    Read the rule value and its extra conditions from the form.
+    Returns (value, amount_min, amount_max, condition_type, error).
+    """
+    value = form.get('value', '').strip()
+    if operator == 'regex':
+        try:
+            CategorizationRule.compile_pattern(value)
+        except re.error as e:
+            return value, None, None, None, f'Invalid regular expression: {e}'
+    else:
+        value = CategorizationRule.normalize(value)
+
+    try:
+        amount_min = _parse_amount(form.get('amount_min'))
+        amount_max = _parse_amount(form.get('amount_max'))
+    except ValueError:
+        return value, None, None, None, 'Amounts must be positive numbers.'
+    if amount_min is not None and amount_max is not None and amount_min > amount_max:
+        return value, None, None, None, 'The minimum amount cannot be greater than the maximum.'
+
+    condition_type = form.get('condition_type') or None
+    if condition_type not in ('income', 'expense'):
+        condition_type = None
+    return value, amount_min, amount_max, condition_type, None
 
 
 @categorization_rule_bp.route('/')
@@ -19,7 +74,89 @@ def index():
         joinedload(CategorizationRule.tags),
         joinedload(CategorizationRule.category),
     ).all()
-    return render_template('categorization_rule/index.html', rules=rules)
+    job = None
+    job_id = request.args.get('job_id', type=int)
+    if job_id:
+        job = load_job(job_id)
+    categories = Category.query.order_by(Category.name).all()
+    last_import = ImportBatch.query.filter(ImportBatch.categorize_ms.isnot(None)).order_by(
+        ImportBatch.id.desc()
+    ).first()
+    return render_template('categorization_rule/index.html', rules=rules, job=job, categories=categories,
+                           last_import=last_import)
+
+
+def _flash_reapply_result(result):
+    """Flash the summary of a finished re-apply job"""
+    if result['dry_run']:
+        flash(f"{result['changed']} of {result['total']} transactions would be re-categorized.", 'info')
+    else:
+        flash(f"{result['changed']} transactions re-categorized.", 'success')
+    if result['rules']:
+        details = [f"{item['rule']}: {item['count']}" for item in result['rules']]
+        flash('By rule: ' + '; '.join(details), 'info')
+
+
+@categorization_rule_bp.route('/reapply', methods=['POST'])
+def reapply():
+    """Re-run the active rules over existing transactions (or count what would change)"""
+    scope = request.form.get('scope', 'import')
+    date_from = request.form.get('date_from') or None
+    date_to = request.form.get('date_to') or None
+    dry_run = request.form.get('action') == 'preview'
+
+    if scope == 'all':
+        category_id = None
+    elif scope == 'import':
+        category_id = 'import'
+    else:
+        category_id = scope if scope.isdigit() and db.session.get(Category, int(scope)) else False
+    try:
+        for value in (date_from, date_to):
+            if value:
+                date.fromisoformat(value)
+    except ValueError:
+        category_id = False
+    if category_id is False:
+        flash('Please choose valid transactions to re-categorize.', 'error')
+        return redirect(url_for('categorization_rule.index'))
+
+    try:
+        job = submit_job('reapply_rules', reapply_rules, category_id=category_id,
+                         date_from=date_from, date_to=date_to, dry_run=dry_run)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f'Error starting rule re-apply: {str(e)}')
+        flash('Something went wrong. Please try again.', 'error')
+        return redirect(url_for('categorization_rule.index'))
+
+    if job.status == BackgroundJob.COMPLETED:
+        _flash_reapply_result(job.result)
+        return redirect(url_for('categorization_rule.index'))
+    if job.status == BackgroundJob.FAILED:
+        flash(job.message, 'error')
+        return redirect(url_for('categorization_rule.index'))
+
+    flash('Re-applying rules. You can follow its progress here.', 'info')
+    return redirect(url_for('categorization_rule.index', job_id=job.id))
+
+
+@categorization_rule_bp.route('/reapply/<int:job_id>')
+def reapply_status(job_id):
+    """Status of a background re-apply job"""
+    job = load_job(job_id)
+    if not job or job.kind != 'reapply_rules':
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+
+@categorization_rule_bp.route('/analyze')
+def analyze():
+    """Shadowed, overlapping and unmatched rules over the most recent transactions"""
+    limit = request.args.get('limit', ANALYZE_DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, ANALYZE_MAX_LIMIT))
+    report = analyze_rules(limit)
+    return render_template('categorization_rule/analyze.html', report=report)
 
 
 @categorization_rule_bp.route('/add', methods=['GET', 'POST'])
@@ -27,7 +164,7 @@ def add_rule():
     if request.method == 'POST':
         name = request.form.get('name', '').strip()
         operator = request.form.get('operator', '')
-        value = CategorizationRule.normalize(request.form.get('value', '').strip())
+        value, amount_min, amount_max, condition_type, error = _read_rule_conditions(request.form, operator)
         category_id = request.form.get('category_id')
         type_override = request.form.get('type_override') or None
         is_active = 'is_active' in request.form
@@ -37,6 +174,10 @@ def add_rule():
             flash('Please fill in all required fields.', 'error')
             return redirect(url_for('categorization_rule.add_rule'))
 
+        if error:
+            flash(error, 'error')
+            return redirect(url_for('categorization_rule.add_rule'))
+
         if type_override and type_override not in ('income', 'expense'):
             type_override = None
 
@@ -53,6 +194,9 @@ def add_rule():
                 field='description',
                 operator=operator,
                 value=value,
+                amount_min=amount_min,
+                amount_max=amount_max,
+                condition_type=condition_type,
                 category_id=int(category_id),
                 type_override=type_override,
                 tags=tags,
@@ -66,7 +210,7 @@ def add_rule():
             flash('Something went wrong. Please try again.', 'error')
         return redirect(url_for('categorization_rule.index'))
 
-    categories = Category.query.all()
+    categories = Category.load_tree()
     tags = Tag.query.order_by(Tag.name).all()
     return render_template('categorization_rule/form.html', categories=categories, tags=tags)
 
@@ -77,7 +221,7 @@ def edit_rule(id):
     if request.method == 'POST':
         name = request.form.get('name', '').strip()
         operator = request.form.get('operator', '')
-        value = CategorizationRule.normalize(request.form.get('value', '').strip())
+        value, amount_min, amount_max, condition_type, error = _read_rule_conditions(request.form, operator)
         category_id = request.form.get('category_id')
         type_override = request.form.get('type_override') or None
         is_active = 'is_active' in request.form
@@ -87,6 +231,10 @@ def edit_rule(id):
             flash('Please fill in all required fields.', 'error')
             return redirect(url_for('categorization_rule.edit_rule', id=id))
 
+        if error:
+            flash(error, 'error')
+            return redirect(url_for('categorization_rule.edit_rule', id=id))
+
         if type_override and type_override not in ('income', 'expense'):
             type_override = None
 
@@ -94,6 +242,9 @@ def edit_rule(id):
             rule.name = name
             rule.operator = operator
             rule.value = value
+            rule.amount_min = amount_min
+            rule.amount_max = amount_max
+            rule.condition_type = condition_type
             rule.category_id = int(category_id)
             rule.type_override = type_override
             rule.is_active = is_active
@@ -106,9 +257,15 @@ def edit_rule(id):
             flash('Something went wrong. Please try again.', 'error')
         return redirect(url_for('categorization_rule.index'))
 
-    categories = Category.query.all()
+    categories = Category.load_tree()
     tags = Tag.query.order_by(Tag.name).all()
-    return render_template('categorization_rule/form.html', rule=rule, categories=categories, tags=tags)
+    # Counting matches scans every transaction, so it runs only when asked for; the stored hit stats show otherwise
+    matching_count = None
+    condition = rule_filter(rule) if request.args.get('count', type=int) else None
+    if condition is not None:
+        matching_count = db.session.query(db.func.count(CashflowTransaction.id)).filter(condition).scalar()
+    return render_template('categorization_rule/form.html', rule=rule, categories=categories, tags=tags,
+                           matching_count=matching_count)
 
 
 @categorization_rule_bp.route('/delete/<int:id>', methods=['POST'])
@@ -130,15 +287,63 @@ def reorder():
     data = request.get_json()
     if not data or 'rule_ids' not in data:
         return jsonify({'error': 'Invalid request'}), 400
+    try:
+        rule_ids = [int(rule_id) for rule_id in data['rule_ids']]
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid request'}), 400
 
     try:
-        for index, rule_id in enumerate(data['rule_ids']):
-            rule = db.session.get(CategorizationRule, int(rule_id))
-            if rule:
-                rule.priority = index
+        if rule_ids:
+            # One UPDATE with the new positions in a CASE; unknown IDs simply match no row
+            positions = {rule_id: index for index, rule_id in enumerate(rule_ids)}
+            db.session.execute(
+                update(CategorizationRule)
+                .where(CategorizationRule.id.in_(positions))
+                .values(priority=case(positions, value=CategorizationRule.id)),
+                execution_options={'synchronize_session': False},
+            )
+            bump_rules_version(db.session.connection())  # no ORM flush, so the listener does not fire
         db.session.commit()
         return jsonify({'success': True})
     except Exception as e:
         db.session.rollback()
         logger.error(f'Error reordering rules: {str(e)}')
         return jsonify({'error': 'Failed to reorder'}), 500
+
+
+@categorization_rule_bp.route('/export')
+def export():
+    """Download every rule as JSON, for import into another instance"""
+    body = json.dumps(export_rules(), ensure_ascii=False, indent=2)
+    filename = f'categorization-rules-{date.today().isoformat()}.json'
+    return Response(body, mimetype='application/json',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+@categorization_rule_bp.route('/import', methods=['POST'])
+def import_rule_set():
+    """Import an exported rule set in one transaction, appending or replacing the current rules"""
+    upload = request.files.get('rules_file')
+    if not upload or not upload.filename:
+        flash('Please select a rules file.', 'error')
+        return redirect(url_for('categorization_rule.index'))
+    replace = request.form.get('mode') == 'replace'
+
+    try:
+        data = json.load(upload.stream)
+    except (UnicodeDecodeError, ValueError):
+        flash('The rules file is not valid JSON.', 'error')
+        return redirect(url_for('categorization_rule.index'))
+
+    try:
+        count = import_rules(data, replace=replace)
+        db.session.commit()
+        flash(f"{count} rules imported{' (existing rules replaced)' if replace else ''}.", 'success')
+    except RuleImportError as e:
+        db.session.rollback()
+        flash(str(e), 'error')
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f'Error importing rules: {str(e)}')
+        flash('Something went wrong. Please try again.', 'error')
+    return redirect(url_for('categorization_rule.index'))
@@ -1,8 +1,10 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
-from sqlalchemy import func, exists
+from sqlalchemy import exists
 from models import db
 from models.category import Category
 from models.cashflow import CashflowTransaction
+from utils.transaction_stats import load_category_stats
+from utils.category_merge import merge_category, CategoryMergeError
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,20 +13,10 @@ category_bp = Blueprint('category', __name__, url_prefix='/categories')
 
 @category_bp.route('/')
 def index():
-    categories = Category.query.filter_by(parent_id=None).all()
+    categories = Category.load_tree()
 
-    # Single aggregation query for all category counts (replaces N+1 model methods)
-    raw_counts = db.session.query(
-        CashflowTransaction.category_id,
-        CashflowTransaction.type,
-        func.count(CashflowTransaction.id)
-    ).group_by(CashflowTransaction.category_id, CashflowTransaction.type).all()
-
-    per_cat = {}
-    for cat_id, txn_type, count in raw_counts:
-        if cat_id not in per_cat:
-            per_cat[cat_id] = {'income': 0, 'expense': 0}
-        per_cat[cat_id][txn_type] = count
+    # Maintained per-category counters; never touches the transaction table
+    per_cat = load_category_stats(db.session)
 
     # Build final counts: parent totals include subcategory totals
     category_counts = {}
@@ -62,7 +54,7 @@ def add_category():
             flash('Something went wrong. Please try again.', 'error')
         return redirect(url_for('category.index'))
     
-    categories = Category.query.filter_by(parent_id=None).all()
+    categories = Category.load_tree()
     return render_template('category/form.html', categories=categories)
 
 @category_bp.route('/edit/<int:id>', methods=['GET', 'POST'])
@@ -88,7 +80,7 @@ def edit_category(id):
             flash('Something went wrong. Please try again.', 'error')
         return redirect(url_for('category.index'))
     
-    categories = Category.query.filter_by(parent_id=None).all()
+    categories = Category.load_tree()
     return render_template('category/form.html', category=category, categories=categories)
 
 @category_bp.route('/delete/<int:id>', methods=['POST'])
@@ -97,8 +89,11 @@ def delete_category(id):
     if db.session.query(exists().where(Category.parent_id == id)).scalar():
         flash('Remove subcategories first before deleting this category.', 'error')
         return redirect(url_for('category.index'))
+    if request.form.get('target_id'):
+        # Delete and move the transactions and rules to another category
+        return _merge(category, request.form.get('target_id', type=int), 'Category removed')
     if db.session.query(exists().where(CashflowTransaction.category_id == id)).scalar():
-        flash("Can't delete — this category has linked transactions.", 'error')
+        flash("Can't delete — this category has linked transactions. Move them to another category from its edit page.", 'error')
         return redirect(url_for('category.index'))
     
     try:
@@ -109,4 +104,28 @@ def delete_category(id):
         db.session.rollback()
         logger.error(f'Error deleting category: {str(e)}')
         flash('Something went wrong. Please try again.', 'error')
-    return redirect(url_for('category.index')) 
\ No newline at end of file
+    return redirect(url_for('category.index'))
+
+@category_bp.route('/merge/<int:id>', methods=['POST'])
+def merge_category_route(id):
+    category = db.get_or_404(Category, id)
+    return _merge(category, request.form.get('target_id', type=int), 'Categories merged')
+
+def _merge(category, target_id, done_message):
+    target = db.session.get(Category, target_id) if target_id else None
+    if target is None:
+        flash('Pick a category to move into.', 'error')
+        return redirect(url_for('category.edit_category', id=category.id))
+    try:
+        moved = merge_category(category, target)
+        db.session.commit()
+        flash(f"{done_message}: {moved['transactions']} transactions and {moved['rules']} rules moved to {target.name}.", 'success')
+    except CategoryMergeError as e:
+        db.session.rollback()
+        flash(str(e), 'error')
+        return redirect(url_for('category.edit_category', id=category.id))
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f'Error merging category: {str(e)}')
+        flash('Something went wrong. Please try again.', 'error')
+    return redirect(url_for('category.index'))
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from models import db
 from models.settings import Settings
+from utils.settings_cache import get_setting
 from utils.data_utils import create_dummy_data, create_default_categories, create_default_tags
 import logging
 from sqlalchemy import text
@@ -29,7 +30,7 @@ def update_currency():
 
 @settings_bp.route('/')
 def index():
-    currency_symbol = Settings.get_setting('currency_symbol', '₺')
+    currency_symbol = get_setting('currency_symbol', '₺')
     return render_template('settings/index.html',
                            currency_symbol=currency_symbol)
 
@@ -75,7 +76,10 @@ def reset_database():
         statements = [
             "DELETE FROM cashflow_transaction_tags",
             "DELETE FROM cashflow_transaction",
+            "DELETE FROM import_batch",
+            "DELETE FROM tag_stats",
             "DELETE FROM tag",
+            "DELETE FROM category_stats",
             "DELETE FROM category"
         ]
         
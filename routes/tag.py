@@ -1,8 +1,10 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
-from sqlalchemy import func, exists
+from sqlalchemy import exists
 from models import db
 from models.tag import Tag
-from models.cashflow import CashflowTransaction, cashflow_transaction_tags
+from models.cashflow import cashflow_transaction_tags
+from utils.transaction_stats import load_tag_stats
+from utils.tag_merge import merge_tag, TagMergeError
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,21 +15,8 @@ tag_bp = Blueprint('tag', __name__, url_prefix='/tags')
 def index():
     tags = Tag.query.order_by(Tag.name).all()
 
-    # Single aggregation query for all tag counts (replaces N+1 model methods)
-    raw_counts = db.session.query(
-        cashflow_transaction_tags.c.tag_id,
-        CashflowTransaction.type,
-        func.count(CashflowTransaction.id)
-    ).join(
-        CashflowTransaction,
-        cashflow_transaction_tags.c.cashflow_transaction_id == CashflowTransaction.id
-    ).group_by(cashflow_transaction_tags.c.tag_id, CashflowTransaction.type).all()
-
-    tag_counts = {}
-    for tag_id, txn_type, count in raw_counts:
-        if tag_id not in tag_counts:
-            tag_counts[tag_id] = {'income': 0, 'expense': 0}
-        tag_counts[tag_id][txn_type] = count
+    # Counts are maintained in tag_stats; no scan of tagged transactions
+    tag_counts = load_tag_stats(db.session)
 
     return render_template('tag/index.html', tags=tags, tag_counts=tag_counts)
 
@@ -72,13 +61,14 @@ def edit_tag(id):
             logger.error(f'Error updating tag: {str(e)}')
             flash('Something went wrong. Please try again.', 'error')
         return redirect(url_for('tag.index'))
-    return render_template('tag/form.html', tag=tag)
+    tags = Tag.query.filter(Tag.id != id).order_by(Tag.name).all()
+    return render_template('tag/form.html', tag=tag, tags=tags)
 
 @tag_bp.route('/delete/<int:id>', methods=['POST'])
 def delete_tag(id):
     tag = db.get_or_404(Tag, id)
     if db.session.query(exists().where(cashflow_transaction_tags.c.tag_id == id)).scalar():
-        flash("Can't delete — this tag has linked transactions.", 'error')
+        flash("Can't delete — this tag has linked transactions. Merge it into another tag from its edit page.", 'error')
         return redirect(url_for('tag.index'))
 
     try:
@@ -89,4 +79,26 @@ def delete_tag(id):
         db.session.rollback()
         logger.error(f'Error deleting tag: {str(e)}')
         flash('Something went wrong. Please try again.', 'error')
-    return redirect(url_for('tag.index'))
\ No newline at end of file
+    return redirect(url_for('tag.index'))
+
+@tag_bp.route('/merge/<int:id>', methods=['POST'])
+def merge_tag_route(id):
+    tag = db.get_or_404(Tag, id)
+    target_id = request.form.get('target_id', type=int)
+    target = db.session.get(Tag, target_id) if target_id else None
+    if target is None:
+        flash('Pick a tag to merge into.', 'error')
+        return redirect(url_for('tag.edit_tag', id=id))
+    try:
+        moved = merge_tag(tag, target)
+        db.session.commit()
+        flash(f"Tags merged: {moved['transactions']} transactions and {moved['rules']} rules moved to {target.name}.", 'success')
+    except TagMergeError as e:
+        db.session.rollback()
+        flash(str(e), 'error')
+        return redirect(url_for('tag.edit_tag', id=id))
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f'Error merging tag: {str(e)}')
+        flash('Something went wrong. Please try again.', 'error')
+    return redirect(url_for('tag.index'))
@@ -3,6 +3,7 @@ import os
 import re
 import pytest
 from datetime import date, datetime
+from sqlalchemy import event
 
 # Set env BEFORE any app imports so module-level create_app() uses TestingConfig
 os.environ['FLASK_ENV'] = 'testing'
@@ -16,6 +17,23 @@ from models.settings import Settings
 from models.categorization_rule import CategorizationRule
 
 
+# Yapı Kredi CSV statements shared by the import tests. The bank config skips
+# the first two rows (previous period debt), so each yields two transactions.
+STATEMENT_CSV = (
+    'İşlem Tarihi,İşlemler,Tutar\n'
+    '01/01/2024,Devreden Borç,"100,00"\n'
+    '02/01/2024,Asgari Ödeme,"50,00"\n'
+    '03/01/2024,MIGROS KADIKOY,"250,50"\n'
+    '04/01/2024,Kahve,"45,00"\n'
+)
+
+OTHER_STATEMENT_CSV = (
+    'İşlem Tarihi,İşlemler,Tutar\n'
+    '01/02/2024,Devreden Borç,"100,00"\n'
+    '02/02/2024,Asgari Ödeme,"50,00"\n'
+    '03/02/2024,A101 MODA,"80,00"\n'
+)
+
 @pytest.fixture(scope='session')
 def app():
     """Return the module-level Flask app (already created with TestingConfig
@@ -38,8 +56,14 @@ def db(app):
     Pushes an app context, creates all tables, yields the db instance,
     then rolls back and drops all tables so tests are fully isolated.
     """
+    from utils.settings_cache import invalidate_settings_cache
+    from utils.user_cache import invalidate_user_cache
+
     with app.app_context():
         _db.create_all()
+        # The previous test's rows are gone
+        invalidate_settings_cache()
+        invalidate_user_cache()
         # Keep attribute values on objects after commit so fixtures remain usable
         _db.session.expire_on_commit = False
         yield _db
@@ -47,6 +71,29 @@ def db(app):
         _db.drop_all()
 
 
+@pytest.fixture()
+def capture_queries(db):
+    """Return a helper that runs func() and records the SQL it sends.
+
+    capture_queries(func, match=None) returns (func's result, statements),
+    keeping only statements that contain match when it is given.
+    """
+    def capture(func, match=None):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if match is None or match in statement:
+                statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            result = func()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        return result, statements
+    return capture
+
+
 @pytest.fixture()
 def client(app):
     """Create a test client."""
@@ -101,6 +148,17 @@ def get_csrf_token(client, url='/auth/login'):
     return ''
 
 
+def noop_progress(progress, total=None, force=False):
+    """Progress callback that ignores updates, for calling job functions such as run_import() directly."""
+    pass
+
+
+def make_transaction(category_id, txn_type='expense', amount=10, tags=()):
+    """Unsaved transaction on 2024-01-01 in category_id, with the given type, amount and tags."""
+    return CashflowTransaction(date=date(2024, 1, 1), type=txn_type, amount=amount,
+                               description='test', category_id=category_id, tags=list(tags))
+
+
 @pytest.fixture()
 def sample_category(db):
     """Create a sample parent category."""
@@ -170,6 +170,24 @@ class TestChangePasswordRoute:
             user = User.query.filter_by(username='admin').first()
             assert user.check_password('newpassword456')
 
+    def test_cached_user_sees_new_password(self, auth_client):
+        """After a password change the next request checks against the new hash."""
+        csrf = get_csrf_token(auth_client, '/auth/account')
+        auth_client.post('/auth/change-password', data={
+            'current_password': 'testpassword123',
+            'new_password': 'newpassword456',
+            'confirm_password': 'newpassword456',
+            'csrf_token': csrf,
+        })
+        csrf = get_csrf_token(auth_client, '/auth/account')
+        response = auth_client.post('/auth/change-password', data={
+            'current_password': 'newpassword456',
+            'new_password': 'thirdpassword789',
+            'confirm_password': 'thirdpassword789',
+            'csrf_token': csrf,
+        }, follow_redirects=True)
+        assert b'Password changed!' in response.data
+
     def test_change_password_wrong_current(self, auth_client):
         """POST /auth/change-password with wrong current password shows error."""
         csrf = get_csrf_token(auth_client, '/auth/account')
@@ -313,3 +331,14 @@ class TestAuthRequirement:
         response = client.get('/static/css/style.css')
         # Either 200 (file found) or 404, but NOT a redirect to login
         assert response.status_code in (200, 404)
+
+
+class TestUserLookup:
+    """Authenticated requests reuse the cached user."""
+
+    def test_json_endpoint_skips_user_query(self, auth_client, capture_queries):
+        """GET /cashflow/api/category-data loads no user row once the user is cached."""
+        auth_client.get('/')
+        response, statements = capture_queries(lambda: auth_client.get('/cashflow/api/category-data'), 'FROM users')
+        assert response.status_code == 200
+        assert statements == []
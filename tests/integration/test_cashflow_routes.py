@@ -1,11 +1,16 @@
 """Integration tests for cashflow routes (/cashflow)."""
 import pytest
-from datetime import date, datetime, timedelta
-from tests.conftest import get_csrf_token
+from io import BytesIO
+from datetime import date, datetime, timedelta, timezone
+from tests.conftest import STATEMENT_CSV, get_csrf_token
 from models import db
 from models.cashflow import CashflowTransaction
 from models.category import Category
 from models.tag import Tag
+from models.background_job import BackgroundJob
+from models.import_batch import ImportBatch
+from models.import_preview import ImportPreview, ImportPreviewRow
+from utils.import_preview import purge_expired_previews
 
 
 pytestmark = pytest.mark.integration
@@ -188,6 +193,17 @@ class TestCashflowIndexRoute:
         assert response.status_code == 200
         assert b'Test transaction' in response.data
 
+    def test_index_search_folds_turkish_i(self, auth_client, db, sample_category):
+        db.session.add(CashflowTransaction(date=date(2024, 1, 15), type='expense', amount=10,
+                                           description='MİGROS KADIKOY', category_id=sample_category.id))
+        db.session.commit()
+        response = auth_client.get('/cashflow/?search=migros')
+        assert 'MİGROS KADIKOY'.encode('utf-8') in response.data
+
+    def test_index_search_treats_wildcards_literally(self, auth_client, sample_transaction):
+        response = auth_client.get('/cashflow/?search=Test%25')
+        assert b'Test transaction' not in response.data
+
     def test_index_filter_by_search_no_match(self, auth_client, sample_transaction):
         """GET /cashflow/ with non-matching search returns no results."""
         response = auth_client.get('/cashflow/?search=nonexistentterm')
@@ -581,6 +597,351 @@ class TestImportRoute:
         response = auth_client.get('/cashflow/import')
         assert response.status_code == 200
 
+    def test_import_csv_applies_rules_and_tags(self, auth_client, app, db, sample_rule, sample_tag):
+        """Imported rows are categorized by rules and linked to bank + rule tags."""
+        sample_rule.tags = [sample_tag]
+        db.session.commit()
+
+        csv_data = (
+            'İşlem Tarihi,İşlemler,Tutar\n'
+            '01/01/2024,Devreden Borç,"100,00"\n'
+            '02/01/2024,Asgari Ödeme,"50,00"\n'
+            '03/01/2024,MIGROS KADIKOY,"250,50"\n'
+            '04/01/2024,Maaş,"+5000,00"\n'
+        ).encode('utf-8')
+        csrf = get_csrf_token(auth_client, '/cashflow/import')
+        response = auth_client.post('/cashflow/import', data={
+            'excel_file': (BytesIO(csv_data), 'statement.csv'),
+            'bank_code': 'yapikredi',
+            'csrf_token': csrf,
+        }, content_type='multipart/form-data', follow_redirects=True)
+        assert response.status_code == 200
+        assert b'2 transactions imported successfully.' in response.data
+
+        with app.app_context():
+            migros = CashflowTransaction.query.filter_by(description='MIGROS KADIKOY').one()
+            assert migros.category_id == sample_rule.category_id
+            assert migros.source == 'excel_import'
+            assert {t.name for t in migros.tags} == {'Yapı Kredi', 'Test Tag'}
+
+            salary = CashflowTransaction.query.filter_by(description='Maaş').one()
+            assert salary.type == 'income'
+            assert salary.category.name == 'Import'
+            assert [t.name for t in salary.tags] == ['Yapı Kredi']
+
+    def test_reimport_skips_duplicates(self, auth_client, app, db, sample_category):
+        """Re-importing an overlapping statement only adds the new rows."""
+        header = 'İşlem Tarihi,İşlemler,Tutar\n01/01/2024,Devir,"1,00"\n02/01/2024,Devir,"1,00"\n'
+        first = header + '03/01/2024,Kahve,"50,00"\n03/01/2024,Kahve,"50,00"\n'
+        second = first + '05/01/2024,Market,"120,00"\n'
+
+        for content in (first, second):
+            csrf = get_csrf_token(auth_client, '/cashflow/import')
+            response = auth_client.post('/cashflow/import', data={
+                'excel_file': (BytesIO(content.encode('utf-8')), 'statement.csv'),
+                'bank_code': 'yapikredi',
+                'csrf_token': csrf,
+            }, content_type='multipart/form-data', follow_redirects=True)
+
+        assert b'1 transactions imported successfully. 2 duplicates skipped.' in response.data
+        with app.app_context():
+            # Identical same-day rows within one statement are both kept
+            assert CashflowTransaction.query.filter_by(description='Kahve').count() == 2
+            assert CashflowTransaction.query.filter_by(description='Market').count() == 1
+
+    def test_import_multiple_files(self, auth_client, app, db):
+        """Several statements in one upload are imported with a per-file summary."""
+        header = 'İşlem Tarihi,İşlemler,Tutar\n01/01/2024,Devir,"1,00"\n02/01/2024,Devir,"1,00"\n'
+        csrf = get_csrf_token(auth_client, '/cashflow/import')
+        response = auth_client.post('/cashflow/import', data={
+            'excel_file': [
+                (BytesIO((header + '03/01/2024,Kahve,"50,00"\n').encode('utf-8')), 'january.csv'),
+                (BytesIO((header + '03/02/2024,Market,"120,00"\n').encode('utf-8')), 'february.csv'),
+            ],
+            'bank_code': 'yapikredi',
+            'csrf_token': csrf,
+        }, content_type='multipart/form-data', follow_redirects=True)
+
+        assert b'2 transactions imported successfully.' in response.data
+        assert b'january.csv: 1 imported' in response.data
+        with app.app_context():
+            assert ImportBatch.query.count() == 2
+
+    def test_import_detects_bank(self, auth_client, app, db):
+        """With the default 'auto' bank choice the bank comes from the header row."""
+        content = 'İşlem Tarihi,İşlemler,Tutar\n01/01/2024,Devir,"1,00"\n02/01/2024,Devir,"1,00"\n03/01/2024,Kahve,"50,00"\n'
+        csrf = get_csrf_token(auth_client, '/cashflow/import')
+        response = auth_client.post('/cashflow/import', data={
+            'excel_file': (BytesIO(content.encode('utf-8')), 'statement.csv'),
+            'bank_code': 'auto',
+            'csrf_token': csrf,
+        }, content_type='multipart/form-data', follow_redirects=True)
+
+        assert b'1 transactions imported successfully.' in response.data
+        with app.app_context():
+            assert ImportBatch.query.one().bank_code == 'yapikredi'
+
+    def test_import_invalid_file_shows_error(self, auth_client):
+        """A parse failure is reported on the import page."""
+        csrf = get_csrf_token(auth_client, '/cashflow/import')
+        response = auth_client.post('/cashflow/import', data={
+            'excel_file': (BytesIO(b'RandomCol\nvalue\n'), 'bad.csv'),
+            'bank_code': 'yapikredi',
+            'csrf_token': csrf,
+        }, content_type='multipart/form-data', follow_redirects=True)
+        assert response.status_code == 200
+        assert 'Excel import error' in response.data.decode()
+
+    def test_import_queued_redirects_to_progress(self, auth_client, app, monkeypatch):
+        """With background jobs, the upload returns immediately with a progress panel."""
+        class FakeExecutor:
+            def submit(self, fn, app, job_id, func, args, kwargs):
+                for _, upload in args[0]:
+                    upload.close()  # the job owns the upload buffers
+
+        monkeypatch.setitem(app.config, 'JOBS_RUN_INLINE', False)
+        monkeypatch.setattr('utils.jobs._get_executor', lambda app: FakeExecutor())
+
+        csrf = get_csrf_token(auth_client, '/cashflow/import')
+        response = auth_client.post('/cashflow/import', data={
+            'excel_file': (BytesIO(b'a,b\n1,2\n'), 'statement.csv'),
+            'bank_code': 'yapikredi',
+            'csrf_token': csrf,
+        }, content_type='multipart/form-data')
+        assert response.status_code == 302
+        assert '/cashflow/import?job_id=' in response.headers['Location']
+
+        page = auth_client.get(response.headers['Location'])
+        assert b'importJob' in page.data
+        assert b'Pending' in page.data
+
+
+class TestImportRollbackRoute:
+    """Tests for POST /cashflow/import/batches/<id>/rollback."""
+
+    def _import(self, auth_client):
+        csv_data = (
+            'İşlem Tarihi,İşlemler,Tutar\n01/01/2024,Devir,"1,00"\n02/01/2024,Devir,"1,00"\n'
+            '03/01/2024,Kahve,"50,00"\n04/01/2024,Market,"120,00"\n'
+        ).encode('utf-8')
+        csrf = get_csrf_token(auth_client, '/cashflow/import')
+        auth_client.post('/cashflow/import', data={
+            'excel_file': (BytesIO(csv_data), 'january.csv'),
+            'bank_code': 'yapikredi',
+            'csrf_token': csrf,
+        }, content_type='multipart/form-data')
+
+    def test_history_lists_batches(self, auth_client):
+        self._import(auth_client)
+        response = auth_client.get('/cashflow/import')
+        assert b'Import History' in response.data
+        assert b'january.csv' in response.data
+
+    def test_history_time_includes_every_phase(self, auth_client, db):
+        db.session.add(ImportBatch(file_name='march.csv', bank_code='yapikredi', status=ImportBatch.COMPLETED,
+                                   parse_ms=10, categorize_ms=20, insert_ms=30))
+        db.session.commit()
+        response = auth_client.get('/cashflow/import')
+        assert b'60 ms' in response.data
+        assert b'Parse 10 ms, rules 20 ms, insert 30 ms' in response.data
+
+    def test_rollback_removes_transactions(self, auth_client, app, sample_transaction):
+        self._import(auth_client)
+        with app.app_context():
+            batch = ImportBatch.query.one()
+            batch_id = batch.id
+
+        csrf = get_csrf_token(auth_client, '/cashflow/import')
+        response = auth_client.post(f'/cashflow/import/batches/{batch_id}/rollback', data={
+            'csrf_token': csrf,
+        }, follow_redirects=True)
+        assert b'Import undone. 2 transactions removed.' in response.data
+        assert b'Undone' in response.data
+
+        with app.app_context():
+            assert CashflowTransaction.query.count() == 1
+            assert db.session.get(ImportBatch, batch_id).status == 'rolled_back'
+
+    def test_rollback_twice_rejected(self, auth_client, app):
+        self._import(auth_client)
+        with app.app_context():
+            batch_id = ImportBatch.query.one().id
+
+        for _ in range(2):
+            csrf = get_csrf_token(auth_client, '/cashflow/import')
+            response = auth_client.post(f'/cashflow/import/batches/{batch_id}/rollback', data={
+                'csrf_token': csrf,
+            }, follow_redirects=True)
+        assert b'already been undone' in response.data
+
+    def test_rollback_unknown_batch(self, auth_client):
+        csrf = get_csrf_token(auth_client, '/cashflow/import')
+        response = auth_client.post('/cashflow/import/batches/999/rollback', data={'csrf_token': csrf})
+        assert response.status_code in (302, 404)
+
+
+class TestImportStatusRoute:
+    """Tests for GET /cashflow/import/<job_id>."""
+
+    def test_status_returns_job_json(self, auth_client, db):
+        job = BackgroundJob(kind='import', status='running', progress=40, total=100)
+        db.session.add(job)
+        db.session.commit()
+
+        response = auth_client.get(f'/cashflow/import/{job.id}')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['status'] == 'running'
+        assert data['progress'] == 40
+        assert data['total'] == 100
+
+    def test_status_of_abandoned_job_is_failed(self, auth_client, app, db):
+        """A job left running by a restarted worker stops being polled as running."""
+        old = datetime.now(timezone.utc) - timedelta(seconds=app.config['JOB_STALE_SECONDS'] + 60)
+        job = BackgroundJob(kind='import', status='running', created_at=old, started_at=old, heartbeat_at=old)
+        db.session.add(job)
+        db.session.commit()
+
+        data = auth_client.get(f'/cashflow/import/{job.id}').get_json()
+        assert data['status'] == 'failed'
+        assert data['finished_at'] is not None
+
+    def test_status_unknown_job(self, auth_client):
+        response = auth_client.get('/cashflow/import/999')
+        assert response.status_code == 404
+        assert response.get_json()['error'] == 'Import not found'
+
+    def test_status_requires_login(self, client):
+        response = client.get('/cashflow/import/1')
+        assert response.status_code in (302, 308)
+
+
+class TestImportPreviewRoute:
+    """Tests for POST /cashflow/import/preview."""
+
+    STATEMENT = STATEMENT_CSV + '05/01/2024,MIGROS MODA,"80,00"\n'
+
+    def _preview(self, auth_client, content=None, **extra):
+        csrf = get_csrf_token(auth_client, '/cashflow/import')
+        data = {
+            'excel_file': (BytesIO((content or self.STATEMENT).encode('utf-8')), 'statement.csv'),
+            'bank_code': 'yapikredi',
+            'csrf_token': csrf,
+        }
+        data.update(extra)
+        return auth_client.post('/cashflow/import/preview', data=data, content_type='multipart/form-data')
+
+    def test_preview_writes_nothing(self, auth_client, app, db, sample_rule):
+        rule_id = sample_rule.id
+        response = self._preview(auth_client)
+        assert response.status_code == 200
+        data = response.get_json()
+
+        assert data['summary']['total'] == 3
+        assert data['summary']['new'] == 3
+        assert data['summary']['uncategorized'] == 1
+        assert data['summary']['rules'] == [{'rule_id': rule_id, 'rule': 'Test Rule', 'count': 2}]
+        migros = data['rows'][0]
+        assert migros['description'] == 'MIGROS KADIKOY'
+        assert migros['category'] == 'Test Subcategory'
+        assert migros['tags'] == ['Yapı Kredi']
+        assert migros['amount'] == '250.50'
+        assert migros['duplicate'] is False
+
+        with app.app_context():
+            assert CashflowTransaction.query.count() == 0
+            assert ImportBatch.query.count() == 0
+            assert Tag.query.filter_by(name='Yapı Kredi').count() == 0
+
+    def test_preview_flags_duplicates(self, auth_client, app, db):
+        csrf = get_csrf_token(auth_client, '/cashflow/import')
+        auth_client.post('/cashflow/import', data={
+            'excel_file': (BytesIO(self.STATEMENT.encode('utf-8')), 'statement.csv'),
+            'bank_code': 'yapikredi',
+            'csrf_token': csrf,
+        }, content_type='multipart/form-data')
+
+        content = self.STATEMENT + '06/01/2024,Market,"120,00"\n'
+        data = self._preview(auth_client, content).get_json()
+        assert data['summary']['new'] == 1
+        assert data['summary']['duplicates'] == 3
+        assert [row['duplicate'] for row in data['rows']] == [True, True, True, False]
+
+    def test_preview_is_paginated(self, auth_client, db):
+        data = self._preview(auth_client, page='2', per_page='2').get_json()
+        assert data['summary']['page'] == 2
+        assert data['summary']['pages'] == 2
+        assert [row['description'] for row in data['rows']] == ['MIGROS MODA']
+
+    def test_preview_pages_are_served_without_reparsing(self, auth_client, db, sample_rule, monkeypatch):
+        first = self._preview(auth_client, per_page='2').get_json()
+        assert [row['description'] for row in first['rows']] == ['MIGROS KADIKOY', 'Kahve']
+
+        def fail(*args, **kwargs):
+            raise AssertionError('the upload should not be parsed again')
+        monkeypatch.setattr('routes.cashflow.preview_import', fail)
+
+        response = auth_client.get(first['summary']['preview_url'] + '?page=2&per_page=2')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['summary']['page'] == 2
+        assert data['summary']['pages'] == 2
+        assert data['summary']['new'] == 3
+        assert data['summary']['rules'] == first['summary']['rules']
+        assert [row['description'] for row in data['rows']] == ['MIGROS MODA']
+        assert data['rows'][0]['category'] == 'Test Subcategory'
+
+    def test_preview_page_unknown(self, auth_client, db):
+        response = auth_client.get('/cashflow/import/preview/999')
+        assert response.status_code == 404
+        assert 'preview the file again' in response.get_json()['error']
+
+    def test_preview_rows_are_stored_by_position(self, auth_client, db):
+        preview_url = self._preview(auth_client).get_json()['summary']['preview_url']
+        preview = ImportPreview.query.one()
+        assert preview_url.endswith(f'/{preview.id}')
+        assert preview.row_count == 3
+        positions = db.session.query(ImportPreviewRow.position).filter_by(preview_id=preview.id)
+        assert sorted(position for position, in positions) == [0, 1, 2]
+
+    def test_expired_preview_is_gone(self, auth_client, app, db):
+        preview_url = self._preview(auth_client).get_json()['summary']['preview_url']
+        db.session.query(ImportPreview).update({'created_at': datetime.now(timezone.utc) - timedelta(days=1)})
+        db.session.commit()
+
+        response = auth_client.get(preview_url)
+        assert response.status_code == 404
+
+        with app.test_request_context():
+            assert purge_expired_previews(db.session.connection()) == 1
+        db.session.commit()
+        assert ImportPreview.query.count() == 0
+        assert ImportPreviewRow.query.count() == 0
+
+    def test_requests_purge_expired_previews(self, auth_client, db, monkeypatch):
+        self._preview(auth_client)
+        db.session.query(ImportPreview).update({'created_at': datetime.now(timezone.utc) - timedelta(days=1)})
+        db.session.commit()
+
+        monkeypatch.setattr('utils.import_preview._last_purge', None)
+        auth_client.get('/cashflow/import/999')
+        db.session.expire_all()
+        assert ImportPreview.query.count() == 0
+        assert ImportPreviewRow.query.count() == 0
+
+    def test_preview_parse_error(self, auth_client, db):
+        response = self._preview(auth_client, 'RandomCol\nvalue\n')
+        assert response.status_code == 400
+        assert 'Excel import error' in response.get_json()['error']
+
+    def test_preview_requires_file(self, auth_client, db):
+        csrf = get_csrf_token(auth_client, '/cashflow/import')
+        response = auth_client.post('/cashflow/import/preview', data={
+            'bank_code': 'yapikredi', 'csrf_token': csrf,
+        }, content_type='multipart/form-data')
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'Please select an Excel file.'
+
 
 class TestCategoryDataApiRoute:
     """Tests for GET /cashflow/api/category-data."""
@@ -1,9 +1,15 @@
 """Integration tests for categorization rule routes."""
 import pytest
+import json
+from io import BytesIO
+from datetime import date, datetime
 from tests.conftest import get_csrf_token
 from models.categorization_rule import CategorizationRule
 from models.category import Category
 from models.tag import Tag
+from models.cashflow import CashflowTransaction
+from models.import_batch import ImportBatch
+from utils.rule_cache import get_compiled_rules
 
 
 @pytest.mark.integration
@@ -24,6 +30,21 @@ class TestCategorizationRuleIndex:
         assert b'Test Rule' in response.data
         assert b'migros' in response.data
 
+    def test_index_shows_hit_statistics(self, auth_client, db, sample_rule):
+        sample_rule.hit_count = 42
+        sample_rule.last_hit_at = datetime(2024, 3, 5, 9, 30)
+        db.session.add(ImportBatch(file_name='march.xlsx', bank_code='yapikredi', categorize_ms=17))
+        db.session.commit()
+
+        response = auth_client.get('/rules/')
+        assert b'42' in response.data
+        assert b'05.03.2024 09:30' in response.data
+        assert b'rules matched in 17 ms' in response.data
+
+    def test_index_flags_rules_without_hits(self, auth_client, sample_rule):
+        response = auth_client.get('/rules/')
+        assert b'Never' in response.data
+
     def test_index_ordered_by_priority(self, auth_client, db, sample_subcategory):
         rule1 = CategorizationRule(
             name='Second Rule', priority=1, operator='contains',
@@ -118,12 +139,82 @@ class TestCategorizationRuleAdd:
         response = auth_client.post('/rules/add', data={
             'csrf_token': csrf,
             'name': 'Bad Rule',
-            'operator': 'regex',
-            'value': 'test',
+            'operator': 'glob',
+            'value': 'test*',
             'category_id': sample_subcategory.id,
         }, follow_redirects=True)
         assert b'Please fill in all required fields' in response.data
 
+    def test_add_regex_rule_keeps_pattern(self, auth_client, db, sample_subcategory):
+        csrf = get_csrf_token(auth_client, '/rules/add')
+        response = auth_client.post('/rules/add', data={
+            'csrf_token': csrf,
+            'name': 'Regex Rule',
+            'operator': 'regex',
+            'value': r'^POS \d+ MIGROS',
+            'category_id': sample_subcategory.id,
+            'is_active': '1',
+        }, follow_redirects=True)
+        assert b'Rule added!' in response.data
+
+        with auth_client.application.app_context():
+            rule = CategorizationRule.query.filter_by(name='Regex Rule').first()
+            assert rule.value == r'^POS \d+ MIGROS'
+            assert rule.matches('pos 1234 migros kadikoy')
+
+    def test_add_rule_invalid_regex(self, auth_client, db, sample_subcategory):
+        csrf = get_csrf_token(auth_client, '/rules/add')
+        response = auth_client.post('/rules/add', data={
+            'csrf_token': csrf,
+            'name': 'Broken Regex',
+            'operator': 'regex',
+            'value': '(migros',
+            'category_id': sample_subcategory.id,
+        }, follow_redirects=True)
+        assert b'Invalid regular expression' in response.data
+        with auth_client.application.app_context():
+            assert CategorizationRule.query.filter_by(name='Broken Regex').first() is None
+
+    def test_add_rule_with_amount_range_and_type(self, auth_client, db, sample_subcategory):
+        csrf = get_csrf_token(auth_client, '/rules/add')
+        response = auth_client.post('/rules/add', data={
+            'csrf_token': csrf,
+            'name': 'Big Rent',
+            'operator': 'contains',
+            'value': 'kira',
+            'amount_min': '1000',
+            'amount_max': '25000,50',
+            'condition_type': 'expense',
+            'category_id': sample_subcategory.id,
+            'is_active': '1',
+        }, follow_redirects=True)
+        assert b'Rule added!' in response.data
+
+        with auth_client.application.app_context():
+            rule = CategorizationRule.query.filter_by(name='Big Rent').first()
+            assert float(rule.amount_min) == 1000
+            assert float(rule.amount_max) == 25000.5
+            assert rule.condition_type == 'expense'
+            assert rule.matches('KIRA ODEMESI', 1500, 'expense')
+            assert not rule.matches('KIRA ODEMESI', 500, 'expense')
+            assert not rule.matches('KIRA ODEMESI', 1500, 'income')
+
+    @pytest.mark.parametrize('amount_min,amount_max', [('-5', ''), ('abc', ''), ('100', '50')])
+    def test_add_rule_invalid_amounts(self, auth_client, db, sample_subcategory, amount_min, amount_max):
+        csrf = get_csrf_token(auth_client, '/rules/add')
+        response = auth_client.post('/rules/add', data={
+            'csrf_token': csrf,
+            'name': 'Bad Amounts',
+            'operator': 'contains',
+            'value': 'kira',
+            'amount_min': amount_min,
+            'amount_max': amount_max,
+            'category_id': sample_subcategory.id,
+        }, follow_redirects=True)
+        assert b'Rule added!' not in response.data
+        with auth_client.application.app_context():
+            assert CategorizationRule.query.filter_by(name='Bad Amounts').first() is None
+
     def test_add_requires_csrf(self, auth_client, db, sample_subcategory):
         response = auth_client.post('/rules/add', data={
             'name': 'No CSRF',
@@ -162,6 +253,25 @@ class TestCategorizationRuleEdit:
         assert b'Edit Rule' in response.data
         assert b'migros' in response.data
 
+    def test_edit_form_counts_matching_transactions(self, auth_client, db, sample_rule, sample_category):
+        db.session.add_all([
+            CashflowTransaction(date=date(2024, 1, day), type='expense', amount=10, description=description,
+                                category_id=sample_category.id)
+            for day, description in enumerate(['MİGROS KADIKOY', 'MIGROS MODA', 'KAHVE'], start=1)
+        ])
+        db.session.commit()
+        response = auth_client.get(f'/rules/edit/{sample_rule.id}?count=1')
+        assert b'Currently matches 2 existing transactions.' in response.data
+
+    def test_edit_form_shows_stored_hits_without_counting(self, auth_client, db, capture_queries, sample_rule):
+        sample_rule.hit_count = 3
+        db.session.commit()
+        response, statements = capture_queries(lambda: auth_client.get(f'/rules/edit/{sample_rule.id}'),
+                                               'cashflow_transaction')
+        assert b'Matched 3 imported transactions.' in response.data
+        assert b'Currently matches' not in response.data
+        assert statements == []
+
     def test_edit_rule(self, auth_client, db, sample_rule):
         csrf = get_csrf_token(auth_client, f'/rules/edit/{sample_rule.id}')
         response = auth_client.post(f'/rules/edit/{sample_rule.id}', data={
@@ -241,6 +351,29 @@ class TestCategorizationRuleReorder:
             r2 = db.session.get(CategorizationRule, rule2.id)
             assert r2.priority < r1.priority
 
+    def test_reorder_invalidates_rule_cache(self, auth_client, db, sample_subcategory):
+        rule1 = CategorizationRule(
+            name='Rule A', priority=0, operator='contains',
+            value='market', category_id=sample_subcategory.id,
+        )
+        rule2 = CategorizationRule(
+            name='Rule B', priority=1, operator='contains',
+            value='migros', category_id=sample_subcategory.id,
+        )
+        db.session.add_all([rule1, rule2])
+        db.session.commit()
+        rule1_id, rule2_id = rule1.id, rule2.id
+        assert get_compiled_rules().match('MIGROS MARKET').id == rule1_id
+
+        csrf = get_csrf_token(auth_client, '/rules/')
+        auth_client.post('/rules/reorder',
+            json={'rule_ids': [rule2_id, rule1_id]},
+            headers={'X-CSRFToken': csrf},
+        )
+
+        with auth_client.application.app_context():
+            assert get_compiled_rules().match('MIGROS MARKET').id == rule2_id
+
     def test_reorder_invalid_request(self, auth_client):
         csrf = get_csrf_token(auth_client, '/rules/')
         response = auth_client.post('/rules/reorder',
@@ -248,3 +381,161 @@ class TestCategorizationRuleReorder:
             headers={'X-CSRFToken': csrf},
         )
         assert response.status_code == 400
+
+    def test_reorder_non_numeric_ids(self, auth_client):
+        csrf = get_csrf_token(auth_client, '/rules/')
+        response = auth_client.post('/rules/reorder',
+            json={'rule_ids': ['abc']},
+            headers={'X-CSRFToken': csrf},
+        )
+        assert response.status_code == 400
+
+    def test_reorder_is_one_update(self, auth_client, db, capture_queries, sample_subcategory):
+        rules = [
+            CategorizationRule(name=f'Rule {i}', priority=i, operator='contains', value=f'v{i}',
+                               category_id=sample_subcategory.id)
+            for i in range(20)
+        ]
+        db.session.add_all(rules)
+        db.session.commit()
+        rule_ids = [rule.id for rule in reversed(rules)]
+
+        csrf = get_csrf_token(auth_client, '/rules/')
+        response, statements = capture_queries(lambda: auth_client.post('/rules/reorder',
+            json={'rule_ids': rule_ids + [999999]},
+            headers={'X-CSRFToken': csrf},
+        ), 'categorization_rule')
+        assert response.status_code == 200
+        assert len(statements) == 1
+        assert statements[0].startswith('UPDATE categorization_rule')
+
+        with auth_client.application.app_context():
+            ordered = CategorizationRule.query.order_by(CategorizationRule.priority).all()
+            assert [rule.id for rule in ordered] == rule_ids
+
+
+@pytest.mark.integration
+class TestCategorizationRuleReapply:
+
+    def _transaction(self, db, description, category):
+        txn = CashflowTransaction(date=date(2024, 1, 5), type='expense', amount=10,
+                                  description=description, category_id=category.id, source='excel_import')
+        db.session.add(txn)
+        db.session.commit()
+        return txn
+
+    def test_preview_counts_only(self, auth_client, db, sample_rule):
+        import_category = Category(name='Import')
+        db.session.add(import_category)
+        db.session.commit()
+        txn_id = self._transaction(db, 'MIGROS KADIKOY', import_category).id
+
+        csrf = get_csrf_token(auth_client, '/rules/')
+        response = auth_client.post('/rules/reapply', data={
+            'scope': 'import', 'action': 'preview', 'csrf_token': csrf,
+        }, follow_redirects=True)
+        assert b'1 of 1 transactions would be re-categorized.' in response.data
+
+        with auth_client.application.app_context():
+            assert db.session.get(CashflowTransaction, txn_id).category.name == 'Import'
+
+    def test_apply(self, auth_client, db, sample_rule, sample_category):
+        txn_id = self._transaction(db, 'MIGROS MODA', sample_category).id
+        category_id = sample_rule.category_id
+
+        csrf = get_csrf_token(auth_client, '/rules/')
+        response = auth_client.post('/rules/reapply', data={
+            'scope': 'all', 'action': 'apply', 'csrf_token': csrf,
+        }, follow_redirects=True)
+        assert b'1 transactions re-categorized.' in response.data
+
+        with auth_client.application.app_context():
+            assert db.session.get(CashflowTransaction, txn_id).category_id == category_id
+
+    def test_invalid_scope(self, auth_client, db, sample_rule):
+        csrf = get_csrf_token(auth_client, '/rules/')
+        response = auth_client.post('/rules/reapply', data={
+            'scope': '9999', 'action': 'apply', 'csrf_token': csrf,
+        }, follow_redirects=True)
+        assert b'Please choose valid transactions to re-categorize.' in response.data
+
+    def test_status_unknown_job(self, auth_client):
+        response = auth_client.get('/rules/reapply/999')
+        assert response.status_code == 404
+
+
+@pytest.mark.integration
+class TestCategorizationRuleAnalyze:
+
+    def test_analyze_requires_login(self, client):
+        response = client.get('/rules/analyze')
+        assert response.status_code == 302
+
+    def test_analyze_report(self, auth_client, db, sample_rule, sample_subcategory, sample_category):
+        db.session.add(CategorizationRule(name='Migros Moda', priority=1, operator='starts_with',
+                                          value='migros moda', category_id=sample_subcategory.id))
+        db.session.add(CashflowTransaction(date=date(2024, 1, 1), type='expense', amount=10,
+                                           description='MIGROS MODA', category_id=sample_category.id))
+        db.session.commit()
+
+        response = auth_client.get('/rules/analyze?limit=100')
+        assert response.status_code == 200
+        assert b'Can never fire' in response.data
+        assert b'shadowed by Test Rule' in response.data
+        assert b'last 1 transaction.' in response.data
+
+    def test_analyze_clamps_limit(self, auth_client, sample_rule):
+        response = auth_client.get('/rules/analyze?limit=-5')
+        assert response.status_code == 200
+        assert b'value="1"' in response.data
+
+
+@pytest.mark.integration
+class TestCategorizationRuleTransfer:
+
+    def test_export(self, auth_client, db, sample_rule, sample_tag):
+        sample_rule.tags = [sample_tag]
+        db.session.commit()
+        response = auth_client.get('/rules/export')
+        assert response.status_code == 200
+        assert 'attachment' in response.headers['Content-Disposition']
+        data = json.loads(response.data)
+        assert data['rules'][0]['name'] == 'Test Rule'
+        assert data['rules'][0]['tags'] == [sample_tag.name]
+
+    def test_import_round_trip(self, auth_client, db, sample_rule):
+        exported = auth_client.get('/rules/export').data
+        csrf = get_csrf_token(auth_client, '/rules/')
+        response = auth_client.post('/rules/import', data={
+            'csrf_token': csrf,
+            'mode': 'append',
+            'rules_file': (BytesIO(exported), 'rules.json'),
+        }, content_type='multipart/form-data', follow_redirects=True)
+        assert b'1 rules imported.' in response.data
+        with auth_client.application.app_context():
+            assert CategorizationRule.query.filter_by(name='Test Rule').count() == 2
+
+    def test_import_invalid_json(self, auth_client, db):
+        csrf = get_csrf_token(auth_client, '/rules/')
+        response = auth_client.post('/rules/import', data={
+            'csrf_token': csrf,
+            'rules_file': (BytesIO(b'not json'), 'rules.json'),
+        }, content_type='multipart/form-data', follow_redirects=True)
+        assert b'The rules file is not valid JSON.' in response.data
+
+    def test_import_unknown_category_changes_nothing(self, auth_client, db, sample_rule):
+        payload = {'rules': [{'name': 'X', 'operator': 'contains', 'value': 'x', 'category': 'Nowhere'}]}
+        csrf = get_csrf_token(auth_client, '/rules/')
+        response = auth_client.post('/rules/import', data={
+            'csrf_token': csrf,
+            'mode': 'replace',
+            'rules_file': (BytesIO(json.dumps(payload).encode()), 'rules.json'),
+        }, content_type='multipart/form-data', follow_redirects=True)
+        assert b'Unknown categories: Nowhere' in response.data
+        with auth_client.application.app_context():
+            assert CategorizationRule.query.count() == 1
+
+    def test_import_requires_file(self, auth_client, db):
+        csrf = get_csrf_token(auth_client, '/rules/')
+        response = auth_client.post('/rules/import', data={'csrf_token': csrf}, follow_redirects=True)
+        assert b'Please select a rules file.' in response.data
@@ -1,4 +1,5 @@
 """Integration tests for category routes (/categories)."""
+import re
 import pytest
 from datetime import date
 from tests.conftest import get_csrf_token
@@ -30,6 +31,23 @@ class TestCategoryIndexRoute:
         assert response.status_code == 200
         assert b'Test Category' in response.data
 
+    def test_index_counts_from_stats_table(self, auth_client, capture_queries, sample_category, sample_subcategory):
+        """GET /categories/ shows rolled-up counts without querying cashflow_transaction."""
+        db.session.add_all([
+            CashflowTransaction(date=date(2024, 1, 1), type='expense', amount=10, description='a',
+                                category_id=sample_subcategory.id),
+            CashflowTransaction(date=date(2024, 1, 2), type='expense', amount=20, description='b',
+                                category_id=sample_subcategory.id),
+        ])
+        db.session.commit()
+
+        response, statements = capture_queries(lambda: auth_client.get('/categories/'))
+        assert response.status_code == 200
+        assert not any('FROM cashflow_transaction' in statement for statement in statements)
+        assert any('category_stats' in statement for statement in statements)
+        # The whole tree comes from one SELECT; no lazy load per parent
+        assert len([statement for statement in statements if re.search(r'FROM category\b(?!_)', statement)]) == 1
+
     def test_index_requires_auth(self, client, admin_user):
         """GET /categories/ redirects to login when not authenticated."""
         response = client.get('/categories/', follow_redirects=False)
@@ -236,6 +254,24 @@ class TestDeleteCategoryRoute:
         assert response.status_code == 200
         assert b'has linked transactions' in response.data
 
+    def test_delete_and_move_transactions(self, auth_client, app, db, sample_transaction, sample_category):
+        """POST /categories/delete/<id> with target_id moves the transactions, then deletes."""
+        target = Category(name='Target')
+        db.session.add(target)
+        db.session.commit()
+        cat_id, target_id = sample_category.id, target.id
+
+        csrf = get_csrf_token(auth_client, '/categories/')
+        response = auth_client.post(f'/categories/delete/{cat_id}', data={
+            'csrf_token': csrf, 'target_id': target_id,
+        }, follow_redirects=True)
+        assert response.status_code == 200
+        assert b'1 transactions and 0 rules moved to Target' in response.data
+
+        with app.app_context():
+            assert db.session.get(Category, cat_id) is None
+            assert db.session.get(CashflowTransaction, sample_transaction.id).category_id == target_id
+
     def test_delete_nonexistent_category(self, auth_client):
         """POST /categories/delete/99999 for nonexistent ID redirects (404 handler)."""
         csrf = get_csrf_token(auth_client, '/categories/add')
@@ -257,3 +293,43 @@ class TestDeleteCategoryRoute:
         with app.app_context():
             sub = db.session.get(Category,sub_id)
             assert sub is None
+
+
+class TestMergeCategoryRoute:
+    """Tests for POST /categories/merge/<id>."""
+
+    def test_merge_moves_subcategories(self, auth_client, app, db, sample_category, sample_subcategory):
+        """Merging moves subcategories under the target and removes the source."""
+        target = Category(name='Target')
+        db.session.add(target)
+        db.session.commit()
+        cat_id, sub_id, target_id = sample_category.id, sample_subcategory.id, target.id
+
+        csrf = get_csrf_token(auth_client, '/categories/')
+        response = auth_client.post(f'/categories/merge/{cat_id}', data={
+            'csrf_token': csrf, 'target_id': target_id,
+        }, follow_redirects=True)
+        assert response.status_code == 200
+        assert b'Categories merged' in response.data
+
+        with app.app_context():
+            assert db.session.get(Category, cat_id) is None
+            assert db.session.get(Category, sub_id).parent_id == target_id
+
+    def test_merge_into_own_subcategory_rejected(self, auth_client, sample_category, sample_subcategory):
+        """Merging a parent into its own subcategory shows an error and changes nothing."""
+        csrf = get_csrf_token(auth_client, '/categories/')
+        response = auth_client.post(f'/categories/merge/{sample_category.id}', data={
+            'csrf_token': csrf, 'target_id': sample_subcategory.id,
+        }, follow_redirects=True)
+        assert response.status_code == 200
+        assert b'its own subcategories' in response.data
+        assert db.session.get(Category, sample_category.id) is not None
+
+    def test_merge_requires_target(self, auth_client, sample_category):
+        """A missing target redirects back with an error."""
+        csrf = get_csrf_token(auth_client, '/categories/')
+        response = auth_client.post(f'/categories/merge/{sample_category.id}', data={
+            'csrf_token': csrf,
+        }, follow_redirects=True)
+        assert b'Pick a category to move into' in response.data
@@ -5,6 +5,8 @@ from models.settings import Settings
 from models.category import Category
 from models.tag import Tag
 from models.cashflow import CashflowTransaction
+from models.category_stats import CategoryStats
+from models.tag_stats import TagStats
 
 
 pytestmark = pytest.mark.integration
@@ -180,6 +182,22 @@ class TestResetDatabaseRoute:
             assert Category.query.count() == 0
             assert Tag.query.count() == 0
 
+    def test_reset_database_clears_stats(self, auth_client, app, db, sample_transaction):
+        """POST /settings/reset-database empties the maintained stats tables too."""
+        with app.app_context():
+            assert db.session.query(CategoryStats).count() > 0
+            assert db.session.query(TagStats).count() > 0
+
+        csrf = get_csrf_token(auth_client, '/settings/')
+        response = auth_client.post('/settings/reset-database', data={
+            'csrf_token': csrf,
+        }, follow_redirects=True)
+        assert b'All data cleared' in response.data
+
+        with app.app_context():
+            assert db.session.query(CategoryStats).count() == 0
+            assert db.session.query(TagStats).count() == 0
+
     def test_reset_database_handles_empty_db(self, auth_client, app, db):
         """POST /settings/reset-database on empty database succeeds gracefully."""
         csrf = get_csrf_token(auth_client, '/settings/')
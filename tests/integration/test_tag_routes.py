@@ -1,8 +1,10 @@
 """Integration tests for tag routes (/tags)."""
 import pytest
+from datetime import date
 from tests.conftest import get_csrf_token
 from models import db
 from models.tag import Tag
+from models.cashflow import CashflowTransaction
 
 
 pytestmark = pytest.mark.integration
@@ -36,6 +38,20 @@ class TestTagIndexRoute:
         zebra_pos = data.find('Zebra Tag')
         assert alpha_pos < zebra_pos
 
+    def test_index_counts_from_stats_table(self, auth_client, capture_queries, sample_tag, sample_category):
+        """GET /tags/ shows tag counts without querying cashflow_transaction."""
+        db.session.add_all([
+            CashflowTransaction(date=date(2024, 1, day), type='expense', amount=10, description='a',
+                                category_id=sample_category.id, tags=[sample_tag])
+            for day in (1, 2)
+        ])
+        db.session.commit()
+
+        response, statements = capture_queries(lambda: auth_client.get('/tags/'))
+        assert response.status_code == 200
+        assert not any('FROM cashflow_transaction' in statement for statement in statements)
+        assert any('tag_stats' in statement for statement in statements)
+
     def test_index_requires_auth(self, client, admin_user):
         """GET /tags/ redirects to login when not authenticated."""
         response = client.get('/tags/', follow_redirects=False)
@@ -216,3 +232,42 @@ class TestDeleteTagRoute:
         }, follow_redirects=False)
         assert response.status_code == 302
         assert '/tags/' in response.headers.get('Location', '')
+
+
+class TestMergeTagRoute:
+    """Tests for POST /tags/merge/<id>."""
+
+    def test_merge_moves_transactions(self, auth_client, app, db, sample_transaction, sample_tag):
+        """Merging moves the links to the target and removes the source tag."""
+        target = Tag(name='Target')
+        db.session.add(target)
+        db.session.commit()
+        tag_id, target_id = sample_tag.id, target.id
+
+        csrf = get_csrf_token(auth_client, '/tags/')
+        response = auth_client.post(f'/tags/merge/{tag_id}', data={
+            'csrf_token': csrf, 'target_id': target_id,
+        }, follow_redirects=True)
+        assert response.status_code == 200
+        assert b'1 transactions and 0 rules moved to Target' in response.data
+
+        with app.app_context():
+            assert db.session.get(Tag, tag_id) is None
+            txn = db.session.get(CashflowTransaction, sample_transaction.id)
+            assert [tag.name for tag in txn.tags] == ['Target']
+
+    def test_merge_requires_target(self, auth_client, sample_tag):
+        """A missing target redirects back with an error."""
+        csrf = get_csrf_token(auth_client, '/tags/')
+        response = auth_client.post(f'/tags/merge/{sample_tag.id}', data={
+            'csrf_token': csrf,
+        }, follow_redirects=True)
+        assert b'Pick a tag to merge into' in response.data
+
+    def test_edit_page_offers_merge(self, auth_client, sample_tag):
+        """The edit page lists the other tags as merge targets."""
+        db.session.add(Tag(name='Other Tag'))
+        db.session.commit()
+        response = auth_client.get(f'/tags/edit/{sample_tag.id}')
+        assert b'Merge Into Another Tag' in response.data
+        assert b'Other Tag' in response.data
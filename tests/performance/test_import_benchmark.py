@@ -0,0 +1,39 @@
+"""Smoke tests keeping the import benchmark runnable."""
+import pytest
+
+from benchmarks.import_benchmark import run_benchmark, format_report, main, STAGES
+from benchmarks.statements import format_turkish_amount, generate_statement
+from utils.excel_processor import process_excel_data
+
+
+@pytest.mark.performance
+class TestSyntheticStatements:
+
+    def test_turkish_amount_format(self):
+        assert format_turkish_amount(1234.5) == '1.234,50 TL'
+        assert format_turkish_amount(45000, income=True) == '+45.000,00 TL'
+
+    @pytest.mark.parametrize('bank_code', ['yapikredi', 'kuveytturk'])
+    def test_statement_parses_as_its_bank(self, bank_code):
+        result = process_excel_data(generate_statement(bank_code, 600), None, filename='statement.xlsx')
+        assert result['bank_code'] == bank_code
+        assert result['successful'] == 600
+        assert result['failed'] == 0
+        assert any(t['type'] == 'income' for t in result['transactions'])
+
+
+@pytest.mark.performance
+class TestImportBenchmark:
+
+    def test_reports_every_stage(self, tmp_path):
+        report = run_benchmark(f"sqlite:///{tmp_path / 'bench.db'}", 'kuveytturk', 200, rules=5)
+
+        assert report['imported'] == 200
+        for stage in STAGES:
+            assert report[stage]['seconds'] > 0
+            assert report[stage]['peak_mb'] > 0
+        assert 'categorize' in format_report('sqlite', report)
+
+    def test_cli(self, capsys):
+        assert main(['--rows', '100', '--banks', 'yapikredi', '--rules', '3', '--no-memory']) == 0
+        assert 'yapikredi' in capsys.readouterr().out
@@ -0,0 +1,49 @@
+"""Boot-time import checks: the data stack stays out of the web workers until an import runs."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Loaded only by the statement parser
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl')
+
+
+def _importtime(code):
+    """Run code under -X importtime; returns {module: cumulative microseconds}"""
+    env = dict(os.environ, FLASK_ENV='testing')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        timings[module.strip()] = int(cumulative)
+    return timings
+
+
+@pytest.mark.performance
+class TestImportTime:
+
+    def test_app_boot_skips_data_stack(self):
+        timings = _importtime('import app')
+        assert 'app' in timings
+        assert not [module for module in HEAVY_MODULES if module in timings]
+
+    def test_utils_reexports_load_on_first_use(self):
+        timings = _importtime('import utils; assert utils.ExcelImportError.__name__ == "ExcelImportError"')
+        assert 'pandas' in timings
+
+    def test_parsing_loads_data_stack(self):
+        timings = _importtime(
+            'from io import BytesIO\n'
+            'from utils.importer import parse_statements\n'
+            'parse_statements([("s.csv", BytesIO(b"Tarih,Tutar\\n"))], "yapikredi")\n'
+        )
+        assert 'pandas' in timings
@@ -1,7 +1,13 @@
 """Unit tests for bank Excel-format configuration lookup."""
 import pytest
 
-from utils.bank_configs import get_bank_config, BANK_CONFIGS
+from utils.bank_configs import (
+    get_bank_config,
+    compile_columns,
+    compile_header_index,
+    detect_bank,
+    BANK_CONFIGS,
+)
 
 
 @pytest.mark.unit
@@ -127,3 +133,32 @@ class TestGetBankConfig:
                 for alt in alternatives:
                     assert isinstance(alt, str), \
                         f"Bank '{bank_code}' field '{field}' has non-string alternative"
+
+
+@pytest.mark.unit
+class TestHeaderLookups:
+    """Tests for the header lookups compiled from BANK_CONFIGS."""
+
+    def test_compile_columns_keeps_preference_order(self):
+        lookup = compile_columns({'date': ['İşlem Tarihi', 'Tarih'], 'amount': ['Tutar']})
+        assert lookup['işlem tarihi'] == ('date', 0)
+        assert lookup['tarih'] == ('date', 1)
+        assert lookup['tutar'] == ('amount', 0)
+
+    def test_header_index_lists_every_bank(self):
+        index = compile_header_index(BANK_CONFIGS)
+        assert ('kuveytturk', 'amount', 0) in index['tutar']
+        assert ('yapikredi', 'amount', 0) in index['tutar']
+
+    def test_detect_yapikredi(self):
+        assert detect_bank(['İşlem Tarihi', 'İşlemler', 'Tutar']) == 'yapikredi'
+
+    def test_detect_kuveytturk(self):
+        assert detect_bank(['Tarih', 'Açıklama', 'Tutar']) == 'kuveytturk'
+
+    def test_detect_ignores_case_and_spacing(self):
+        assert detect_bank(['  TARİH ', 'AÇIKLAMA', 'tutar']) == 'kuveytturk'
+
+    def test_detect_unknown_header(self):
+        assert detect_bank(['Date', 'Description', 'Amount']) is None
+        assert detect_bank(['Banka Bilgi']) is None
@@ -0,0 +1,113 @@
+"""Unit tests for the batched transaction insert path."""
+import pytest
+from datetime import date
+
+from models.cashflow import CashflowTransaction, cashflow_transaction_tags
+from models.tag import Tag
+from utils.bulk_insert import bulk_insert_transactions
+
+
+def _row(category_id, description, tag_ids=None, amount=10, fingerprint=None):
+    return {
+        'date': date(2024, 1, 15),
+        'type': 'expense',
+        'amount': amount,
+        'description': description,
+        'category_id': category_id,
+        'source': 'excel_import',
+        'fingerprint': fingerprint,
+        'tag_ids': tag_ids or [],
+    }
+
+
+@pytest.mark.unit
+class TestBulkInsertTransactions:
+
+    def test_returns_ids_in_row_order(self, db, sample_category):
+        rows = [_row(sample_category.id, f'Row {i}', amount=i + 1) for i in range(5)]
+        ids = bulk_insert_transactions(rows)
+        db.session.commit()
+
+        assert len(ids) == 5
+        for txn_id, row in zip(ids, rows):
+            txn = db.session.get(CashflowTransaction, txn_id)
+            assert txn.description == row['description']
+            assert txn.source == 'excel_import'
+            assert row['id'] == txn_id
+
+    def test_stores_normalized_description(self, db, sample_category):
+        rows = [_row(sample_category.id, 'MİGROS KADIKÖY'), _row(sample_category.id, None, amount=2)]
+        first, second = bulk_insert_transactions(rows)
+        db.session.commit()
+
+        assert db.session.get(CashflowTransaction, first).description_normalized == 'migros kadiköy'
+        assert db.session.get(CashflowTransaction, second).description_normalized is None
+
+    def test_inserts_tag_links(self, db, sample_category, sample_tag):
+        other = Tag(name='Other')
+        db.session.add(other)
+        db.session.commit()
+
+        ids = bulk_insert_transactions([
+            _row(sample_category.id, 'Tagged', [sample_tag.id, other.id]),
+            _row(sample_category.id, 'Untagged'),
+        ])
+        db.session.commit()
+
+        tagged = db.session.get(CashflowTransaction, ids[0])
+        untagged = db.session.get(CashflowTransaction, ids[1])
+        assert {t.name for t in tagged.tags} == {'Test Tag', 'Other'}
+        assert untagged.tags == []
+
+    def test_duplicate_tag_ids_collapsed(self, db, sample_category, sample_tag):
+        bulk_insert_transactions([_row(sample_category.id, 'Dup', [sample_tag.id, sample_tag.id])])
+        db.session.commit()
+
+        count = db.session.query(cashflow_transaction_tags).count()
+        assert count == 1
+
+    def test_statement_count_scales_with_batches(self, db, capture_queries, sample_category, sample_tag):
+        rows = [_row(sample_category.id, f'Row {i}', [sample_tag.id]) for i in range(250)]
+
+        def insert():
+            bulk_insert_transactions(rows, batch_size=100)
+            db.session.commit()
+        _, statements = capture_queries(insert, 'INSERT INTO')
+
+        assert CashflowTransaction.query.count() == 250
+        assert db.session.query(cashflow_transaction_tags).count() == 250
+        # 3 transaction batches + their link batches, far below one INSERT per row
+        assert len(statements) <= 10
+
+    def test_empty_rows(self, db):
+        assert bulk_insert_transactions([]) == []
+
+    def test_fingerprinted_rows_skip_existing(self, db, sample_category, sample_tag):
+        first = bulk_insert_transactions([
+            _row(sample_category.id, 'A', [sample_tag.id], fingerprint='fp-a'),
+            _row(sample_category.id, 'B', [sample_tag.id], fingerprint='fp-b'),
+        ])
+        db.session.commit()
+
+        second = bulk_insert_transactions([
+            _row(sample_category.id, 'B again', [sample_tag.id], fingerprint='fp-b'),
+            _row(sample_category.id, 'C', [sample_tag.id], fingerprint='fp-c'),
+        ])
+        db.session.commit()
+
+        assert len(first) == 2
+        assert len(second) == 1
+        assert db.session.get(CashflowTransaction, second[0]).description == 'C'
+        assert CashflowTransaction.query.count() == 3
+        # Skipped rows get no tag links
+        assert db.session.query(cashflow_transaction_tags).count() == 3
+
+    def test_progress_counts_processed_rows(self, db, sample_category):
+        bulk_insert_transactions([_row(sample_category.id, 'X', fingerprint='fp-x')])
+        db.session.commit()
+
+        seen = []
+        rows = [_row(sample_category.id, f'R{i}', fingerprint=f'fp-{i}') for i in range(5)]
+        rows.append(_row(sample_category.id, 'X', fingerprint='fp-x'))
+        bulk_insert_transactions(rows, batch_size=2, progress=seen.append)
+        assert seen == [2, 4, 6]
@@ -180,7 +180,34 @@ class TestCategorizationRuleMatching:
 
     def test_invalid_operator(self, app, db, sample_subcategory):
         rule = CategorizationRule(
-            name='R', operator='regex', value='test',
+            name='R', operator='glob', value='test',
             category_id=sample_subcategory.id,
         )
         assert rule.matches('test') is False
+
+    def test_regex_match(self, app, db, sample_subcategory):
+        rule = CategorizationRule(
+            name='R', operator='regex', value=r'^pos \d+ (migros|a101)',
+            category_id=sample_subcategory.id,
+        )
+        assert rule.matches('POS 4411 MİGROS KADIKOY') is True
+        assert rule.matches('POS MIGROS') is False
+
+    def test_invalid_regex_never_matches(self, app, db, sample_subcategory):
+        rule = CategorizationRule(
+            name='R', operator='regex', value='(test',
+            category_id=sample_subcategory.id,
+        )
+        assert rule.matches('(test') is False
+
+    def test_amount_and_type_conditions(self, app, db, sample_subcategory):
+        rule = CategorizationRule(
+            name='R', operator='contains', value='kira',
+            amount_min=1000, amount_max=5000, condition_type='expense',
+            category_id=sample_subcategory.id,
+        )
+        assert rule.matches('KIRA', 1000, 'expense') is True
+        assert rule.matches('KIRA', -5000, 'expense') is True
+        assert rule.matches('KIRA', 5000.01, 'expense') is False
+        assert rule.matches('KIRA', 2000, 'income') is False
+        assert rule.matches('KIRA') is False
@@ -0,0 +1,78 @@
+"""Unit tests for the set-based category merge."""
+import pytest
+
+from models.cashflow import CashflowTransaction
+from models.categorization_rule import CategorizationRule
+from models.category import Category
+from utils.category_merge import merge_category, CategoryMergeError
+from utils.rule_cache import get_rules_version
+from utils.transaction_stats import load_category_stats, rebuild_stats
+from tests.conftest import make_transaction
+
+
+@pytest.fixture()
+def target(db):
+    category = Category(name='Target')
+    db.session.add(category)
+    db.session.commit()
+    return category
+
+
+@pytest.mark.unit
+class TestMergeCategory:
+
+    def test_moves_transactions_rules_and_stats(self, db, sample_category, target):
+        txns = [make_transaction(sample_category.id, 'expense', 10),
+                make_transaction(sample_category.id, 'income', 25.5),
+                make_transaction(target.id, 'expense', 4)]
+        rule = CategorizationRule(name='Rule', priority=0, operator='contains', value='x',
+                                  category_id=sample_category.id)
+        db.session.add_all(txns + [rule])
+        db.session.commit()
+        source_id = sample_category.id
+        version = get_rules_version()
+
+        moved = merge_category(sample_category, target)
+        db.session.commit()
+
+        assert moved == {'transactions': 2, 'rules': 1, 'subcategories': 0}
+        assert db.session.get(Category, source_id) is None
+        assert {txn.category_id for txn in CashflowTransaction.query.all()} == {target.id}
+        assert db.session.get(CategorizationRule, rule.id).category_id == target.id
+        assert get_rules_version() != version
+
+        stats = load_category_stats(db.session)
+        assert source_id not in stats
+        assert (stats[target.id]['expense'], stats[target.id]['income']) == (2, 1)
+        assert float(stats[target.id]['expense_total']) == 14
+        rebuild_stats(db.session)
+        assert load_category_stats(db.session) == stats
+
+    def test_single_update_per_table(self, db, capture_queries, sample_category, target):
+        db.session.add_all([make_transaction(sample_category.id) for _ in range(5)])
+        db.session.commit()
+
+        def merge():
+            merge_category(sample_category, target)
+            db.session.commit()
+        _, statements = capture_queries(merge, 'UPDATE cashflow_transaction SET')
+        assert len(statements) == 1
+
+    def test_moves_subcategories(self, db, sample_category, sample_subcategory, target):
+        merge_category(sample_category, target)
+        db.session.commit()
+        assert db.session.get(Category, sample_subcategory.id).parent_id == target.id
+
+    def test_rejects_own_subcategory(self, db, sample_category, sample_subcategory):
+        with pytest.raises(CategoryMergeError):
+            merge_category(sample_category, sample_subcategory)
+
+    def test_rejects_subcategory_name_clash(self, db, sample_category, sample_subcategory, target):
+        db.session.add(Category(name='Test Subcategory', parent_id=target.id))
+        db.session.commit()
+        with pytest.raises(CategoryMergeError, match='Test Subcategory'):
+            merge_category(sample_category, target)
+
+    def test_rejects_same_category(self, db, sample_category):
+        with pytest.raises(CategoryMergeError):
+            merge_category(sample_category, sample_category)
@@ -1,6 +1,8 @@
 """Unit tests for the Excel/CSV import processor utilities."""
+import io
 import pytest
 import os
+import tempfile
 from datetime import datetime
 
 import pandas as pd
@@ -10,6 +12,7 @@ from utils.excel_processor import (
     parse_date,
     read_file_with_header_detection,
     map_columns,
+    detect_statement_bank,
     process_excel_data,
     ExcelImportError,
 )
@@ -271,6 +274,34 @@ class TestReadFileWithHeaderDetection:
         assert 'Date' in df.columns
         assert len(df) == 1
 
+    def test_csv_from_bytes(self):
+        """Raw bytes are parsed with the extension taken from filename."""
+        data = 'Bank,,\nTarih,Tutar,Aciklama\n01/01/2024,500,Salary\n'.encode('utf-8')
+        df = read_file_with_header_detection(data, {'header_row_identifier': 'Tarih'}, filename='bank.csv')
+        assert 'Tarih' in df.columns
+        assert len(df) == 1
+
+    def test_xlsx_from_file_object(self):
+        """Binary file-like objects are read without touching disk."""
+        buffer = io.BytesIO()
+        pd.DataFrame({'Date': ['2024-01-01'], 'Amount': [100]}).to_excel(buffer, index=False)
+        buffer.seek(0)
+
+        df = read_file_with_header_detection(buffer, filename='upload.xlsx')
+        assert 'Date' in df.columns
+        assert len(df) == 1
+
+    def test_file_object_reread_on_fallback(self):
+        """The fallback read rewinds the stream instead of reading an exhausted one."""
+        buffer = io.BytesIO(b'ColA,ColB\n1,2\n')
+        df = read_file_with_header_detection(buffer, {'header_row_identifier': 'Missing'}, filename='data.csv')
+        assert list(df.columns) == ['ColA', 'ColB']
+
+    def test_file_object_without_filename_raises(self):
+        """Without a filename the format cannot be determined."""
+        with pytest.raises(ExcelImportError, match='Unsupported file format'):
+            read_file_with_header_detection(io.BytesIO(b'a,b\n1,2\n'))
+
 
 # ---------------------------------------------------------------------------
 # map_columns
@@ -335,6 +366,41 @@ class TestMapColumns:
         assert 'date' in mapping
         assert 'amount' not in mapping
 
+    def test_preferred_alternative_wins_regardless_of_column_order(self):
+        """A later column with a preferred name replaces an earlier fallback."""
+        df = pd.DataFrame(columns=['Açıklama', 'Tarih', 'İşlemler', 'Tutar'])
+        config = {
+            'columns': {
+                'date': ['Tarih'],
+                'amount': ['Tutar'],
+                'description': ['İşlemler', 'Açıklama'],
+            }
+        }
+        assert map_columns(df, config)['description'] == 'İşlemler'
+
+
+# ---------------------------------------------------------------------------
+# detect_statement_bank
+# ---------------------------------------------------------------------------
+@pytest.mark.unit
+class TestDetectStatementBank:
+    """Tests for bank detection from a statement's header row."""
+
+    def test_detects_yapikredi_after_junk_rows(self):
+        data = 'Banka Bilgi,,\nHesap No: 123,,\nİşlem Tarihi,İşlemler,Tutar\n15/01/2024,Market,"250,50"\n'
+        assert detect_statement_bank(data.encode('utf-8'), filename='yk.csv') == 'yapikredi'
+
+    def test_detects_kuveytturk_xlsx(self, tmp_path):
+        xlsx_file = tmp_path / 'kt.xlsx'
+        pd.DataFrame([['Tarih', 'Açıklama', 'Tutar'], [datetime(2024, 1, 1), 'Havale', 1000]]).to_excel(
+            str(xlsx_file), index=False, header=False
+        )
+        assert detect_statement_bank(str(xlsx_file)) == 'kuveytturk'
+
+    def test_unknown_format_raises(self):
+        with pytest.raises(ExcelImportError, match='Could not detect the bank'):
+            detect_statement_bank(b'Date,Description,Amount\n2024-01-01,x,1\n', filename='other.csv')
+
 
 # ---------------------------------------------------------------------------
 # process_excel_data (integration-style unit test using xlsx)
@@ -391,6 +457,33 @@ class TestProcessExcelData:
         assert 'transactions' in result
         assert result['successful'] >= 0
 
+    def test_kuveytturk_bold_rows_from_spooled_file(self):
+        """Bold detection works on an in-memory upload (SpooledTemporaryFile)."""
+        import openpyxl
+        from openpyxl.styles import Font
+
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.append(['Tarih', 'Açıklama', 'Tutar'])
+        ws.append([datetime(2024, 1, 1), 'İade', 100])
+        ws.append([datetime(2024, 1, 2), 'Market', 250])
+        ws['A2'].font = Font(bold=True)
+
+        with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as upload:
+            wb.save(upload)
+            upload.seek(0)
+            result = process_excel_data(upload, 'kuveytturk', filename='statement.xlsx')
+
+        types = {t['description']: t['type'] for t in result['transactions']}
+        assert types == {'İade': 'income', 'Market': 'expense'}
+
+    def test_bank_detected_when_not_given(self):
+        """Without a bank_code the bank is detected and reported in the result."""
+        data = 'İşlem Tarihi,İşlemler,Tutar\n01/01/2024,Skip,1\n02/01/2024,Skip,1\n03/01/2024,Market,"300,00"\n'
+        result = process_excel_data(data.encode('utf-8'), None, filename='statement.csv')
+        assert result['bank_code'] == 'yapikredi'
+        assert [t['description'] for t in result['transactions']] == ['Market']
+
     def test_missing_required_columns_raises(self, tmp_path):
         """Missing required columns raise ExcelImportError."""
         csv_file = tmp_path / 'bad.csv'
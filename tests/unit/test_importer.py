@@ -0,0 +1,224 @@
+"""Unit tests for the statement import pipeline."""
+import pytest
+import zipfile
+from datetime import datetime
+from io import BytesIO
+
+import pandas as pd
+
+from models.cashflow import CashflowTransaction, cashflow_transaction_tags
+from models.categorization_rule import CategorizationRule
+from models.import_batch import ImportBatch
+from utils.importer import run_import, rollback_import_batch
+from utils.jobs import JobError
+from tests.conftest import STATEMENT_CSV, OTHER_STATEMENT_CSV, noop_progress
+
+
+def _upload(content, filename):
+    return (filename, BytesIO(content.encode('utf-8')))
+
+
+def _zip(entries):
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, content in entries.items():
+            archive.writestr(name, content)
+    buffer.seek(0)
+    return buffer
+
+
+def _import(content=STATEMENT_CSV, filename='statement.csv'):
+    return run_import(noop_progress, [(filename, BytesIO(content.encode('utf-8')))], 'yapikredi')
+
+
+@pytest.mark.unit
+class TestRunImport:
+
+    def test_records_import_batch(self, db):
+        result = _import()
+
+        batch = db.session.get(ImportBatch, result['batch_ids'][0])
+        assert batch.status == ImportBatch.COMPLETED
+        assert batch.file_name == 'statement.csv'
+        assert batch.bank_code == 'yapikredi'
+        assert batch.total_rows == 2
+        assert batch.imported_count == 2
+        assert batch.skipped_count == 0
+        assert batch.parse_ms is not None
+        assert batch.insert_ms is not None
+        assert batch.finished_at is not None
+        assert batch.transactions.count() == 2
+
+    def test_duplicates_counted_on_batch(self, db):
+        _import()
+        result = _import()
+
+        batch = db.session.get(ImportBatch, result['batch_ids'][0])
+        assert batch.imported_count == 0
+        assert batch.skipped_count == 2
+
+    def test_parse_error_raises_job_error(self, db):
+        with pytest.raises(JobError, match='Excel import error'):
+            _import('RandomCol\nvalue\n')
+
+    def test_upload_is_closed(self, db):
+        upload = BytesIO(STATEMENT_CSV.encode('utf-8'))
+        run_import(noop_progress, [('statement.csv', upload)], 'yapikredi')
+        assert upload.closed
+
+    def test_rules_with_amount_conditions(self, db, sample_subcategory):
+        db.session.add_all([
+            CategorizationRule(name='Big groceries', priority=1, operator='regex', value=r'^migros\b',
+                               amount_min=200, category_id=sample_subcategory.id),
+            CategorizationRule(name='Big coffee', priority=2, operator='contains', value='kahve',
+                               amount_min=100, category_id=sample_subcategory.id),
+        ])
+        db.session.commit()
+
+        _import()
+
+        migros = CashflowTransaction.query.filter_by(description='MIGROS KADIKOY').one()
+        coffee = CashflowTransaction.query.filter_by(description='Kahve').one()
+        assert migros.category_id == sample_subcategory.id
+        assert coffee.category_id != sample_subcategory.id
+
+    def test_rule_hits_and_categorize_time(self, db, sample_rule):
+        result = _import()
+
+        batch = db.session.get(ImportBatch, result['batch_ids'][0])
+        assert batch.categorize_ms is not None
+        db.session.refresh(sample_rule)
+        assert sample_rule.hit_count == 1
+        assert sample_rule.last_hit_at is not None
+
+        # Duplicates skipped on re-import are not counted again
+        _import()
+        db.session.refresh(sample_rule)
+        assert sample_rule.hit_count == 1
+
+
+@pytest.mark.unit
+class TestMultiFileImport:
+
+    def test_one_batch_per_file(self, db):
+        result = run_import(noop_progress, [
+            _upload(STATEMENT_CSV, 'january.csv'),
+            _upload(OTHER_STATEMENT_CSV, 'february.csv'),
+        ], 'yapikredi')
+
+        assert result['imported'] == 3
+        assert [f['file_name'] for f in result['files']] == ['january.csv', 'february.csv']
+        assert [f['imported'] for f in result['files']] == [2, 1]
+        batches = [db.session.get(ImportBatch, batch_id) for batch_id in result['batch_ids']]
+        assert [batch.transactions.count() for batch in batches] == [2, 1]
+
+    def test_overlapping_files_in_one_upload(self, db):
+        # Shares the Kahve row with STATEMENT_CSV
+        overlapping = STATEMENT_CSV + '05/01/2024,A101 MODA,"80,00"\n'
+        result = run_import(noop_progress, [
+            _upload(STATEMENT_CSV, 'statement.csv'),
+            _upload(overlapping, 'overlapping.csv'),
+        ], 'yapikredi')
+
+        assert result['imported'] == 3
+        assert result['skipped'] == 2
+        assert [(f['imported'], f['skipped']) for f in result['files']] == [(2, 0), (1, 2)]
+        assert CashflowTransaction.query.count() == 3
+        links = db.session.query(cashflow_transaction_tags).all()
+        assert sorted(txn_id for txn_id, _ in links) == sorted(txn.id for txn in CashflowTransaction.query)
+
+    def test_failed_file_does_not_block_others(self, db):
+        result = run_import(noop_progress, [
+            _upload('RandomCol\nvalue\n', 'bad.csv'),
+            _upload(STATEMENT_CSV, 'good.csv'),
+        ], 'yapikredi')
+
+        assert result['imported'] == 2
+        assert 'Excel import error' in result['files'][0]['error']
+        assert result['files'][1]['imported'] == 2
+
+    def test_all_files_failing_raises_job_error(self, db):
+        with pytest.raises(JobError, match='bad.csv'):
+            run_import(noop_progress, [
+                _upload('RandomCol\nvalue\n', 'bad.csv'),
+                _upload('a,b\n1,2\n', 'worse.csv'),
+            ], 'yapikredi')
+
+    def test_zip_archive_is_expanded(self, db):
+        archive = _zip({
+            'statements/january.csv': STATEMENT_CSV,
+            'statements/february.csv': OTHER_STATEMENT_CSV,
+            '__MACOSX/statements/._january.csv': 'junk',
+            'notes.txt': 'ignored',
+        })
+        result = run_import(noop_progress, [('statements.zip', archive)], 'yapikredi')
+
+        assert result['imported'] == 3
+        assert sorted(f['file_name'] for f in result['files']) == ['february.csv', 'january.csv']
+        assert archive.closed
+
+    def test_zip_without_statements(self, db):
+        with pytest.raises(JobError, match='No statement files'):
+            run_import(noop_progress, [('empty.zip', _zip({'notes.txt': 'x'}))], 'yapikredi')
+
+    def test_invalid_zip(self, db):
+        with pytest.raises(JobError, match='Could not open ZIP archive'):
+            run_import(noop_progress, [_upload('not a zip', 'broken.zip')], 'yapikredi')
+
+    def test_zip_size_limit(self, app, db, monkeypatch):
+        monkeypatch.setitem(app.config, 'IMPORT_MAX_UNZIPPED_SIZE', 10)
+        with pytest.raises(JobError, match='too large'):
+            run_import(noop_progress, [('big.zip', _zip({'a.csv': STATEMENT_CSV}))], 'yapikredi')
+
+    def test_bank_detected_per_file(self, db):
+        kuveytturk = BytesIO()
+        pd.DataFrame([['Tarih', 'Açıklama', 'Tutar'], [datetime(2024, 2, 5), 'Market', 120]]).to_excel(
+            kuveytturk, index=False, header=False
+        )
+        kuveytturk.seek(0)
+        result = run_import(noop_progress, [
+            _upload(STATEMENT_CSV, 'yapikredi.csv'),
+            ('kuveytturk.xlsx', kuveytturk),
+        ], None)
+
+        batches = [db.session.get(ImportBatch, batch_id) for batch_id in result['batch_ids']]
+        assert [batch.bank_code for batch in batches] == ['yapikredi', 'kuveytturk']
+        market = CashflowTransaction.query.filter_by(description='Market').one()
+        assert [tag.name for tag in market.tags] == ['Kuveyt Türk']
+
+    def test_parses_in_worker_processes(self, app, db, monkeypatch):
+        monkeypatch.setitem(app.config, 'IMPORT_PARSE_WORKERS', 2)
+        result = run_import(noop_progress, [
+            _upload(STATEMENT_CSV, 'january.csv'),
+            _upload(OTHER_STATEMENT_CSV, 'february.csv'),
+        ], 'yapikredi')
+
+        assert result['imported'] == 3
+        assert [f['imported'] for f in result['files']] == [2, 1]
+
+
+@pytest.mark.unit
+class TestRollbackImportBatch:
+
+    def test_removes_only_batch_rows(self, db, sample_transaction):
+        result = _import()
+        batch = db.session.get(ImportBatch, result['batch_ids'][0])
+
+        removed = rollback_import_batch(batch)
+        db.session.commit()
+
+        assert removed == 2
+        assert batch.status == ImportBatch.ROLLED_BACK
+        assert batch.rolled_back_at is not None
+        assert CashflowTransaction.query.count() == 1
+        # Only the manual transaction's tag link remains
+        links = db.session.query(cashflow_transaction_tags).all()
+        assert [link.cashflow_transaction_id for link in links] == [sample_transaction.id]
+
+    def test_reimport_after_rollback(self, db):
+        batch = db.session.get(ImportBatch, _import()['batch_ids'][0])
+        rollback_import_batch(batch)
+        db.session.commit()
+
+        result = _import()
+        assert result['imported'] == 2
@@ -0,0 +1,139 @@
+"""Unit tests for the background job runner."""
+import pytest
+from datetime import datetime, timedelta, timezone
+
+from models.background_job import BackgroundJob
+from models.category import Category
+from utils import jobs
+from utils.jobs import submit_job, load_job, JobError
+
+
+def _create_category(progress, name):
+    from models import db
+    progress(0, 1, force=True)
+    db.session.add(Category(name=name))
+    db.session.commit()
+    return {'total': 1, 'name': name}
+
+
+def _fail_with_job_error(progress):
+    raise JobError('Excel import error: bad file')
+
+
+def _fail_unexpectedly(progress):
+    raise RuntimeError('internal detail')
+
+
+@pytest.mark.unit
+class TestSubmitJob:
+
+    def test_inline_job_completes(self, db):
+        job = submit_job('import', _create_category, 'From Job')
+
+        assert job.status == BackgroundJob.COMPLETED
+        assert job.result == {'total': 1, 'name': 'From Job'}
+        assert job.progress == 1
+        assert job.started_at is not None
+        assert job.finished_at is not None
+        assert Category.query.filter_by(name='From Job').count() == 1
+
+    def test_job_error_message_is_kept(self, db):
+        job = submit_job('import', _fail_with_job_error)
+
+        assert job.status == BackgroundJob.FAILED
+        assert job.message == 'Excel import error: bad file'
+        assert job.is_finished
+
+    def test_unexpected_error_message_is_generic(self, db):
+        job = submit_job('import', _fail_unexpectedly)
+
+        assert job.status == BackgroundJob.FAILED
+        assert 'internal detail' not in job.message
+
+    def test_background_job_is_queued(self, app, db, monkeypatch):
+        submitted = []
+
+        class FakeExecutor:
+            def submit(self, fn, *args):
+                submitted.append(args)
+
+        monkeypatch.setitem(app.config, 'JOBS_RUN_INLINE', False)
+        monkeypatch.setattr('utils.jobs._get_executor', lambda app: FakeExecutor())
+
+        job = submit_job('import', _create_category, 'Queued')
+
+        assert job.status == BackgroundJob.PENDING
+        assert len(submitted) == 1
+        assert Category.query.filter_by(name='Queued').count() == 0
+
+    def test_to_dict(self, db):
+        job = submit_job('import', _create_category, 'Dict')
+        data = job.to_dict()
+
+        assert data['id'] == job.id
+        assert data['kind'] == 'import'
+        assert data['status'] == 'completed'
+        assert data['result']['name'] == 'Dict'
+
+    def test_failure_before_job_is_loaded_is_recorded(self, app, db, monkeypatch):
+        job = BackgroundJob(kind='import', status=BackgroundJob.PENDING)
+        db.session.add(job)
+        db.session.commit()
+        real_get = db.session.get
+        calls = []
+
+        def failing_get(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 1:
+                raise RuntimeError('database went away')
+            return real_get(*args, **kwargs)
+
+        monkeypatch.setattr(db.session, 'get', failing_get)
+        jobs._run_job(app, job.id, _create_category, ('Never',), {})
+        monkeypatch.undo()
+
+        db.session.expire_all()
+        job = db.session.get(BackgroundJob, job.id)
+        assert job.status == BackgroundJob.FAILED
+        assert job.finished_at is not None
+
+    def test_job_no_longer_pending_is_not_run(self, app, db):
+        job = BackgroundJob(kind='import', status=BackgroundJob.FAILED)
+        db.session.add(job)
+        db.session.commit()
+
+        jobs._run_job(app, job.id, _create_category, ('Late',), {})
+        assert Category.query.filter_by(name='Late').count() == 0
+
+
+@pytest.mark.unit
+class TestLoadJob:
+
+    def _job(self, db, status, **times):
+        job = BackgroundJob(kind='import', status=status, **times)
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    def test_stale_pending_job_is_failed(self, app, db):
+        old = datetime.now(timezone.utc) - timedelta(seconds=app.config['JOB_STALE_SECONDS'] + 60)
+        job = self._job(db, BackgroundJob.PENDING, created_at=old)
+
+        job = load_job(job.id)
+        assert job.status == BackgroundJob.FAILED
+        assert 'restarted' in job.message
+        assert job.finished_at is not None
+
+    def test_stale_running_job_is_failed(self, app, db):
+        old = datetime.now(timezone.utc) - timedelta(seconds=app.config['JOB_STALE_SECONDS'] + 60)
+        job = self._job(db, BackgroundJob.RUNNING, created_at=old, started_at=old, heartbeat_at=old)
+        assert load_job(job.id).status == BackgroundJob.FAILED
+
+    def test_running_job_with_recent_heartbeat_is_kept(self, app, db):
+        old = datetime.now(timezone.utc) - timedelta(seconds=app.config['JOB_STALE_SECONDS'] + 60)
+        job = self._job(db, BackgroundJob.RUNNING, created_at=old, started_at=old,
+                        heartbeat_at=datetime.now(timezone.utc))
+        assert load_job(job.id).status == BackgroundJob.RUNNING
+
+    def test_missing_job(self, db):
+        assert load_job(12345) is None
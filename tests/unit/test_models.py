@@ -198,6 +198,24 @@ class TestCategoryModel:
 
         assert len(sample_category.subcategories) == 2
 
+    def test_load_tree_single_query(self, app, db, capture_queries, sample_category, sample_subcategory):
+        """load_tree() returns top-level categories with children from one SELECT."""
+        other = Category(name='Other')
+        db.session.add(other)
+        db.session.commit()
+        db.session.expire_all()
+
+        def load_shape():
+            return [(parent.name, parent.parent, [(sub.name, sub.parent.name) for sub in parent.subcategories])
+                    for parent in Category.load_tree()]
+        shape, statements = capture_queries(load_shape)
+
+        assert shape == [
+            ('Test Category', None, [('Test Subcategory', 'Test Category')]),
+            ('Other', None, []),
+        ]
+        assert len(statements) == 1
+
 
 # ---------------------------------------------------------------------------
 # Tag model
@@ -336,6 +354,42 @@ class TestCashflowTransactionModel:
         assert txn.category.id == sample_category.id
         assert txn in sample_category.transactions
 
+    def test_fingerprint_normalizes_description(self):
+        """Case, Turkish I-variants and whitespace don't change the fingerprint."""
+        a = CashflowTransaction.make_fingerprint('yapikredi', date(2024, 1, 1), 250.5, 'expense', 'MİGROS  Kadıköy')
+        b = CashflowTransaction.make_fingerprint('yapikredi', date(2024, 1, 1), 250.50, 'expense', 'migros kadiköy')
+        assert a == b
+        assert len(a) == 64
+
+    def test_fingerprint_distinguishes_fields(self):
+        """Bank, date, signed amount and occurrence all feed the fingerprint."""
+        base = CashflowTransaction.make_fingerprint('yapikredi', date(2024, 1, 1), 10, 'expense', 'Coffee')
+        assert base != CashflowTransaction.make_fingerprint('kuveytturk', date(2024, 1, 1), 10, 'expense', 'Coffee')
+        assert base != CashflowTransaction.make_fingerprint('yapikredi', date(2024, 1, 2), 10, 'expense', 'Coffee')
+        assert base != CashflowTransaction.make_fingerprint('yapikredi', date(2024, 1, 1), 10, 'income', 'Coffee')
+        assert base != CashflowTransaction.make_fingerprint('yapikredi', date(2024, 1, 1), 10, 'expense', 'Coffee', 1)
+
+    def test_fingerprint_unique(self, app, db, sample_category):
+        """Two transactions cannot share a fingerprint; manual rows have none."""
+        for _ in range(2):
+            db.session.add(CashflowTransaction(
+                date=date(2024, 1, 1), type='expense', amount=10,
+                description='manual', category_id=sample_category.id,
+            ))
+        db.session.add(CashflowTransaction(
+            date=date(2024, 1, 1), type='expense', amount=10,
+            description='imported', category_id=sample_category.id, fingerprint='abc',
+        ))
+        db.session.commit()
+
+        db.session.add(CashflowTransaction(
+            date=date(2024, 1, 1), type='expense', amount=10,
+            description='imported', category_id=sample_category.id, fingerprint='abc',
+        ))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
 
 
 # ---------------------------------------------------------------------------
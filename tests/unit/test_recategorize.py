@@ -0,0 +1,125 @@
+"""Unit tests for re-applying rules to existing transactions."""
+import pytest
+from datetime import date
+
+from models.cashflow import CashflowTransaction, cashflow_transaction_tags
+from models.category import Category
+from models.tag import Tag
+from models.categorization_rule import CategorizationRule
+from utils.recategorize import reapply_rules, rule_filter
+from tests.conftest import noop_progress
+
+
+@pytest.fixture()
+def imported(db):
+    """Import-category transactions, as left behind by imports without matching rules"""
+    import_category = Category(name='Import')
+    db.session.add(import_category)
+    db.session.flush()
+    txns = [
+        CashflowTransaction(date=date(2024, 1, day), type='expense', amount=10, description=description,
+                            category_id=import_category.id, source='excel_import')
+        for day, description in enumerate(['MIGROS KADIKOY', 'KAHVE', 'MIGROS MODA', 'IADE MIGROS'], start=1)
+    ]
+    db.session.add_all(txns)
+    db.session.commit()
+    return txns
+
+
+@pytest.mark.unit
+class TestReapplyRules:
+
+    def test_dry_run_counts_without_writing(self, db, imported, sample_rule):
+        result = reapply_rules(noop_progress, category_id='import', dry_run=True)
+
+        assert result['total'] == 4
+        assert result['matched'] == 3
+        assert result['changed'] == 3
+        assert result['rules'] == [{'rule_id': sample_rule.id, 'rule': 'Test Rule', 'count': 3}]
+        db.session.expire_all()
+        assert CashflowTransaction.query.filter_by(category_id=sample_rule.category_id).count() == 0
+
+    def test_applies_category_type_and_tags(self, db, imported, sample_rule, sample_tag):
+        sample_rule.tags = [sample_tag]
+        sample_rule.type_override = 'income'
+        db.session.commit()
+
+        result = reapply_rules(noop_progress, category_id='import', chunk_size=2)
+        db.session.expire_all()
+
+        assert result['changed'] == 3
+        migros = CashflowTransaction.query.filter(CashflowTransaction.description.like('%MIGROS%')).all()
+        assert {txn.category_id for txn in migros} == {sample_rule.category_id}
+        assert {txn.type for txn in migros} == {'income'}
+        assert all([tag.name for tag in txn.tags] == ['Test Tag'] for txn in migros)
+        kahve = CashflowTransaction.query.filter_by(description='KAHVE').one()
+        assert kahve.category.name == 'Import'
+
+    def test_second_run_changes_nothing(self, db, imported, sample_rule, sample_tag):
+        sample_rule.tags = [sample_tag]
+        db.session.commit()
+
+        reapply_rules(noop_progress, category_id=None)
+        result = reapply_rules(noop_progress, category_id=None)
+        assert result['changed'] == 0
+        assert db.session.query(cashflow_transaction_tags).count() == 3
+
+    def test_existing_tags_are_kept(self, db, imported, sample_rule, sample_tag):
+        bank = Tag(name='Yapı Kredi')
+        db.session.add(bank)
+        imported[0].tags = [bank]
+        sample_rule.tags = [sample_tag]
+        db.session.commit()
+
+        reapply_rules(noop_progress, category_id='import')
+        db.session.expire_all()
+        txn = db.session.get(CashflowTransaction, imported[0].id)
+        assert {tag.name for tag in txn.tags} == {'Yapı Kredi', 'Test Tag'}
+
+    def test_date_filter(self, db, imported, sample_rule):
+        result = reapply_rules(noop_progress, category_id=None, date_from='2024-01-02', date_to='2024-01-03')
+        assert result['total'] == 2
+        assert result['changed'] == 1
+
+    def test_no_import_category(self, db, sample_rule, sample_transaction):
+        result = reapply_rules(noop_progress, category_id='import')
+        assert result['total'] == 0
+
+    def test_reports_progress(self, db, imported, sample_rule):
+        seen = []
+        reapply_rules(lambda progress, total=None, force=False: seen.append((progress, total)),
+                      category_id='import', dry_run=True, chunk_size=3)
+        assert seen == [(0, 4), (3, 4), (4, 4)]
+
+
+@pytest.mark.unit
+class TestRuleFilter:
+
+    @pytest.mark.parametrize('operator,value,expected', [
+        ('equals', 'kahve', ['KAHVE']),
+        ('starts_with', 'migros', ['MIGROS KADIKOY', 'MIGROS MODA']),
+        ('ends_with', 'migros', ['IADE MIGROS']),
+        ('contains', 'migros', ['MIGROS KADIKOY', 'MIGROS MODA', 'IADE MIGROS']),
+        ('starts_with', 'migros_', []),
+    ])
+    def test_same_rows_as_rule_matches(self, db, imported, operator, value, expected):
+        rule = CategorizationRule(operator=operator, value=value)
+        matched = CashflowTransaction.query.filter(rule_filter(rule)).order_by(CashflowTransaction.id).all()
+        assert [txn.description for txn in matched] == expected
+        assert expected == [txn.description for txn in imported if rule.matches(txn.description)]
+
+    def test_amount_and_type_conditions(self, db, imported):
+        imported[0].amount = 500
+        db.session.commit()
+        rule = CategorizationRule(operator='contains', value='migros', amount_min=100, condition_type='expense')
+        assert CashflowTransaction.query.filter(rule_filter(rule)).all() == [imported[0]]
+
+    def test_regex_has_no_sql_filter(self):
+        assert rule_filter(CategorizationRule(operator='regex', value='^migros')) is None
+
+    def test_description_normalized_kept_in_sync(self, db, imported):
+        txn = imported[0]
+        assert txn.description_normalized == 'migros kadikoy'
+        txn.description = 'İADE'
+        db.session.commit()
+        assert txn.description_normalized == 'iade'
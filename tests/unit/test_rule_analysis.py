@@ -0,0 +1,123 @@
+"""Unit tests for rule shadowing and conflict analysis."""
+import pytest
+from datetime import date
+
+from models.cashflow import CashflowTransaction
+from models.categorization_rule import CategorizationRule
+from utils.rule_analysis import (
+    analyze_rules,
+    find_shadowing,
+    SHADOWED,
+    NEVER_WINS,
+    UNMATCHED,
+    OK,
+)
+from utils.rule_cache import invalidate_rule_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_rule_cache():
+    invalidate_rule_cache()
+    yield
+    invalidate_rule_cache()
+
+
+def _rule(operator, value, **conditions):
+    return CategorizationRule(name=f'{operator} {value}', operator=operator, value=value, **conditions)
+
+
+def _add_rules(db, category_id, *specs):
+    rules = []
+    for priority, (name, operator, value) in enumerate(specs):
+        rules.append(CategorizationRule(name=name, priority=priority, operator=operator, value=value,
+                                        category_id=category_id))
+    db.session.add_all(rules)
+    db.session.commit()
+    return rules
+
+
+def _add_transactions(db, category_id, *descriptions):
+    db.session.add_all([
+        CashflowTransaction(date=date(2024, 1, 1), type='expense', amount=10, description=description,
+                            category_id=category_id)
+        for description in descriptions
+    ])
+    db.session.commit()
+
+
+@pytest.mark.unit
+class TestFindShadowing:
+
+    @pytest.mark.parametrize('higher,lower,shadowed', [
+        (('contains', 'migros'), ('starts_with', 'migros kadikoy'), True),
+        (('contains', 'migros'), ('equals', '5m migros'), True),
+        (('contains', 'migros kadikoy'), ('contains', 'migros'), False),
+        (('starts_with', 'pos'), ('starts_with', 'pos migros'), True),
+        (('starts_with', 'pos'), ('contains', 'pos'), False),
+        (('ends_with', 'iade'), ('equals', 'trendyol iade'), True),
+        (('equals', 'maas'), ('equals', 'maas'), True),
+        (('equals', 'maas'), ('starts_with', 'maas'), False),
+        (('regex', '^migros'), ('regex', '^migros'), True),
+        (('regex', 'migros'), ('contains', 'migros'), False),
+    ])
+    def test_operators(self, higher, lower, shadowed):
+        rules = [_rule(*higher), _rule(*lower)]
+        rules[0].id, rules[1].id = 1, 2
+        assert (2 in find_shadowing(rules)) is shadowed
+        assert 1 not in find_shadowing(rules)
+
+    def test_narrower_conditions_do_not_shadow(self):
+        higher = _rule('contains', 'migros', amount_min=100, condition_type='expense')
+        lower = _rule('contains', 'migros kadikoy')
+        narrower = _rule('contains', 'migros kadikoy', amount_min=200, condition_type='expense')
+        higher.id, lower.id, narrower.id = 1, 2, 3
+        shadowing = find_shadowing([higher, lower, narrower])
+        assert 2 not in shadowing
+        assert shadowing[3] == [higher, lower]
+
+
+@pytest.mark.unit
+class TestAnalyzeRules:
+
+    def test_statuses_and_overlaps(self, db, sample_subcategory):
+        _add_rules(
+            db, sample_subcategory.id,
+            ('Migros', 'contains', 'migros'),
+            ('Migros Kadikoy', 'starts_with', 'migros kadikoy'),
+            ('Coffee', 'contains', 'kahve'),
+            ('Kadikoy', 'contains', 'kadikoy'),
+            ('Rent', 'contains', 'kira'),
+        )
+        _add_transactions(db, sample_subcategory.id, 'MİGROS KADIKOY', 'MIGROS MODA', 'KAHVE KADIKOY', 'MARKET')
+
+        report = analyze_rules(chunk_size=3)
+
+        assert report['scanned'] == 4
+        by_name = {item['rule']: item for item in report['rules']}
+        assert by_name['Migros']['status'] == OK
+        assert (by_name['Migros']['matched'], by_name['Migros']['won']) == (2, 2)
+        assert by_name['Migros Kadikoy']['status'] == SHADOWED
+        assert by_name['Migros Kadikoy']['shadowed_by'] == ['Migros']
+        assert by_name['Kadikoy']['status'] == NEVER_WINS
+        assert by_name['Coffee']['status'] == OK
+        assert by_name['Rent']['status'] == UNMATCHED
+        assert [item['position'] for item in report['rules']] == [1, 2, 3, 4, 5]
+        overlaps = {(item['rule'], item['other']): item['count'] for item in report['overlaps']}
+        assert overlaps == {
+            ('Migros', 'Migros Kadikoy'): 1,
+            ('Migros', 'Kadikoy'): 1,
+            ('Coffee', 'Kadikoy'): 1,
+        }
+
+    def test_only_recent_transactions_scanned(self, db, sample_subcategory):
+        _add_rules(db, sample_subcategory.id, ('Migros', 'contains', 'migros'))
+        _add_transactions(db, sample_subcategory.id, 'MIGROS', 'KAHVE', 'KAHVE')
+
+        report = analyze_rules(limit=2, chunk_size=1)
+        assert report['scanned'] == 2
+        assert report['rules'][0]['status'] == UNMATCHED
+
+    def test_no_rules(self, db, sample_transaction):
+        report = analyze_rules()
+        assert report['rules'] == []
+        assert report['scanned'] == 0
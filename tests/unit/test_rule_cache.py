@@ -0,0 +1,76 @@
+"""Unit tests for the process-level compiled rule cache."""
+import pytest
+
+from models.categorization_rule import CategorizationRule
+from models.settings import Settings
+from utils.rule_cache import (
+    get_compiled_rules,
+    get_rules_version,
+    invalidate_rule_cache,
+    RULES_VERSION_KEY,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_rule_cache():
+    invalidate_rule_cache()
+    yield
+    invalidate_rule_cache()
+
+
+@pytest.mark.unit
+class TestRuleCache:
+
+    def test_rule_change_sets_version(self, db, sample_rule):
+        assert get_rules_version() is not None
+
+    def test_snapshot_reused_until_rules_change(self, db, capture_queries, sample_rule, sample_tag):
+        sample_rule.tags = [sample_tag]
+        db.session.commit()
+
+        first = get_compiled_rules()
+        second, statements = capture_queries(get_compiled_rules, 'FROM categorization_rule')
+        assert second is first
+        assert statements == []
+
+        rule = first.rules[0]
+        assert rule.value == 'migros'
+        assert rule.category_id == sample_rule.category_id
+        assert rule.tag_ids == (sample_tag.id,)
+        assert first.match('MIGROS KADIKOY') is rule
+
+    def test_edit_invalidates(self, db, sample_rule):
+        before = get_compiled_rules()
+        sample_rule.value = 'a101'
+        db.session.commit()
+
+        after = get_compiled_rules()
+        assert after is not before
+        assert after.match('A101 MODA').id == sample_rule.id
+        assert after.match('MIGROS') is None
+
+    def test_add_and_delete_invalidate(self, db, sample_rule, sample_subcategory):
+        assert len(get_compiled_rules().rules) == 1
+
+        other = CategorizationRule(name='Fuel', priority=1, operator='contains', value='shell',
+                                   category_id=sample_subcategory.id)
+        db.session.add(other)
+        db.session.commit()
+        assert [rule.name for rule in get_compiled_rules().rules] == ['Test Rule', 'Fuel']
+
+        db.session.delete(sample_rule)
+        db.session.commit()
+        assert [rule.name for rule in get_compiled_rules().rules] == ['Fuel']
+
+    def test_inactive_rules_excluded(self, db, sample_rule):
+        sample_rule.is_active = False
+        db.session.commit()
+        assert get_compiled_rules().rules == ()
+
+    def test_unversioned_database_not_cached(self, db, sample_rule):
+        Settings.query.filter_by(key=RULES_VERSION_KEY).delete()
+        db.session.commit()
+
+        first = get_compiled_rules()
+        assert first.version is None
+        assert get_compiled_rules() is not first
@@ -0,0 +1,170 @@
+"""Unit tests for the compiled categorization rule matcher."""
+import random
+from decimal import Decimal
+import pytest
+
+from models.categorization_rule import CategorizationRule
+from utils.rule_matcher import RuleMatcher
+
+
+def _rule(operator, value, rule_id=None, **conditions):
+    """Unsaved rule; the matcher only reads operator, value and the extra conditions"""
+    return CategorizationRule(id=rule_id, name=value, operator=operator, value=value, category_id=1, **conditions)
+
+
+@pytest.mark.unit
+class TestRuleMatcher:
+
+    def test_each_operator(self):
+        matcher = RuleMatcher([
+            _rule('contains', 'migros'),
+            _rule('starts_with', 'pos '),
+            _rule('ends_with', ' iade'),
+            _rule('equals', 'maas'),
+        ])
+        assert matcher.match('MIGROS KADIKOY').value == 'migros'
+        assert matcher.match('POS SHELL').value == 'pos '
+        assert matcher.match('TRENDYOL IADE').value == ' iade'
+        assert matcher.match('Maas').value == 'maas'
+        assert matcher.match('MAAS ODEMESI') is None
+
+    def test_first_rule_in_priority_order_wins(self):
+        matcher = RuleMatcher([
+            _rule('ends_with', 'kadikoy'),
+            _rule('contains', 'migros'),
+        ])
+        assert matcher.match('MIGROS KADIKOY').value == 'kadikoy'
+        assert matcher.match('MIGROS MODA').value == 'migros'
+
+    def test_overlapping_contains_patterns(self):
+        """Patterns found only through failure links are still reported."""
+        matcher = RuleMatcher([
+            _rule('contains', 'bc'),
+            _rule('contains', 'abcd'),
+            _rule('contains', 'c'),
+        ])
+        assert [rule.value for rule in matcher.all_matches('xabcdx')] == ['bc', 'abcd', 'c']
+        assert matcher.match('abd') is None
+        assert matcher.match('ab c').value == 'c'
+
+    def test_turkish_i_variants(self):
+        matcher = RuleMatcher([_rule('contains', 'migros')])
+        for description in ('MİGROS', 'MIGROS', 'mıgros'):
+            assert matcher.match(description) is not None
+
+    def test_empty_description_never_matches(self):
+        matcher = RuleMatcher([_rule('contains', ''), _rule('starts_with', '')])
+        assert matcher.match('') is None
+        assert matcher.match(None) is None
+        assert matcher.match('anything').value == ''
+
+    def test_unknown_operator_never_matches(self):
+        assert RuleMatcher([_rule('glob', 'x')]).match('x') is None
+
+    def test_same_result_as_rule_matches(self):
+        """The compiled matcher agrees with matching each rule in order."""
+        rng = random.Random(7)
+        alphabet = 'abcı '
+        # Rule values are stored normalized
+        words = [
+            CategorizationRule.normalize(''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))))
+            for _ in range(40)
+        ]
+        rules = [
+            _rule(rng.choice(['contains', 'starts_with', 'ends_with', 'equals']), word)
+            for word in words
+        ]
+        matcher = RuleMatcher(rules)
+
+        for _ in range(500):
+            description = ''.join(rng.choice(alphabet + 'İI') for _ in range(rng.randint(0, 12)))
+            expected = next((rule for rule in rules if rule.matches(description)), None)
+            assert matcher.match(description) is expected
+
+
+@pytest.mark.unit
+class TestRuleMatcherConditions:
+
+    def test_regex_rules_in_priority_order(self):
+        matcher = RuleMatcher([
+            _rule('regex', r'kadikoy$'),
+            _rule('regex', r'^migros\s'),
+            _rule('contains', 'migros'),
+        ])
+        assert matcher._regex.combined is not None
+        assert matcher.match('MIGROS KADIKOY').value == r'kadikoy$'
+        assert matcher.match('MIGROS MODA').value == r'^migros\s'
+        assert matcher.match('5M MIGROS').value == 'migros'
+        assert [rule.value for rule in matcher.all_matches('MIGROS KADIKOY')] == [
+            r'kadikoy$', r'^migros\s', 'migros',
+        ]
+
+    def test_regex_priority_against_other_operators(self):
+        matcher = RuleMatcher([
+            _rule('contains', 'netflix'),
+            _rule('regex', r'net\w+'),
+        ])
+        assert matcher.match('NETFLIX.COM').value == 'netflix'
+        assert matcher.match('NETGEAR').value == r'net\w+'
+
+    def test_invalid_regex_never_matches(self):
+        matcher = RuleMatcher([_rule('regex', '(unclosed'), _rule('contains', 'unclosed')])
+        assert matcher.match('(unclosed').value == 'unclosed'
+
+    def test_backreferences_fall_back_to_separate_patterns(self):
+        matcher = RuleMatcher([_rule('regex', r'(\d)\1'), _rule('regex', r'\d')])
+        assert matcher._regex.combined is None
+        assert matcher.match('no 11').value == r'(\d)\1'
+        assert matcher.match('no 12').value == r'\d'
+
+    def test_amount_range_and_type(self):
+        matcher = RuleMatcher([
+            _rule('contains', 'migros', amount_min=Decimal('500')),
+            _rule('contains', 'migros', amount_max=Decimal('50'), condition_type='expense'),
+            _rule('contains', 'migros'),
+        ])
+        assert matcher.match('MIGROS', 750, 'expense').amount_min == Decimal('500')
+        assert matcher.match('MIGROS', -20, 'expense').amount_max == Decimal('50')
+        assert matcher.match('MIGROS', 20, 'income').amount_max is None
+        assert matcher.match('MIGROS', 100, 'expense').amount_max is None
+        # Without an amount, amount conditions cannot hold
+        assert matcher.match('MIGROS').amount_min is None
+
+    def test_regex_conditions_fall_through_to_later_regex(self):
+        matcher = RuleMatcher([
+            _rule('regex', 'maas', condition_type='income'),
+            _rule('contains', 'odeme'),
+            _rule('regex', 'ma+s'),
+        ])
+        assert matcher.match('MAAS', 1000, 'income').value == 'maas'
+        assert matcher.match('MAAS', 1000, 'expense').value == 'ma+s'
+        assert matcher.match('MAAS ODEME', 1000, 'expense').value == 'odeme'
+
+    def test_same_result_as_rule_matches_with_regex_and_conditions(self):
+        rng = random.Random(11)
+        alphabet = 'abc '
+        rules = []
+        for _ in range(40):
+            operator = rng.choice(['contains', 'starts_with', 'ends_with', 'equals', 'regex'])
+            word = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 3)))
+            if operator == 'regex':
+                word = rng.choice([word, f'^{word}', f'{word}$', f'{word[0]}.?{word[-1]}', f'({word})+'])
+            conditions = {}
+            if rng.random() < 0.3:
+                conditions['amount_min'] = Decimal(rng.randint(0, 50))
+            if rng.random() < 0.3:
+                conditions['amount_max'] = Decimal(rng.randint(50, 100))
+            if rng.random() < 0.3:
+                conditions['condition_type'] = rng.choice(['income', 'expense'])
+            rules.append(_rule(operator, word, **conditions))
+        matcher = RuleMatcher(rules)
+
+        for _ in range(500):
+            description = ''.join(rng.choice(alphabet + 'AB') for _ in range(rng.randint(0, 10)))
+            amount = rng.choice([None, rng.randint(-120, 120)])
+            txn_type = rng.choice(['income', 'expense'])
+            expected = next((rule for rule in rules if rule.matches(description, amount, txn_type)), None)
+            assert matcher.match(description, amount, txn_type) is expected
+            assert matcher.all_matches(description, amount, txn_type) == [
+                rule for rule in rules if rule.matches(description, amount, txn_type)
+            ]
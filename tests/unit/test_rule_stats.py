@@ -0,0 +1,58 @@
+"""Unit tests for categorization rule hit statistics."""
+import pytest
+from datetime import datetime
+
+from models.categorization_rule import CategorizationRule
+from utils.rule_cache import get_rules_version
+from utils.rule_stats import RuleHits
+
+
+@pytest.mark.unit
+class TestRuleHits:
+
+    def test_flush_adds_to_counts(self, db, sample_rule):
+        sample_rule.hit_count = 3
+        db.session.commit()
+
+        hits = RuleHits()
+        hits.add(sample_rule.id)
+        hits.add(sample_rule.id, 4)
+        hits.add(None)
+        hit_at = datetime(2024, 5, 1, 12, 0)
+        hits.flush(hit_at)
+        db.session.commit()
+
+        db.session.refresh(sample_rule)
+        assert sample_rule.hit_count == 8
+        assert sample_rule.last_hit_at == hit_at
+        assert not hits.counts
+
+    def test_flush_is_one_statement(self, db, capture_queries, sample_rule, sample_subcategory):
+        other = CategorizationRule(name='Other', priority=2, operator='contains', value='a101',
+                                   category_id=sample_subcategory.id)
+        db.session.add(other)
+        db.session.commit()
+
+        hits = RuleHits()
+        hits.add(sample_rule.id, 2)
+        hits.add(other.id, 5)
+        _, statements = capture_queries(hits.flush)
+        db.session.commit()
+
+        # Both rules are updated by one executemany UPDATE
+        assert len(statements) == 1
+        assert statements[0].startswith('UPDATE categorization_rule')
+        db.session.expire_all()
+        assert db.session.get(CategorizationRule, sample_rule.id).hit_count == 2
+        assert db.session.get(CategorizationRule, other.id).hit_count == 5
+
+    def test_flush_keeps_rule_cache_version(self, db, sample_rule):
+        version = get_rules_version()
+        hits = RuleHits()
+        hits.add(sample_rule.id)
+        hits.flush()
+        db.session.commit()
+        assert get_rules_version() == version
+
+    def test_flush_without_hits_does_nothing(self, db):
+        RuleHits().flush()
@@ -0,0 +1,113 @@
+"""Unit tests for JSON rule set export and import."""
+import pytest
+
+from models.categorization_rule import CategorizationRule
+from models.category import Category
+from models.tag import Tag
+from utils.rule_cache import get_rules_version
+from utils.rule_transfer import export_rules, import_rules, RuleImportError
+
+
+def _rule_set(*rules):
+    return {'version': 1, 'rules': list(rules)}
+
+
+def _item(name='Groceries', **overrides):
+    item = {'name': name, 'operator': 'contains', 'value': 'MİGROS', 'category': 'Test Subcategory',
+            'parent_category': 'Test Category', 'tags': []}
+    item.update(overrides)
+    return item
+
+
+@pytest.mark.unit
+class TestExportRules:
+
+    def test_exports_names_not_ids(self, db, sample_rule, sample_tag, sample_subcategory):
+        sample_rule.tags = [sample_tag]
+        sample_rule.amount_max = 150
+        db.session.commit()
+
+        item = export_rules()['rules'][0]
+        assert item['category'] == sample_subcategory.name
+        assert item['parent_category'] == sample_subcategory.parent.name
+        assert item['tags'] == [sample_tag.name]
+        assert item['amount_max'] == '150.00'
+        assert 'id' not in item and 'hit_count' not in item
+
+
+@pytest.mark.unit
+class TestImportRules:
+
+    def test_round_trip_replace(self, db, sample_rule, sample_tag):
+        sample_rule.tags = [sample_tag]
+        sample_rule.condition_type = 'expense'
+        db.session.commit()
+        exported = export_rules()
+
+        assert import_rules(exported, replace=True) == 1
+        db.session.commit()
+
+        assert CategorizationRule.query.count() == 1
+        assert export_rules() == exported
+
+    def test_append_keeps_order_after_existing(self, db, sample_rule, sample_subcategory):
+        import_rules(_rule_set(_item('First'), _item('Second', operator='regex', value=r'^POS\s')))
+        db.session.commit()
+
+        names = [rule.name for rule in CategorizationRule.query.order_by(CategorizationRule.priority)]
+        assert names == ['Test Rule', 'First', 'Second']
+        first = CategorizationRule.query.filter_by(name='First').one()
+        assert first.value == 'migros'
+        assert first.category_id == sample_subcategory.id
+        assert CategorizationRule.query.filter_by(name='Second').one().value == r'^POS\s'
+
+    def test_missing_tags_are_created(self, db, sample_subcategory, sample_tag):
+        import_rules(_rule_set(_item(tags=[sample_tag.name, 'Brand New'])))
+        db.session.commit()
+        rule = CategorizationRule.query.one()
+        assert sorted(tag.name for tag in rule.tags) == sorted([sample_tag.name, 'Brand New'])
+        assert Tag.query.filter_by(name=sample_tag.name).count() == 1
+
+    def test_long_tag_names_are_reused(self, db, sample_subcategory):
+        long_name = 'x' * 60
+        import_rules(_rule_set(_item('First', tags=[long_name, long_name[:50]])))
+        db.session.commit()
+        import_rules(_rule_set(_item('Second', tags=[long_name])))
+        db.session.commit()
+
+        assert [tag.name for tag in Tag.query.all()] == [long_name[:50]]
+        assert all(len(rule.tags) == 1 for rule in CategorizationRule.query.all())
+
+    def test_bumps_rules_version(self, db, sample_rule):
+        version = get_rules_version()
+        import_rules(_rule_set(), replace=True)
+        db.session.commit()
+        assert CategorizationRule.query.count() == 0
+        assert get_rules_version() != version
+
+    @pytest.mark.parametrize('data,message', [
+        ({'rules': 'nope'}, 'expected an object'),
+        ({'version': 2, 'rules': []}, 'Unsupported rule export version'),
+        (_rule_set(_item(operator='glob')), 'Rule 1: name, operator'),
+        (_rule_set(_item(), _item(operator='regex', value='(x')), 'Rule 2: invalid regular expression'),
+        (_rule_set(_item(amount_min='10', amount_max='5')), 'minimum amount'),
+        (_rule_set(_item(amount_min='-1')), 'positive'),
+        (_rule_set(_item(category='Missing', parent_category=None)), 'Unknown categories: Missing'),
+    ])
+    def test_invalid_sets_write_nothing(self, db, sample_rule, sample_subcategory, data, message):
+        with pytest.raises(RuleImportError, match=message):
+            import_rules(data, replace=True)
+        db.session.rollback()
+        assert CategorizationRule.query.count() == 1
+
+    def test_subcategory_resolved_by_parent(self, db, sample_category, sample_subcategory):
+        other_parent = Category(name='Other Parent')
+        db.session.add(other_parent)
+        db.session.flush()
+        same_name = Category(name=sample_subcategory.name, parent_id=other_parent.id)
+        db.session.add(same_name)
+        db.session.commit()
+
+        import_rules(_rule_set(_item(parent_category='Other Parent')))
+        db.session.commit()
+        assert CategorizationRule.query.one().category_id == same_name.id
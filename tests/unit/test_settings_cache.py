@@ -0,0 +1,76 @@
+"""Unit tests for the process-level settings cache."""
+import pytest
+from sqlalchemy import update
+
+from models.settings import Settings
+from utils import settings_cache
+from utils.settings_cache import (
+    bump_settings_version,
+    get_many,
+    get_setting,
+    get_settings_version,
+    invalidate_settings_cache,
+)
+
+
+@pytest.mark.unit
+class TestSettingsCache:
+
+    def test_loaded_once(self, db, capture_queries):
+        Settings.set_setting('currency_symbol', '$')
+        Settings.set_setting('theme', 'dark')
+
+        _, first = capture_queries(lambda: get_setting('currency_symbol'), 'FROM settings')
+        values, second = capture_queries(
+            lambda: get_many({'currency_symbol': '₺', 'theme': 'light', 'missing': 'default'}), 'FROM settings')
+        assert (len(first), len(second)) == (1, 0)
+        assert values == {'currency_symbol': '$', 'theme': 'dark', 'missing': 'default'}
+
+    def test_set_setting_bumps_version_and_invalidates(self, db):
+        Settings.set_setting('currency_symbol', '$')
+        version = get_settings_version()
+        assert version is not None
+        assert get_setting('currency_symbol') == '$'
+
+        Settings.set_setting('currency_symbol', '€')
+        assert get_settings_version() != version
+        assert get_setting('currency_symbol') == '€'
+
+    def test_rollback_keeps_cache(self, db, capture_queries):
+        Settings.set_setting('currency_symbol', '$')
+        get_setting('currency_symbol')
+        setting = Settings.query.filter_by(key='currency_symbol').one()
+        setting.value = '€'
+        db.session.flush()
+        db.session.rollback()
+        _, statements = capture_queries(lambda: get_setting('currency_symbol'), 'FROM settings')
+        assert statements == []
+
+    def test_other_worker_change_seen_after_interval(self, db, monkeypatch):
+        Settings.set_setting('currency_symbol', '$')
+        assert get_setting('currency_symbol') == '$'
+
+        # Another worker's write: new value and token, this process's copy untouched
+        db.session.execute(update(Settings).where(Settings.key == 'currency_symbol').values(value='€'))
+        bump_settings_version(db.session.connection())
+        db.session.commit()
+        assert get_setting('currency_symbol') == '$'
+
+        now = settings_cache.time.monotonic()
+        monkeypatch.setattr(settings_cache.time, 'monotonic', lambda: now + settings_cache.SETTINGS_CHECK_INTERVAL)
+        assert get_setting('currency_symbol') == '€'
+
+    def test_unchanged_version_only_checks_token(self, db, capture_queries, monkeypatch):
+        Settings.set_setting('currency_symbol', '$')
+        get_setting('currency_symbol')
+        now = settings_cache.time.monotonic()
+        monkeypatch.setattr(settings_cache.time, 'monotonic', lambda: now + settings_cache.SETTINGS_CHECK_INTERVAL)
+
+        values, statements = capture_queries(lambda: [get_setting('currency_symbol') for _ in range(2)])
+        assert values == ['$', '$']
+        assert len(statements) == 1 and statements[0].startswith('SELECT settings.value')
+
+    def test_default_when_missing(self, db):
+        invalidate_settings_cache()
+        assert get_setting('nonexistent') is None
+        assert get_setting('nonexistent', 'fallback') == 'fallback'
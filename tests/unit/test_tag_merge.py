@@ -0,0 +1,69 @@
+"""Unit tests for the set-based tag merge."""
+import pytest
+
+from models.cashflow import cashflow_transaction_tags
+from models.categorization_rule import CategorizationRule, categorization_rule_tags
+from models.tag import Tag
+from utils.rule_cache import get_rules_version
+from utils.tag_merge import merge_tag, TagMergeError
+from utils.transaction_stats import load_tag_stats, rebuild_stats
+from tests.conftest import make_transaction
+
+
+@pytest.fixture()
+def tags(db):
+    source, target = Tag(name='Yapı Kredi'), Tag(name='YapiKredi')
+    db.session.add_all([source, target])
+    db.session.commit()
+    return source, target
+
+
+@pytest.mark.unit
+class TestMergeTag:
+
+    def test_moves_links_without_duplicates(self, db, sample_category, sample_subcategory, tags):
+        source, target = tags
+        db.session.add_all([
+            make_transaction(sample_category.id, 'expense', 10, tags=[source]),
+            make_transaction(sample_category.id, 'income', 30, tags=[source, target]),
+            make_transaction(sample_category.id, 'expense', 5, tags=[target]),
+        ])
+        rule = CategorizationRule(name='Rule', priority=0, operator='contains', value='x',
+                                  category_id=sample_subcategory.id, tags=[source])
+        db.session.add(rule)
+        db.session.commit()
+        source_id = source.id
+        version = get_rules_version()
+
+        moved = merge_tag(source, target)
+        db.session.commit()
+
+        assert moved == {'transactions': 2, 'rules': 1}
+        assert db.session.get(Tag, source_id) is None
+        assert db.session.query(cashflow_transaction_tags).filter_by(tag_id=target.id).count() == 3
+        assert db.session.query(cashflow_transaction_tags).filter_by(tag_id=source_id).count() == 0
+        assert db.session.query(categorization_rule_tags).filter_by(tag_id=target.id).count() == 1
+        assert get_rules_version() != version
+
+        stats = load_tag_stats(db.session)
+        assert source_id not in stats
+        assert (stats[target.id]['expense'], stats[target.id]['income']) == (2, 1)
+        rebuild_stats(db.session)
+        assert load_tag_stats(db.session) == stats
+
+    def test_loads_no_transactions(self, db, capture_queries, sample_category, tags):
+        source, target = tags
+        db.session.add_all([make_transaction(sample_category.id, tags=[source]) for _ in range(5)])
+        db.session.commit()
+
+        def merge():
+            merge_tag(source, target)
+            db.session.commit()
+        _, statements = capture_queries(merge)
+        inserts = [s for s in statements if s.startswith('INSERT INTO cashflow_transaction_tags')]
+        assert len(inserts) == 1 and 'SELECT' in inserts[0]
+        assert not any(s.startswith('SELECT cashflow_transaction.id') for s in statements)
+
+    def test_rejects_same_tag(self, db, sample_tag):
+        with pytest.raises(TagMergeError):
+            merge_tag(sample_tag, sample_tag)
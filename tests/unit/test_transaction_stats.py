@@ -0,0 +1,282 @@
+"""Unit tests for the maintained category and tag statistics."""
+import pytest
+from datetime import date
+from decimal import Decimal
+from io import BytesIO
+
+from sqlalchemy import func
+
+from models.cashflow import CashflowTransaction, cashflow_transaction_tags
+from models.categorization_rule import CategorizationRule
+from models.import_batch import ImportBatch
+from models.tag import Tag
+from utils.bulk_insert import bulk_insert_transactions
+from utils.importer import run_import, rollback_import_batch
+from utils.recategorize import reapply_rules
+from utils.transaction_stats import load_category_stats, load_tag_stats, rebuild_stats
+from tests.conftest import STATEMENT_CSV, make_transaction, noop_progress
+
+
+def _expected(query):
+    """Stats recomputed from the transaction table, for (key, type, count, sum) rows"""
+    expected = {}
+    for key, txn_type, count, total in query:
+        stats = expected.setdefault(key, {'income': 0, 'expense': 0,
+                                          'income_total': Decimal('0'), 'expense_total': Decimal('0')})
+        stats[txn_type] = count
+        stats[f'{txn_type}_total'] = Decimal(str(total)).quantize(Decimal('0.01'))
+    return expected
+
+
+def _nonzero(loaded):
+    actual = {key: stats for key, stats in loaded.items() if stats['income'] or stats['expense']}
+    for stats in actual.values():
+        stats['income_total'] = Decimal(str(stats['income_total'])).quantize(Decimal('0.01'))
+        stats['expense_total'] = Decimal(str(stats['expense_total'])).quantize(Decimal('0.01'))
+    return actual
+
+
+def _assert_consistent(db):
+    per_type = (CashflowTransaction.type, func.count(CashflowTransaction.id), func.sum(CashflowTransaction.amount))
+    assert _nonzero(load_category_stats(db.session)) == _expected(
+        db.session.query(CashflowTransaction.category_id, *per_type)
+        .group_by(CashflowTransaction.category_id, CashflowTransaction.type)
+    )
+    tag_id = cashflow_transaction_tags.c.tag_id
+    assert _nonzero(load_tag_stats(db.session)) == _expected(
+        db.session.query(tag_id, *per_type)
+        .join(CashflowTransaction, cashflow_transaction_tags.c.cashflow_transaction_id == CashflowTransaction.id)
+        .group_by(tag_id, CashflowTransaction.type)
+    )
+
+
+@pytest.mark.unit
+class TestCategoryStats:
+
+    def test_orm_insert_update_delete(self, db, sample_category, sample_subcategory):
+        first = make_transaction(sample_category.id, 'expense', 10)
+        second = make_transaction(sample_category.id, 'income', 250.75)
+        db.session.add_all([first, second])
+        db.session.commit()
+        _assert_consistent(db)
+        assert load_category_stats(db.session)[sample_category.id]['expense'] == 1
+
+        # Attributes are expired after commit; old values must still be found
+        first.category_id = sample_subcategory.id
+        second.type = 'expense'
+        db.session.commit()
+        _assert_consistent(db)
+
+        first.amount = 99
+        db.session.commit()
+        _assert_consistent(db)
+
+        db.session.delete(second)
+        db.session.commit()
+        _assert_consistent(db)
+
+    def test_category_set_through_relationship(self, db, sample_category, sample_subcategory):
+        txn = CashflowTransaction(date=date(2024, 1, 1), type='expense', amount=5, description='rel',
+                                  category=sample_category)
+        db.session.add(txn)
+        db.session.commit()
+        _assert_consistent(db)
+
+        txn.category = sample_subcategory
+        db.session.commit()
+        _assert_consistent(db)
+
+    def test_unrelated_edit_writes_no_stats(self, db, capture_queries, sample_transaction):
+        sample_transaction.description = 'renamed'
+        _, statements = capture_queries(db.session.commit, 'category_stats')
+        assert statements == []
+
+    def test_bulk_insert_counts_only_inserted_rows(self, db, sample_category):
+        rows = [
+            {'date': date(2024, 1, day), 'type': 'expense', 'amount': day, 'description': f'row {day}',
+             'category_id': sample_category.id, 'fingerprint': f'fp-{day % 3}'}
+            for day in range(1, 4)
+        ]
+        bulk_insert_transactions(rows)
+        bulk_insert_transactions([dict(row) for row in rows])  # all duplicates, though the copies carry 'id'
+        db.session.commit()
+        _assert_consistent(db)
+        assert load_category_stats(db.session)[sample_category.id]['expense'] == 3
+
+    def test_import_and_rollback(self, db):
+        result = run_import(noop_progress, [('statement.csv', BytesIO(STATEMENT_CSV.encode('utf-8')))], 'yapikredi')
+        _assert_consistent(db)
+
+        rollback_import_batch(db.session.get(ImportBatch, result['batch_ids'][0]))
+        db.session.commit()
+        _assert_consistent(db)
+        assert not any(stats['expense'] for stats in load_category_stats(db.session).values())
+
+    def test_reapply_rules(self, db, sample_subcategory):
+        run_import(noop_progress, [('statement.csv', BytesIO(STATEMENT_CSV.encode('utf-8')))], 'yapikredi')
+        db.session.add(CategorizationRule(name='Migros', priority=0, operator='contains', value='migros',
+                                          category_id=sample_subcategory.id, type_override='income'))
+        db.session.commit()
+
+        reapply_rules(noop_progress, category_id='import')
+        _assert_consistent(db)
+        assert load_category_stats(db.session)[sample_subcategory.id]['income'] == 1
+
+    def test_deleting_category_removes_its_row(self, db, sample_category):
+        txn = make_transaction(sample_category.id)
+        db.session.add(txn)
+        db.session.commit()
+        db.session.delete(txn)
+        db.session.commit()
+
+        db.session.delete(sample_category)
+        db.session.commit()
+        assert sample_category.id not in load_category_stats(db.session)
+
+    def test_rebuild(self, db, sample_category):
+        db.session.add_all([make_transaction(sample_category.id, 'income', 5),
+                            make_transaction(sample_category.id, 'expense', 7)])
+        db.session.commit()
+        rebuild_stats(db.session)
+        db.session.commit()
+        _assert_consistent(db)
+
+    def test_parent_counts_roll_up(self, db, sample_category, sample_subcategory):
+        db.session.add_all([make_transaction(sample_category.id), make_transaction(sample_subcategory.id, 'income')])
+        db.session.commit()
+        assert sample_category.get_expense_count() == 1
+        assert sample_category.get_income_count() == 1
+        assert sample_subcategory.get_all_transactions_count() == 1
+
+
+@pytest.mark.unit
+class TestTagStats:
+
+    def test_assigning_and_removing_tags(self, db, sample_category, sample_tag):
+        other = Tag(name='Other')
+        txn = make_transaction(sample_category.id, 'expense', 12.5)
+        txn.tags = [sample_tag]
+        db.session.add_all([other, txn])
+        db.session.commit()
+        _assert_consistent(db)
+        assert load_tag_stats(db.session)[sample_tag.id]['expense'] == 1
+
+        txn.tags = [other]
+        db.session.commit()
+        _assert_consistent(db)
+        assert load_tag_stats(db.session)[sample_tag.id]['expense'] == 0
+
+        txn.tags.append(sample_tag)
+        db.session.commit()
+        _assert_consistent(db)
+
+    def test_type_and_amount_change_of_tagged_transaction(self, db, sample_category, sample_tag):
+        txn = make_transaction(sample_category.id, 'expense', 10)
+        txn.tags = [sample_tag]
+        db.session.add(txn)
+        db.session.commit()
+
+        txn.type = 'income'
+        txn.amount = 40
+        db.session.commit()
+        _assert_consistent(db)
+        assert load_tag_stats(db.session)[sample_tag.id]['income'] == 1
+
+    def test_category_only_edits_do_not_load_tags(self, db, capture_queries, sample_category, sample_subcategory,
+                                                  sample_tag):
+        category_id = sample_subcategory.id
+        db.session.add_all([make_transaction(sample_category.id, tags=[sample_tag]) for _ in range(30)])
+        db.session.commit()
+        db.session.expunge_all()
+
+        for txn in CashflowTransaction.query.all():
+            txn.category_id = category_id
+        _, statements = capture_queries(db.session.commit, 'tag.name')
+        assert statements == []
+        _assert_consistent(db)
+
+    def test_amount_edits_load_tags_in_one_query(self, db, capture_queries, sample_category, sample_tag):
+        tag_id = sample_tag.id
+        db.session.add_all([make_transaction(sample_category.id, tags=[sample_tag]) for _ in range(30)])
+        db.session.commit()
+        db.session.expunge_all()
+
+        for txn in CashflowTransaction.query.all():
+            txn.amount = 20
+        _, statements = capture_queries(db.session.commit, 'tag.name')
+        assert len(statements) == 1
+        _assert_consistent(db)
+        assert load_tag_stats(db.session)[tag_id]['expense_total'] == 600
+
+    def test_deleting_unloaded_tagged_transactions(self, db, sample_category, sample_tag):
+        tag_id = sample_tag.id
+        db.session.add_all([make_transaction(sample_category.id, tags=[sample_tag]) for _ in range(3)])
+        db.session.commit()
+        db.session.expunge_all()
+
+        for txn in CashflowTransaction.query.all():
+            db.session.delete(txn)
+        db.session.commit()
+        _assert_consistent(db)
+        assert load_tag_stats(db.session)[tag_id]['expense'] == 0
+
+    def test_deleting_tagged_transaction(self, db, sample_category, sample_tag):
+        txn = make_transaction(sample_category.id)
+        txn.tags = [sample_tag]
+        db.session.add(txn)
+        db.session.commit()
+
+        db.session.delete(txn)
+        db.session.commit()
+        _assert_consistent(db)
+        assert load_tag_stats(db.session)[sample_tag.id]['expense'] == 0
+
+    def test_bulk_insert_with_tags(self, db, sample_category, sample_tag):
+        rows = [
+            {'date': date(2024, 1, day), 'type': 'income', 'amount': day, 'description': f'row {day}',
+             'category_id': sample_category.id, 'fingerprint': f'fp-{day}', 'tag_ids': [sample_tag.id]}
+            for day in range(1, 4)
+        ]
+        bulk_insert_transactions(rows[:2])
+        bulk_insert_transactions([dict(row) for row in rows])  # the first two are already stored
+        db.session.commit()
+        _assert_consistent(db)
+        assert load_tag_stats(db.session)[sample_tag.id]['income'] == 3
+
+    def test_import_rule_tags_rollback(self, db, sample_subcategory, sample_tag):
+        rule = CategorizationRule(name='Migros', priority=0, operator='contains', value='migros',
+                                  category_id=sample_subcategory.id)
+        rule.tags = [sample_tag]
+        db.session.add(rule)
+        db.session.commit()
+
+        result = run_import(noop_progress, [('statement.csv', BytesIO(STATEMENT_CSV.encode('utf-8')))], 'yapikredi')
+        _assert_consistent(db)
+        assert load_tag_stats(db.session)[sample_tag.id]['expense'] == 1
+
+        rollback_import_batch(db.session.get(ImportBatch, result['batch_ids'][0]))
+        db.session.commit()
+        _assert_consistent(db)
+
+    def test_reapply_rules_moves_existing_tags(self, db, sample_subcategory, sample_tag):
+        run_import(noop_progress, [('statement.csv', BytesIO(STATEMENT_CSV.encode('utf-8')))], 'yapikredi')
+        bank = Tag(name='Bank')
+        db.session.add(bank)
+        for txn in CashflowTransaction.query.all():
+            txn.tags = [bank]
+        rule = CategorizationRule(name='Migros', priority=0, operator='contains', value='migros',
+                                  category_id=sample_subcategory.id, type_override='income')
+        rule.tags = [sample_tag, bank]
+        db.session.add(rule)
+        db.session.commit()
+        _assert_consistent(db)
+
+        reapply_rules(noop_progress, category_id='import')
+        _assert_consistent(db)
+        assert load_tag_stats(db.session)[bank.id]['income'] == 1
+        assert load_tag_stats(db.session)[sample_tag.id]['income'] == 1
+
+    def test_deleting_tag_removes_its_row(self, db, sample_tag):
+        db.session.delete(sample_tag)
+        db.session.commit()
+        assert sample_tag.id not in load_tag_stats(db.session)
@@ -0,0 +1,62 @@
+"""Unit tests for the process-level user cache used by Flask-Login."""
+import pytest
+from sqlalchemy import inspect, update
+from werkzeug.security import generate_password_hash
+
+from models.user import User
+from utils import user_cache
+from utils.user_cache import load_user
+
+
+@pytest.mark.unit
+class TestUserCache:
+
+    def test_second_load_is_attached_without_query(self, db, capture_queries, admin_user):
+        user_id = admin_user.id
+        db.session.expunge_all()
+        _, first = capture_queries(lambda: load_user(user_id), 'FROM users')
+        db.session.expunge_all()  # as at the end of a request
+        user, second = capture_queries(lambda: load_user(user_id), 'FROM users')
+
+        assert (len(first), len(second)) == (1, 0)
+        assert user.username == 'admin'
+        assert inspect(user).persistent
+        assert user.check_password('testpassword123')
+
+    def test_password_change_through_cached_user(self, db, admin_user):
+        user_id = admin_user.id
+        load_user(user_id)
+        db.session.expunge_all()
+        user = load_user(user_id)
+        user.set_password('newpassword456')
+        db.session.commit()
+        assert user_id not in user_cache._users
+
+        db.session.expunge_all()
+        assert db.session.get(User, user_id).check_password('newpassword456')
+        assert load_user(user_id).check_password('newpassword456')
+
+    def test_password_changed_by_another_worker(self, db, admin_user):
+        user_id = admin_user.id
+        load_user(user_id)
+        # Another worker's write: this process's cached copy is untouched
+        db.session.execute(update(User).where(User.id == user_id)
+                           .values(password_hash=generate_password_hash('newpassword456')))
+        db.session.commit()
+        db.session.expunge_all()
+
+        user = load_user(user_id)
+        assert not user.check_password('testpassword123')
+        assert user.check_password('newpassword456')
+
+    def test_expires_after_ttl(self, db, capture_queries, admin_user, monkeypatch):
+        user_id = admin_user.id
+        load_user(user_id)
+        now = user_cache.time.monotonic()
+        monkeypatch.setattr(user_cache.time, 'monotonic', lambda: now + user_cache.USER_CACHE_TTL)
+        db.session.expunge_all()
+        _, statements = capture_queries(lambda: load_user(user_id), 'FROM users')
+        assert len(statements) == 1
+
+    def test_missing_user(self, db):
+        assert load_user(12345) is None
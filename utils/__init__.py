@@ -6,7 +6,13 @@ from .data_utils import (
     create_dummy_transactions,
 )
 from .bank_configs import get_bank_config
-from .excel_processor import (
-    process_excel_data,
-    ExcelImportError
-)
+
+# excel_processor pulls in pandas, so it is only imported on first use
+_EXCEL_PROCESSOR_NAMES = ('process_excel_data', 'ExcelImportError')
+
+
+def __getattr__(name):
+    if name in _EXCEL_PROCESSOR_NAMES:
+        from . import excel_processor
+        return getattr(excel_processor, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
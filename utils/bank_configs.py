@@ -2,6 +2,9 @@
 """
 Bank Excel format configuration file
 Defines Excel export format for each bank
+
+Adding a bank only needs a new BANK_CONFIGS entry: the header lookups used
+for column mapping and bank detection are compiled from it at import time.
 """
 
 BANK_CONFIGS = {
@@ -32,6 +35,77 @@ BANK_CONFIGS = {
     }
 }
 
+# Fields every statement must provide
+REQUIRED_FIELDS = ('date', 'description', 'amount')
+
+
+def normalize_header(value):
+    """
+    Header cell text compared case-insensitively with collapsed whitespace
+    Dotted and dotless i are folded together, so 'TARİH', 'TARIH' and 'Tarih' match.
+    """
+    return ' '.join(str(value).split()).casefold().replace('\u0307', '').replace('ı', 'i')
+
+
+def compile_columns(columns):
+    """
+    Compile a bank's column alternatives into {normalized header: (field, preference)}
+    Lower preference wins; it is the position of the name in the alternatives list.
+    """
+    lookup = {}
+    for field, names in columns.items():
+        for preference, name in enumerate(names):
+            lookup.setdefault(normalize_header(name), (field, preference))
+    return lookup
+
+
+def compile_header_index(bank_configs):
+    """Index normalized header names to every (bank_code, field, preference) using them"""
+    index = {}
+    for bank_code, config in bank_configs.items():
+        for header, (field, preference) in compile_columns(config['columns']).items():
+            index.setdefault(header, []).append((bank_code, field, preference))
+    return index
+
+
+COLUMN_LOOKUPS = {bank_code: compile_columns(config['columns']) for bank_code, config in BANK_CONFIGS.items()}
+HEADER_INDEX = compile_header_index(BANK_CONFIGS)
+HEADER_IDENTIFIERS = {
+    bank_code: normalize_header(config['header_row_identifier'])
+    for bank_code, config in BANK_CONFIGS.items()
+}
+
+
+def detect_bank(header_cells):
+    """
+    Identify the bank whose statement header this row is, in one pass over its cells.
+
+    A bank matches when the row contains its header_row_identifier and a
+    column for every required field; when several match, the one covering the
+    most cells wins. Returns the bank code, or None when no bank (or more
+    than one equally) matches.
+    """
+    identifiers = set()
+    fields = {}
+    for cell in header_cells:
+        header = normalize_header(cell)
+        identifiers.add(header)
+        for bank_code, field, _ in HEADER_INDEX.get(header, ()):
+            fields.setdefault(bank_code, []).append(field)
+
+    candidates = [
+        (len(matched), bank_code) for bank_code, matched in fields.items()
+        if HEADER_IDENTIFIERS[bank_code] in identifiers
+        and all(field in matched for field in REQUIRED_FIELDS)
+    ]
+    if not candidates:
+        return None
+    candidates.sort(reverse=True)
+    if len(candidates) > 1 and candidates[0][0] == candidates[1][0]:
+        return None
+    return candidates[0][1]
+
+
 def get_bank_config(bank_code):
     """Returns configuration for given bank code"""
     return BANK_CONFIGS.get(bank_code)
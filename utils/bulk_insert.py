@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Batched persistence for imported transactions
+"""
+
+import logging
+from sqlalchemy import insert
+from models import db
+from models.cashflow import CashflowTransaction, cashflow_transaction_tags
+from models.categorization_rule import CategorizationRule
+from utils.transaction_stats import CategoryDeltas, TagDeltas, apply_stats_deltas
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT statement; the driver folds each batch into multi-row VALUES
+BATCH_SIZE = 1000
+
+
+def dialect_insert(table):
+    """INSERT construct of the active dialect, which supports ON CONFLICT clauses"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(table)
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+    return sqlite_insert(table)
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _normalized_description(row):
+    if 'description_normalized' in row:
+        return row['description_normalized']  # already computed while categorizing
+    if row.get('description') is None:
+        return None
+    return CategorizationRule.normalize(row['description'])
+
+
+def bulk_insert_transactions(rows, batch_size=BATCH_SIZE, progress=None):
+    """
+    Insert transactions and their tag links in batches.
+
+    Each row is a dict with the CashflowTransaction column values plus an
+    optional 'tag_ids' list. Runs inside the current session transaction,
+    the caller commits. Returns the new transaction IDs in row order; each
+    inserted row dict also gets its ID under 'id'.
+    progress, if given, is called with the number of rows processed after each batch.
+
+    Rows carrying a 'fingerprint' are inserted with ON CONFLICT DO NOTHING
+    against the unique fingerprint index; rows already stored are skipped
+    and left out of the returned IDs.
+    """
+    table = CashflowTransaction.__table__
+    dedupe = bool(rows) and all(row.get('fingerprint') for row in rows)
+    if dedupe:
+        # Skipped rows return nothing, so correlate by fingerprint instead of position
+        ordered_returning = False
+        insert_stmt = dialect_insert(table).on_conflict_do_nothing(
+            index_elements=['fingerprint']
+        ).returning(table.c.id, table.c.fingerprint)
+    else:
+        # PostgreSQL correlates RETURNING rows to parameters via the serial sentinel.
+        # SQLite has no sentinel support and would fall back to one INSERT per row,
+        # but it allocates rowids in VALUES order, so sorting the IDs is equivalent.
+        ordered_returning = db.session.get_bind().dialect.name == 'postgresql'
+        insert_stmt = insert(table).returning(table.c.id, sort_by_parameter_order=ordered_returning)
+
+    inserted_ids = []
+    processed = 0
+    category_deltas = CategoryDeltas()
+    tag_deltas = TagDeltas()
+    for chunk in _chunks(rows, batch_size):
+        params = [
+            {
+                'date': row['date'],
+                'type': row['type'],
+                'amount': row['amount'],
+                'description': row.get('description'),
+                'description_normalized': _normalized_description(row),
+                'category_id': row['category_id'],
+                'source': row.get('source', 'manual'),
+                'fingerprint': row.get('fingerprint'),
+                'import_batch_id': row.get('import_batch_id'),
+            }
+            for row in chunk
+        ]
+        result = db.session.execute(insert_stmt, params)
+        if dedupe:
+            id_by_fingerprint = {fingerprint: txn_id for txn_id, fingerprint in result}
+            # pop: a fingerprint repeated within the chunk was only inserted once
+            pairs = [
+                (id_by_fingerprint.pop(row['fingerprint']), row)
+                for row in chunk if row['fingerprint'] in id_by_fingerprint
+            ]
+        else:
+            chunk_ids = result.scalars().all()
+            if not ordered_returning:
+                chunk_ids.sort()
+            pairs = list(zip(chunk_ids, chunk))
+        chunk_ids = []
+        for txn_id, row in pairs:
+            row['id'] = txn_id
+            chunk_ids.append(txn_id)
+            category_deltas.add(row['category_id'], row['type'], row['amount'])
+
+        links = []
+        for txn_id, row in pairs:
+            for tag_id in dict.fromkeys(row.get('tag_ids') or ()):
+                links.append({'cashflow_transaction_id': txn_id, 'tag_id': tag_id})
+                tag_deltas.add(tag_id, row['type'], row['amount'])
+        if links:
+            db.session.execute(insert(cashflow_transaction_tags), links)
+
+        inserted_ids.extend(chunk_ids)
+        processed += len(chunk)
+        if progress:
+            progress(processed)
+
+    # Set-based inserts bypass the flush listeners, so update the stats here
+    apply_stats_deltas(db.session.connection(), category_deltas, tag_deltas)
+
+    logger.debug(f"Bulk inserted {len(inserted_ids)} transactions")
+    return inserted_ids
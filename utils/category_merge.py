@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Set-based category merge
+
+Merging a category into another moves its transactions, rules and
+subcategories with one UPDATE each, carries its maintained statistics
+over to the target and deletes it, all in the caller's transaction.
+Deleting a category "and moving its transactions" is the same operation.
+"""
+
+import logging
+from sqlalchemy import update, delete, select
+from models import db
+from models.cashflow import CashflowTransaction
+from models.categorization_rule import CategorizationRule
+from models.category import Category
+from models.category_stats import CategoryStats
+from utils.rule_cache import bump_rules_version
+from utils.transaction_stats import CategoryDeltas, apply_stats_deltas
+
+logger = logging.getLogger(__name__)
+
+
+class CategoryMergeError(Exception):
+    """The merge is not possible; the message is safe to show to the user"""
+    pass
+
+
+def _check(source, target):
+    if source.id == target.id:
+        raise CategoryMergeError('Pick a different category to move into.')
+    subcategories = db.session.execute(
+        select(Category.name).where(Category.parent_id == source.id)
+    ).scalars().all()
+    if not subcategories:
+        return
+    if target.parent_id == source.id:
+        raise CategoryMergeError("Can't merge a category into one of its own subcategories.")
+    if target.parent_id is not None:
+        raise CategoryMergeError('A category with subcategories can only be merged into a main category.')
+    clashes = db.session.execute(
+        select(Category.name).where(Category.parent_id == target.id, Category.name.in_(subcategories))
+    ).scalars().all()
+    if clashes:
+        raise CategoryMergeError(f"{target.name} already has subcategories named: {', '.join(sorted(clashes))}")
+
+
+def merge_category(source, target):
+    """
+    Move everything from source into target and delete source.
+
+    Raises CategoryMergeError before writing anything if the merge would
+    break the two-level hierarchy. Returns the number of transactions,
+    rules and subcategories moved; the caller commits.
+    """
+    _check(source, target)
+
+    stats_table = CategoryStats.__table__
+    stats = db.session.execute(
+        select(stats_table).where(stats_table.c.category_id == source.id)
+    ).mappings().first()
+
+    moved = {
+        'transactions': db.session.execute(
+            update(CashflowTransaction).where(CashflowTransaction.category_id == source.id)
+            .values(category_id=target.id)
+        ).rowcount,
+        'rules': db.session.execute(
+            update(CategorizationRule).where(CategorizationRule.category_id == source.id)
+            .values(category_id=target.id)
+        ).rowcount,
+        'subcategories': db.session.execute(
+            update(Category).where(Category.parent_id == source.id).values(parent_id=target.id)
+        ).rowcount,
+    }
+
+    # The moved transactions keep their type and amount, so the source's counters move as a whole
+    connection = db.session.connection()
+    if stats:
+        deltas = CategoryDeltas()
+        deltas.add(target.id, 'income', stats['income_total'], stats['income_count'])
+        deltas.add(target.id, 'expense', stats['expense_total'], stats['expense_count'])
+        apply_stats_deltas(connection, deltas)
+        connection.execute(delete(stats_table).where(stats_table.c.category_id == source.id))
+    if moved['rules']:
+        bump_rules_version(connection)  # set-based rule updates bypass the flush listener
+
+    db.session.execute(delete(Category).where(Category.id == source.id))
+    logger.info(f"Merged category {source.id} into {target.id}: {moved}")
+    return moved
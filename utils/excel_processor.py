@@ -3,12 +3,14 @@
 Helper functions for processing Excel and CSV files
 """
 
+import io
 import pandas as pd
 import re
+import time
 from datetime import datetime
 from typing import Dict, List, Tuple, Optional
 import logging
-from utils.bank_configs import get_bank_config
+from utils.bank_configs import get_bank_config, compile_columns, detect_bank, normalize_header, COLUMN_LOOKUPS
 
 logger = logging.getLogger(__name__)
 
@@ -141,30 +143,57 @@ def parse_date(date_str, date_format='%d.%m.%Y'):
     
     raise ValueError(f"Could not parse date: {date_str}")
 
-def read_file_with_header_detection(file_path, bank_config=None):
+# Encodings tried in order for CSV files
+CSV_ENCODINGS = ['utf-8', 'latin-1', 'cp1254', 'iso-8859-9']
+
+# Rows searched for a header when detecting the bank
+HEADER_SCAN_ROWS = 30
+
+def _open_source(source):
+    """Wrap raw bytes in a buffer; paths and file-like objects pass through"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    return source
+
+def _rewind(source):
+    """Seek file-like sources back to the start before each read"""
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return source
+
+def _file_extension(source, filename=None):
+    """Extension from the explicit filename, or from the path/name of the source"""
+    name = filename or (source if isinstance(source, str) else getattr(source, 'name', None))
+    if not isinstance(name, str) or '.' not in name:
+        raise ExcelImportError("Unsupported file format: unknown")
+    return name.lower().rsplit('.', 1)[-1]
+
+def read_file_with_header_detection(source, bank_config=None, filename=None):
     """
-    Read Excel or CSV file and return as DataFrame
+    Read Excel or CSV data and return as DataFrame
+    source may be a path, a binary file-like object or bytes; filename
+    supplies the extension when the source does not carry one.
     Dynamically finds the header row if bank_config has header_row_identifier
     """
     try:
-        file_extension = file_path.lower().split('.')[-1]
+        source = _open_source(source)
+        file_extension = _file_extension(source, filename)
         
         # Read file without header first
         if file_extension == 'csv':
             # Try different encodings for CSV files
-            encodings = ['utf-8', 'latin-1', 'cp1254', 'iso-8859-9']
             df = None
-            for encoding in encodings:
+            for encoding in CSV_ENCODINGS:
                 try:
-                    df = pd.read_csv(file_path, encoding=encoding, header=None)
+                    df = pd.read_csv(_rewind(source), encoding=encoding, header=None)
                     break
                 except UnicodeDecodeError:
                     continue
             
             if df is None:
-                df = pd.read_csv(file_path, header=None)
+                df = pd.read_csv(_rewind(source), header=None)
         elif file_extension in ['xlsx', 'xls']:
-            df = pd.read_excel(file_path, header=None)
+            df = pd.read_excel(_rewind(source), header=None)
         else:
             raise ExcelImportError(f"Unsupported file format: {file_extension}")
         
@@ -186,57 +215,105 @@ def read_file_with_header_detection(file_path, bank_config=None):
             else:
                 # Fallback: try to read normally with first row as header
                 if file_extension == 'csv':
-                    df = pd.read_csv(file_path)
+                    df = pd.read_csv(_rewind(source))
                 else:
-                    df = pd.read_excel(file_path)
+                    df = pd.read_excel(_rewind(source))
                 logger.warning(f"Header row identifier '{header_identifier}' not found, using first row as header")
         else:
             # No header identifier, read normally with first row as header
             if file_extension == 'csv':
-                df = pd.read_csv(file_path)
+                df = pd.read_csv(_rewind(source))
             else:
-                df = pd.read_excel(file_path)
+                df = pd.read_excel(_rewind(source))
         
         return df
     
     except Exception as e:
         raise ExcelImportError(f"Could not read file: {str(e)}")
 
-def map_columns(df, bank_config):
+def map_columns(df, bank_config, lookup=None):
     """
     Map DataFrame columns according to bank configuration
+    lookup is the bank's compiled column lookup (COLUMN_LOOKUPS); it is
+    compiled from bank_config when not given. Columns are scanned once.
     """
+    if lookup is None:
+        lookup = compile_columns(bank_config['columns'])
+
     column_mapping = {}
-    
-    for field_type, possible_names in bank_config['columns'].items():
-        for possible_name in possible_names:
-            for col in df.columns:
-                if str(col).strip().lower() == possible_name.lower():
-                    column_mapping[field_type] = col
-                    break
-            if field_type in column_mapping:
-                break
+    preferences = {}
+    for col in df.columns:
+        match = lookup.get(normalize_header(col))
+        if match is None:
+            continue
+        field_type, preference = match
+        if field_type not in preferences or preference < preferences[field_type]:
+            column_mapping[field_type] = col
+            preferences[field_type] = preference
     
     return column_mapping
 
-def process_excel_data(file_path, bank_code, user_column_mapping=None):
+def detect_statement_bank(source, filename=None):
     """
-    Process Excel/CSV file and return transaction list
+    Detect the bank of a statement from its header row
+    Only the first HEADER_SCAN_ROWS rows are read. Raises ExcelImportError
+    when no bank's header is recognized.
     """
+    source = _open_source(source)
+    file_extension = _file_extension(source, filename)
+    try:
+        if file_extension == 'csv':
+            head = None
+            for encoding in CSV_ENCODINGS:
+                try:
+                    head = pd.read_csv(_rewind(source), encoding=encoding, header=None, nrows=HEADER_SCAN_ROWS)
+                    break
+                except UnicodeDecodeError:
+                    continue
+        elif file_extension in ['xlsx', 'xls']:
+            head = pd.read_excel(_rewind(source), header=None, nrows=HEADER_SCAN_ROWS)
+        else:
+            raise ExcelImportError(f"Unsupported file format: {file_extension}")
+    except ExcelImportError:
+        raise
+    except Exception as e:
+        raise ExcelImportError(f"Could not read file: {str(e)}")
+
+    if head is not None:
+        for row in head.itertuples(index=False):
+            bank_code = detect_bank(cell for cell in row if not pd.isna(cell))
+            if bank_code:
+                return bank_code
+    raise ExcelImportError("Could not detect the bank from the file; please select it")
+
+def process_excel_data(source, bank_code, user_column_mapping=None, filename=None):
+    """
+    Process Excel/CSV data and return transaction list
+    source may be a path, a binary file-like object or bytes (see
+    read_file_with_header_detection). When bank_code is None the bank is
+    detected from the header row; the result's bank_code is the one used.
+    """
+    if bank_code is None:
+        source = _open_source(source)
+        bank_code = detect_statement_bank(source, filename)
+        logger.info(f"Detected bank: {bank_code}")
+
     bank_config = get_bank_config(bank_code)
     if not bank_config:
         raise ExcelImportError(f"Unknown bank code: {bank_code}")
     
     try:
+        source = _open_source(source)
+
         # Read file with automatic header detection
-        df = read_file_with_header_detection(file_path, bank_config)
+        df = read_file_with_header_detection(source, bank_config, filename)
         
         # For Kuveytturk, load workbook to check bold formatting
         bold_rows = set()
-        if bank_config.get('use_bold_for_income') and file_path.lower().endswith(('.xlsx', '.xls')):
+        if bank_config.get('use_bold_for_income') and _file_extension(source, filename) in ('xlsx', 'xls'):
             try:
                 import openpyxl
-                wb = openpyxl.load_workbook(file_path)
+                wb = openpyxl.load_workbook(_rewind(source))
                 ws = wb.active
                 
                 # Find header row to calculate offset
@@ -272,7 +349,7 @@ def process_excel_data(file_path, bank_code, user_column_mapping=None):
         if user_column_mapping:
             column_mapping = user_column_mapping
         else:
-            column_mapping = map_columns(df, bank_config)
+            column_mapping = map_columns(df, bank_config, COLUMN_LOOKUPS.get(bank_code))
         
         # Check for required columns
         required_fields = ['date', 'description', 'amount']
@@ -332,6 +409,7 @@ def process_excel_data(file_path, bank_code, user_column_mapping=None):
                 continue
         
         return {
+            'bank_code': bank_code,
             'transactions': transactions,
             'errors': errors,
             'total_processed': len(df),
@@ -341,3 +419,22 @@ def process_excel_data(file_path, bank_code, user_column_mapping=None):
     
     except Exception as e:
         raise ExcelImportError(f"Excel processing error: {str(e)}")
+
+def parse_statement_file(filename, source, bank_code=None):
+    """
+    Parse one statement file for a multi-file import
+    bank_code None detects the bank of each file separately.
+    Top-level and returning only plain data so it can run in a worker process.
+    Parse failures are reported in the result instead of raised.
+    """
+    started = time.perf_counter()
+    try:
+        result = process_excel_data(source, bank_code, filename=filename)
+    except ExcelImportError as e:
+        return {'filename': filename, 'bank_code': bank_code, 'error': str(e)}
+
+    result['filename'] = filename
+    result['parse_ms'] = int((time.perf_counter() - started) * 1000)
+    # Raw row data is only useful for debugging and bloats the result
+    result['errors'] = [{'row': error['row'], 'error': error['error']} for error in result['errors']]
+    return result
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Stored import previews
+
+A dry run is parsed and categorized once; its summary and rendered rows are
+kept in import_preview / import_preview_row so every page reads only its
+own rows by position. Previews expire after IMPORT_PREVIEW_TTL seconds and
+are purged by each process on its first request and periodically after.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timezone, timedelta
+from flask import current_app
+from sqlalchemy import select, delete, insert
+from models import db
+from models.import_preview import ImportPreview, ImportPreviewRow
+
+logger = logging.getLogger(__name__)
+
+# Preview rows per executemany INSERT
+PREVIEW_INSERT_CHUNK = 1000
+
+# Seconds between purges of expired previews in one process
+PREVIEW_PURGE_INTERVAL = 300
+
+_last_purge = None
+_purge_lock = threading.Lock()
+
+
+def _expiry_cutoff():
+    return datetime.now(timezone.utc) - timedelta(seconds=current_app.config.get('IMPORT_PREVIEW_TTL', 3600))
+
+
+def store_preview(summary, rows):
+    """Save a preview summary and its JSON-ready rows; runs in the caller's transaction, the caller commits"""
+    preview = ImportPreview(summary=summary, row_count=len(rows))
+    db.session.add(preview)
+    db.session.flush()  # Get ID
+    for start in range(0, len(rows), PREVIEW_INSERT_CHUNK):
+        db.session.execute(insert(ImportPreviewRow), [
+            {'preview_id': preview.id, 'position': position, 'data': row}
+            for position, row in enumerate(rows[start:start + PREVIEW_INSERT_CHUNK], start)
+        ])
+    return preview
+
+
+def load_preview_page(preview_id, page, per_page):
+    """(preview, rows of the page), reading only that page's rows; None once the preview is gone or expired"""
+    preview = db.session.scalar(
+        select(ImportPreview).where(ImportPreview.id == preview_id, ImportPreview.created_at >= _expiry_cutoff())
+    )
+    if preview is None:
+        return None
+    start = (page - 1) * per_page
+    rows = db.session.scalars(
+        select(ImportPreviewRow.data)
+        .where(ImportPreviewRow.preview_id == preview_id,
+               ImportPreviewRow.position >= start, ImportPreviewRow.position < start + per_page)
+        .order_by(ImportPreviewRow.position)
+    ).all()
+    return preview, rows
+
+
+def purge_expired_previews(connection):
+    """Delete expired previews and their rows on the given connection. Returns the number of previews removed."""
+    expired = select(ImportPreview.id).where(ImportPreview.created_at < _expiry_cutoff())
+    connection.execute(delete(ImportPreviewRow).where(ImportPreviewRow.preview_id.in_(expired)))
+    return connection.execute(delete(ImportPreview).where(ImportPreview.id.in_(expired))).rowcount
+
+
+def purge_expired_previews_periodically():
+    """Purge expired previews at most every PREVIEW_PURGE_INTERVAL seconds per process; commits"""
+    global _last_purge
+    now = time.monotonic()
+    with _purge_lock:
+        if _last_purge is not None and now - _last_purge < PREVIEW_PURGE_INTERVAL:
+            return
+        _last_purge = now
+    try:
+        removed = purge_expired_previews(db.session.connection())
+        db.session.commit()
+        if removed:
+            logger.info(f"Purged {removed} expired import previews")
+    except Exception as e:
+        # Table might not exist yet (before migrations)
+        db.session.rollback()
+        logger.debug(f"Could not purge expired import previews: {str(e)}")
@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+"""
+Statement import pipeline: parse, categorize and persist
+"""
+
+import logging
+import multiprocessing
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from itertools import repeat
+from flask import current_app
+from sqlalchemy import select, delete, func
+from models import db
+from models.cashflow import CashflowTransaction, cashflow_transaction_tags
+from models.import_batch import ImportBatch
+from models.category import Category
+from models.categorization_rule import CategorizationRule
+from models.tag import Tag
+from utils.bank_configs import get_bank_config
+from utils.bulk_insert import bulk_insert_transactions
+from utils.jobs import JobError
+from utils.rule_cache import get_compiled_rules
+from utils.rule_stats import RuleHits
+from utils.transaction_stats import stats_deltas_for, apply_stats_deltas
+
+logger = logging.getLogger(__name__)
+
+# Number of row errors kept on the job result for display
+MAX_REPORTED_ERRORS = 5
+
+STATEMENT_EXTENSIONS = {'xlsx', 'xls', 'csv'}
+
+# Fingerprints per IN (...) query when looking up duplicates for a preview
+PREVIEW_LOOKUP_CHUNK = 1000
+
+
+def _elapsed_ms(started):
+    return int((time.perf_counter() - started) * 1000)
+
+
+def get_import_category():
+    """Create/find the default category for uncategorized imports"""
+    import_category = Category.query.filter_by(name='Import').first()
+    if not import_category:
+        import_category = Category(name='Import')
+        db.session.add(import_category)
+        db.session.flush()  # Get ID
+    return import_category
+
+
+def get_bank_tag(bank_code):
+    """Create/find the tag named after the statement's bank"""
+    bank_config = get_bank_config(bank_code)
+    bank_tag = Tag.query.filter_by(name=bank_config['name']).first()
+    if not bank_tag:
+        bank_tag = Tag(name=bank_config['name'])
+        db.session.add(bank_tag)
+        db.session.flush()  # Get ID
+    return bank_tag
+
+
+def fingerprint_transactions(transactions, bank_code):
+    """Fingerprint each parsed row, numbering identical rows within the statement"""
+    seen = {}
+    fingerprints = []
+    for transaction_data in transactions:
+        fields = (
+            bank_code,
+            transaction_data['date'],
+            transaction_data['amount'],
+            transaction_data['type'],
+            transaction_data.get('description'),
+        )
+        fingerprint = CashflowTransaction.make_fingerprint(*fields)
+        occurrence = seen.get(fingerprint, 0)
+        seen[fingerprint] = occurrence + 1
+        if occurrence:
+            fingerprint = CashflowTransaction.make_fingerprint(*fields, occurrence=occurrence)
+        fingerprints.append(fingerprint)
+    return fingerprints
+
+
+def categorize_statements(statements):
+    """
+    Apply active categorization rules (first match wins) to parsed statements.
+
+    statements is a list of (bank_code, transactions, import_batch_id)
+    tuples. Rules come from the process-level compiled rule cache. Returns row
+    dicts ready for bulk_insert_transactions(), with the matched rule_id added.
+    """
+    import_category = get_import_category()
+    bank_tags = {}
+    compiled_rules = get_compiled_rules()
+
+    rows = []
+    for bank_code, transactions, import_batch_id in statements:
+        if bank_code not in bank_tags:
+            bank_tags[bank_code] = get_bank_tag(bank_code)
+        bank_tag = bank_tags[bank_code]
+
+        fingerprints = fingerprint_transactions(transactions, bank_code)
+
+        for transaction_data, fingerprint in zip(transactions, fingerprints):
+            matched_category_id = import_category.id
+            matched_tag_ids = [bank_tag.id]
+            matched_type = transaction_data['type']
+            matched_rule_id = None
+
+            description = transaction_data['description']
+            normalized = CategorizationRule.normalize(description) if description is not None else None
+            rule = compiled_rules.match_normalized(normalized, transaction_data['amount'], transaction_data['type'])
+            if rule is not None:
+                matched_rule_id = rule.id
+                matched_category_id = rule.category_id
+                matched_tag_ids = [bank_tag.id, *rule.tag_ids]
+                if rule.type_override:
+                    matched_type = rule.type_override
+
+            rows.append({
+                'date': transaction_data['date'],
+                'amount': abs(transaction_data['amount']),
+                'type': matched_type,
+                'category_id': matched_category_id,
+                'description': description,
+                'description_normalized': normalized,
+                'source': 'excel_import',
+                'fingerprint': fingerprint,
+                'import_batch_id': import_batch_id,
+                'tag_ids': matched_tag_ids,
+                'rule_id': matched_rule_id,
+            })
+    return rows
+
+
+def is_statement_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in STATEMENT_EXTENSIONS
+
+
+def expand_uploads(uploads, max_unzipped_size):
+    """
+    Flatten (filename, file object) uploads into statement files, replacing
+    each ZIP archive with the statements it contains (read into bytes).
+    """
+    statements = []
+    for filename, upload in uploads:
+        if not filename.lower().endswith('.zip'):
+            statements.append((filename, upload))
+            continue
+
+        try:
+            with zipfile.ZipFile(upload) as archive:
+                entries = [
+                    info for info in archive.infolist()
+                    if not info.is_dir()
+                    and not info.filename.startswith('__MACOSX/')
+                    and not os.path.basename(info.filename).startswith('.')
+                    and is_statement_file(info.filename)
+                ]
+                if sum(info.file_size for info in entries) > max_unzipped_size:
+                    raise JobError(f'{filename} is too large to import.')
+                for info in entries:
+                    statements.append((os.path.basename(info.filename), archive.read(info)))
+        except zipfile.BadZipFile:
+            raise JobError(f'Could not open ZIP archive: {filename}')
+        finally:
+            upload.close()
+    return statements
+
+
+def parse_statements(statements, bank_code, workers=0):
+    """
+    Parse statement files, in worker processes when there are several.
+
+    pandas/openpyxl parsing is CPU-bound and holds the GIL, so threads would
+    not help. Single files are parsed in-process to avoid the pool start-up
+    cost and to read spooled uploads without copying them.
+    """
+    # Imported here so workers only load pandas once they parse a statement
+    from utils.excel_processor import parse_statement_file
+
+    if workers and len(statements) > 1:
+        filenames = [filename for filename, _ in statements]
+        payloads = [source if isinstance(source, bytes) else source.read() for _, source in statements]
+        # forkserver: the job runs in a thread, and forking a threaded process is unsafe
+        context = multiprocessing.get_context('forkserver')
+        with ProcessPoolExecutor(max_workers=min(workers, len(statements)), mp_context=context) as pool:
+            return list(pool.map(parse_statement_file, filenames, payloads, repeat(bank_code)))
+    return [parse_statement_file(filename, source, bank_code) for filename, source in statements]
+
+
+def parse_uploads(uploads, bank_code):
+    """Expand and parse uploads with the app's limits; raises JobError if nothing is left to parse"""
+    statements = expand_uploads(uploads, current_app.config['IMPORT_MAX_UNZIPPED_SIZE'])
+    if not statements:
+        raise JobError('No statement files (.xlsx, .xls, .csv) found in the upload.')
+    return parse_statements(statements, bank_code, current_app.config['IMPORT_PARSE_WORKERS'])
+
+
+def run_import(progress, uploads, bank_code):
+    """
+    Background job: import uploaded statements, one ImportBatch per file.
+
+    uploads is a list of (filename, binary file object) pairs, usually
+    SpooledTemporaryFiles, owned by the job and closed when done. ZIP
+    archives are expanded. Files are parsed in parallel, then categorized
+    and inserted in a single stage. Returns the summary stored on the job row.
+    """
+    try:
+        parsed = parse_uploads(uploads, bank_code)
+
+        files = []
+        imported_statements = []
+        for result in parsed:
+            if 'error' in result:
+                logger.error(f"ExcelImportError ({result['filename']}): {result['error']}")
+                files.append({'file_name': result['filename'], 'error': f"Excel import error: {result['error']}"})
+                continue
+            files.append({'file_name': result['filename']})
+            batch = ImportBatch(
+                file_name=result['filename'],
+                bank_code=result['bank_code'],
+                total_rows=len(result['transactions']),
+                failed_count=result['failed'],
+                parse_ms=result['parse_ms'],
+            )
+            db.session.add(batch)
+            imported_statements.append((batch, result))
+
+        if not imported_statements:
+            if len(files) == 1:
+                raise JobError(files[0]['error'])
+            raise JobError('; '.join(f"{file['file_name']}: {file['error']}" for file in files))
+        db.session.flush()  # Get batch IDs
+
+        total = sum(batch.total_rows for batch, _ in imported_statements)
+        progress(0, total, force=True)
+
+        started = time.perf_counter()
+        rows = categorize_statements([
+            (batch.bank_code, result['transactions'], batch.id) for batch, result in imported_statements
+        ])
+        categorize_ms = _elapsed_ms(started)
+
+        started = time.perf_counter()
+        bulk_insert_transactions(rows, progress=lambda count: progress(count, total))
+        insert_ms = _elapsed_ms(started)
+
+        # Only rows actually inserted count as hits; duplicates were matched before
+        rule_hits = RuleHits()
+        for row in rows:
+            if 'id' in row:
+                rule_hits.add(row['rule_id'])
+        rule_hits.flush()
+
+        imported_counts = dict(db.session.query(
+            CashflowTransaction.import_batch_id, func.count(CashflowTransaction.id)
+        ).filter(
+            CashflowTransaction.import_batch_id.in_([batch.id for batch, _ in imported_statements])
+        ).group_by(CashflowTransaction.import_batch_id).all())
+
+        errors = []
+        finished_at = datetime.now(timezone.utc)
+        file_reports = [file for file in files if 'error' not in file]
+        for (batch, result), file in zip(imported_statements, file_reports):
+            batch.imported_count = imported_counts.get(batch.id, 0)
+            batch.skipped_count = batch.total_rows - batch.imported_count
+            batch.categorize_ms = categorize_ms
+            batch.insert_ms = insert_ms
+            batch.status = ImportBatch.COMPLETED
+            batch.finished_at = finished_at
+            file.update({
+                'batch_id': batch.id,
+                'total': batch.total_rows,
+                'imported': batch.imported_count,
+                'skipped': batch.skipped_count,
+                'failed': batch.failed_count,
+            })
+            for error in result['errors']:
+                if len(parsed) > 1:
+                    error = dict(error, file=batch.file_name)
+                errors.append(error)
+        db.session.commit()
+
+        return {
+            'batch_ids': [batch.id for batch, _ in imported_statements],
+            'total': total,
+            'imported': sum(file.get('imported', 0) for file in files),
+            'skipped': sum(file.get('skipped', 0) for file in files),
+            'failed': sum(file.get('failed', 0) for file in files),
+            'errors': errors[:MAX_REPORTED_ERRORS],
+            'files': files,
+        }
+    finally:
+        for _, upload in uploads:
+            upload.close()
+
+
+def preview_import(uploads, bank_code):
+    """
+    Dry run of run_import(): parse, categorize and flag rows that were
+    already imported, without committing anything.
+
+    Categorization may create the Import category or bank tag on first use;
+    those flushes are rolled back by the caller. Returns a summary dict and
+    the categorized rows, each with a 'duplicate' flag and its 'file_name'.
+    """
+    try:
+        parsed = parse_uploads(uploads, bank_code)
+    finally:
+        for _, upload in uploads:
+            upload.close()
+
+    statements = [result for result in parsed if 'error' not in result]
+    if not statements:
+        raise JobError('; '.join(
+            f"Excel import error: {result['error']}" if len(parsed) == 1
+            else f"{result['filename']}: Excel import error: {result['error']}"
+            for result in parsed
+        ))
+
+    rows = categorize_statements([
+        (result['bank_code'], result['transactions'], None) for result in statements
+    ])
+    file_names = [result['filename'] for result in statements for _ in result['transactions']]
+
+    # Look up already-imported fingerprints in IN-list chunks
+    fingerprints = [row['fingerprint'] for row in rows]
+    existing = set()
+    for start in range(0, len(fingerprints), PREVIEW_LOOKUP_CHUNK):
+        chunk = fingerprints[start:start + PREVIEW_LOOKUP_CHUNK]
+        existing.update(db.session.scalars(
+            select(CashflowTransaction.fingerprint).where(CashflowTransaction.fingerprint.in_(chunk))
+        ))
+
+    rule_counts = {}
+    for row, file_name in zip(rows, file_names):
+        row['duplicate'] = row['fingerprint'] in existing
+        row['file_name'] = file_name
+        if row['rule_id'] is not None and not row['duplicate']:
+            rule_counts[row['rule_id']] = rule_counts.get(row['rule_id'], 0) + 1
+
+    compiled_rules = get_compiled_rules()
+    errors = [
+        dict(error, file=result['filename']) if len(parsed) > 1 else error
+        for result in statements for error in result['errors']
+    ]
+    duplicates = sum(1 for row in rows if row['duplicate'])
+
+    summary = {
+        'total': len(rows),
+        'new': len(rows) - duplicates,
+        'duplicates': duplicates,
+        'failed': sum(result['failed'] for result in statements),
+        'uncategorized': sum(1 for row in rows if row['rule_id'] is None and not row['duplicate']),
+        'rules': sorted((
+            {'rule_id': rule_id, 'rule': compiled_rules.by_id[rule_id].name, 'count': count}
+            for rule_id, count in rule_counts.items() if rule_id in compiled_rules.by_id
+        ), key=lambda item: -item['count']),
+        'files': [
+            {'file_name': result['filename'], 'error': f"Excel import error: {result['error']}"} if 'error' in result
+            else {'file_name': result['filename'], 'total': len(result['transactions']), 'failed': result['failed']}
+            for result in parsed
+        ],
+        'errors': errors[:MAX_REPORTED_ERRORS],
+    }
+    return summary, rows
+
+
+def rollback_import_batch(batch):
+    """
+    Delete every transaction of an import batch, and its tag links, with
+    set-based statements, and take them out of the category and tag stats.
+    Runs in the caller's transaction; the caller commits.
+    Returns the number of transactions removed.
+    """
+    in_batch = CashflowTransaction.import_batch_id == batch.id
+    stats_deltas = stats_deltas_for(db.session, [in_batch])
+    batch_txn_ids = select(CashflowTransaction.id).where(in_batch)
+    db.session.execute(
+        delete(cashflow_transaction_tags).where(
+            cashflow_transaction_tags.c.cashflow_transaction_id.in_(batch_txn_ids)
+        )
+    )
+    removed = db.session.execute(
+        delete(CashflowTransaction).where(in_batch),
+        execution_options={'synchronize_session': False},
+    ).rowcount
+    apply_stats_deltas(db.session.connection(), *stats_deltas)
+
+    batch.status = ImportBatch.ROLLED_BACK
+    batch.rolled_back_at = datetime.now(timezone.utc)
+    return removed
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Local background job runner backed by the background_job table
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from flask import current_app
+from sqlalchemy import update
+from models import db
+from models.background_job import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class JobError(Exception):
+    """Job failure whose message is safe to show to the user"""
+    pass
+
+
+def _get_executor(app):
+    """Create the worker pool lazily so each gunicorn worker owns its own threads"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config.get('JOB_WORKERS', 2),
+                thread_name_prefix='track-finance-job'
+            )
+        return _executor
+
+
+class JobProgress:
+    """
+    Progress reporter handed to job functions.
+
+    Writes go through their own short transaction so that polling clients see
+    them while the job's main transaction is still open. Updates are throttled
+    to avoid turning progress reporting into the bottleneck.
+    """
+
+    def __init__(self, app, job_id, interval=0.5):
+        self.app = app
+        self.job_id = job_id
+        self.interval = interval
+        self._last_write = 0.0
+
+    def __call__(self, progress, total=None, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_write < self.interval:
+            return
+        self._last_write = now
+
+        # Inline jobs share the request's connection; the final state is
+        # written when the job finishes, so intermediate writes are skipped.
+        if self.app.config.get('JOBS_RUN_INLINE'):
+            return
+
+        values = {'progress': progress, 'heartbeat_at': datetime.now(timezone.utc)}
+        if total is not None:
+            values['total'] = total
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(
+                    update(BackgroundJob.__table__)
+                    .where(BackgroundJob.__table__.c.id == self.job_id)
+                    .values(**values)
+                )
+        except Exception as e:
+            logger.warning(f"Could not report progress for job {self.job_id}: {str(e)}")
+
+
+def _mark_failed(job_id, message):
+    """Record a failure without relying on the job's ORM state, which may be unusable"""
+    try:
+        db.session.execute(
+            update(BackgroundJob.__table__)
+            .where(BackgroundJob.__table__.c.id == job_id)
+            .values(status=BackgroundJob.FAILED, message=message, finished_at=datetime.now(timezone.utc))
+        )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Could not record the failure of job {job_id}: {str(e)}")
+
+
+def _run_job(app, job_id, func, args, kwargs):
+    """Execute func(progress, *args, **kwargs) and record the outcome on the job row"""
+    with app.app_context():
+        try:
+            job = db.session.get(BackgroundJob, job_id)
+            if job is None or job.status != BackgroundJob.PENDING:
+                logger.warning(f"Job {job_id} is no longer pending; not running it")
+                return
+            job.status = BackgroundJob.RUNNING
+            job.started_at = job.heartbeat_at = datetime.now(timezone.utc)
+            db.session.commit()
+
+            result = func(JobProgress(app, job_id), *args, **kwargs)
+
+            job = db.session.get(BackgroundJob, job_id)
+            job.status = BackgroundJob.COMPLETED
+            job.result = result
+            if result and 'total' in result:
+                job.total = result['total']
+                job.progress = result['total']
+            job.finished_at = datetime.now(timezone.utc)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Job {job_id} failed: {str(e)}", exc_info=True)
+            if isinstance(e, JobError):
+                message = str(e)
+            else:
+                message = 'Something unexpected happened. Please try again.'
+            _mark_failed(job_id, message)
+
+
+def _as_utc(value):
+    # SQLite hands back naive datetimes
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def load_job(job_id):
+    """
+    The job with this ID, or None. An unfinished job whose runner has been
+    silent for JOB_STALE_SECONDS (e.g. its gunicorn worker was restarted)
+    is marked failed first, so pollers stop waiting for it.
+    """
+    job = db.session.get(BackgroundJob, job_id)
+    if job is None or job.is_finished:
+        return job
+    last_seen = job.heartbeat_at or job.started_at or job.created_at
+    now = datetime.now(timezone.utc)
+    if last_seen and now - _as_utc(last_seen) > timedelta(seconds=current_app.config.get('JOB_STALE_SECONDS', 900)):
+        table = BackgroundJob.__table__
+        db.session.execute(
+            update(table)
+            .where(table.c.id == job_id, table.c.status.in_([BackgroundJob.PENDING, BackgroundJob.RUNNING]))
+            .values(status=BackgroundJob.FAILED, finished_at=now,
+                    message='The job stopped unexpectedly, probably because the server restarted. Please try again.')
+        )
+        db.session.commit()
+        db.session.refresh(job)
+        logger.warning(f"Job {job_id} was stale and has been marked failed")
+    return job
+
+
+def submit_job(kind, func, *args, **kwargs):
+    """
+    Create a job row and schedule func on the local worker pool.
+
+    func is called as func(progress, *args, **kwargs) inside its own app
+    context and returns a JSON-serializable result. With JOBS_RUN_INLINE
+    (tests) the job runs before this returns.
+    """
+    app = current_app._get_current_object()
+
+    job = BackgroundJob(kind=kind, status=BackgroundJob.PENDING)
+    db.session.add(job)
+    db.session.commit()
+
+    if app.config.get('JOBS_RUN_INLINE'):
+        _run_job(app, job.id, func, args, kwargs)
+        db.session.refresh(job)
+    else:
+        _get_executor(app).submit(_run_job, app, job.id, func, args, kwargs)
+
+    return job
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Re-apply categorization rules to existing transactions
+"""
+
+import logging
+from datetime import date
+from sqlalchemy import select, update, insert, func, false, and_
+from models import db
+from models.cashflow import CashflowTransaction, cashflow_transaction_tags
+from models.category import Category
+from utils.rule_cache import get_compiled_rules
+from utils.transaction_stats import CategoryDeltas, TagDeltas, apply_stats_deltas
+
+logger = logging.getLogger(__name__)
+
+# Transactions read, matched and written back per chunk (and per commit)
+REAPPLY_CHUNK_SIZE = 1000
+
+
+def build_filters(category_id=None, date_from=None, date_to=None):
+    """
+    WHERE clauses selecting the transactions to re-categorize.
+    category_id 'import' targets the Import category; None targets every transaction.
+    """
+    filters = []
+    if category_id == 'import':
+        category_id = db.session.execute(select(Category.id).where(Category.name == 'Import')).scalar()
+        if category_id is None:
+            return [false()]  # nothing was ever imported uncategorized
+    if category_id is not None:
+        filters.append(CashflowTransaction.category_id == int(category_id))
+    if date_from:
+        filters.append(CashflowTransaction.date >= date.fromisoformat(date_from))
+    if date_to:
+        filters.append(CashflowTransaction.date <= date.fromisoformat(date_to))
+    return filters
+
+
+def rule_filter(rule):
+    """
+    WHERE clause matching the transactions a rule's conditions select, or None
+    for regex rules, which are only evaluated in Python. equals and
+    starts_with use the description_normalized index.
+    """
+    column = CashflowTransaction.description_normalized
+    if rule.operator == 'equals':
+        clauses = [column == rule.value]
+    elif rule.operator == 'starts_with':
+        clauses = [column.startswith(rule.value, autoescape=True)]
+    elif rule.operator == 'ends_with':
+        clauses = [column.endswith(rule.value, autoescape=True)]
+    elif rule.operator == 'contains':
+        clauses = [column.contains(rule.value, autoescape=True)]
+    else:
+        return None
+    if rule.amount_min is not None:
+        clauses.append(CashflowTransaction.amount >= rule.amount_min)
+    if rule.amount_max is not None:
+        clauses.append(CashflowTransaction.amount <= rule.amount_max)
+    if rule.condition_type:
+        clauses.append(CashflowTransaction.type == rule.condition_type)
+    return and_(*clauses)
+
+
+def _chunks(filters, chunk_size):
+    """Keyset-paginated (id, description_normalized, amount, category_id, type) rows"""
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(
+                CashflowTransaction.id,
+                CashflowTransaction.description_normalized,
+                CashflowTransaction.amount,
+                CashflowTransaction.category_id,
+                CashflowTransaction.type,
+            ).where(CashflowTransaction.id > last_id, *filters)
+            .order_by(CashflowTransaction.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def _stats_and_links(changes):
+    """
+    New tag links and stats deltas for a chunk of (row, rule, new type) changes.
+    Reads the chunk's existing tag links once: they are kept, and move to the
+    new type in the tag stats when the type changes.
+    """
+    existing = {}
+    for txn_id, tag_id in db.session.execute(
+        select(cashflow_transaction_tags.c.cashflow_transaction_id, cashflow_transaction_tags.c.tag_id)
+        .where(cashflow_transaction_tags.c.cashflow_transaction_id.in_([row.id for row, _, _ in changes]))
+    ):
+        existing.setdefault(txn_id, set()).add(tag_id)
+
+    tag_links = []
+    category_deltas = CategoryDeltas()
+    tag_deltas = TagDeltas()
+    for row, rule, new_type in changes:
+        category_deltas.remove(row.category_id, row.type, row.amount)
+        category_deltas.add(rule.category_id, new_type, row.amount)
+        tags = existing.get(row.id, set())
+        if new_type != row.type:
+            for tag_id in tags:
+                tag_deltas.remove(tag_id, row.type, row.amount)
+                tag_deltas.add(tag_id, new_type, row.amount)
+        for tag_id in rule.tag_ids:
+            if tag_id not in tags:
+                tags.add(tag_id)
+                tag_links.append({'cashflow_transaction_id': row.id, 'tag_id': tag_id})
+                tag_deltas.add(tag_id, new_type, row.amount)
+    return tag_links, category_deltas, tag_deltas
+
+
+def reapply_rules(progress, category_id=None, date_from=None, date_to=None, dry_run=False,
+                  chunk_size=REAPPLY_CHUNK_SIZE):
+    """
+    Background job: re-run the active rules over existing transactions.
+
+    Transactions whose first matching rule gives a different category or
+    type are updated with one UPDATE per (category, type) group per chunk,
+    and the rule's tags are added (existing links are kept). Category and
+    tag stats are adjusted along with each chunk, which is committed on its
+    own. With dry_run nothing is written; the counts report what would change.
+    """
+    compiled_rules = get_compiled_rules()
+    filters = build_filters(category_id, date_from, date_to)
+    total = db.session.execute(select(func.count(CashflowTransaction.id)).where(*filters)).scalar()
+    progress(0, total, force=True)
+
+    scanned = matched = changed = 0
+    rule_counts = {}
+    for rows in _chunks(filters, chunk_size):
+        groups = {}  # (category_id, type_override) -> transaction ids
+        changes = []  # (row, rule, new type)
+        for row in rows:
+            rule = compiled_rules.match_normalized(row.description_normalized, row.amount, row.type)
+            if rule is None:
+                continue
+            matched += 1
+            new_type = rule.type_override or row.type
+            if rule.category_id == row.category_id and new_type == row.type:
+                continue
+            changed += 1
+            rule_counts[rule.id] = rule_counts.get(rule.id, 0) + 1
+            groups.setdefault((rule.category_id, rule.type_override), []).append(row.id)
+            changes.append((row, rule, new_type))
+
+        if not dry_run and changes:
+            tag_links, category_deltas, tag_deltas = _stats_and_links(changes)
+            for (new_category_id, type_override), ids in groups.items():
+                values = {'category_id': new_category_id}
+                if type_override:
+                    values['type'] = type_override
+                db.session.execute(
+                    update(CashflowTransaction).where(CashflowTransaction.id.in_(ids)).values(**values),
+                    execution_options={'synchronize_session': False},
+                )
+            if tag_links:
+                db.session.execute(insert(cashflow_transaction_tags), tag_links)
+            apply_stats_deltas(db.session.connection(), category_deltas, tag_deltas)
+            db.session.commit()
+
+        scanned += len(rows)
+        progress(scanned, total)
+
+    logger.info(f"Re-applied rules: {changed} of {scanned} transactions {'would change' if dry_run else 'changed'}")
+    return {
+        'dry_run': dry_run,
+        'total': scanned,
+        'matched': matched,
+        'changed': changed,
+        'rules': sorted((
+            {'rule_id': rule_id, 'rule': compiled_rules.by_id[rule_id].name, 'count': count}
+            for rule_id, count in rule_counts.items()
+        ), key=lambda item: -item['count']),
+    }
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Rule shadowing and conflict analysis
+
+Two complementary checks over the active rules, in priority order:
+- static: a rule is shadowed when a higher-priority rule matches every
+  description it can match (e.g. contains 'migros' before starts_with
+  'migros kadikoy') with conditions no narrower than its own, so it can
+  never fire. Regex rules are only compared for identical patterns.
+- history: the compiled matcher is run over the most recent stored
+  transactions, reading description_normalized in keyset batches, counting
+  for each rule how often it matched and how often it won, and which rules
+  matched the same transactions.
+"""
+
+import logging
+from sqlalchemy import select
+from models import db
+from models.cashflow import CashflowTransaction
+from utils.rule_cache import get_compiled_rules
+
+logger = logging.getLogger(__name__)
+
+# Default and maximum number of recent transactions scanned
+ANALYZE_DEFAULT_LIMIT = 10000
+ANALYZE_MAX_LIMIT = 200000
+# Transactions read per query
+ANALYZE_CHUNK_SIZE = 2000
+# Overlapping rule pairs listed in the report
+MAX_REPORTED_OVERLAPS = 50
+
+# Rule statuses, most severe first
+SHADOWED = 'shadowed'        # can never fire
+NEVER_WINS = 'never_wins'    # matched, but a higher-priority rule always matched too
+UNMATCHED = 'unmatched'      # matched none of the scanned transactions
+OK = 'ok'
+
+
+def _value_covers(higher, lower):
+    """True if every description lower's value matches is also matched by higher's"""
+    a, b = higher.value or '', lower.value or ''
+    if higher.operator == 'regex' or lower.operator == 'regex':
+        return higher.operator == lower.operator and a == b
+    if higher.operator == 'contains':
+        return a in b
+    if higher.operator == 'starts_with':
+        return lower.operator in ('starts_with', 'equals') and b.startswith(a)
+    if higher.operator == 'ends_with':
+        return lower.operator in ('ends_with', 'equals') and b.endswith(a)
+    if higher.operator == 'equals':
+        return lower.operator == 'equals' and a == b
+    return False
+
+
+def _conditions_cover(higher, lower):
+    """True if higher's amount and type conditions hold whenever lower's do"""
+    if higher.condition_type and higher.condition_type != lower.condition_type:
+        return False
+    if higher.amount_min is not None and (lower.amount_min is None or lower.amount_min < higher.amount_min):
+        return False
+    if higher.amount_max is not None and (lower.amount_max is None or lower.amount_max > higher.amount_max):
+        return False
+    return True
+
+
+def find_shadowing(rules):
+    """Map of rule ID -> the higher-priority rules that fully shadow it"""
+    shadowed = {}
+    for position, lower in enumerate(rules):
+        for higher in rules[:position]:
+            if _value_covers(higher, lower) and _conditions_cover(higher, lower):
+                shadowed.setdefault(lower.id, []).append(higher)
+    return shadowed
+
+
+def _recent_chunks(limit, chunk_size):
+    """The most recent transactions, newest first, in keyset-paginated chunks"""
+    last_id = None
+    remaining = limit
+    while remaining > 0:
+        query = select(
+            CashflowTransaction.id,
+            CashflowTransaction.description_normalized,
+            CashflowTransaction.amount,
+            CashflowTransaction.type,
+        ).order_by(CashflowTransaction.id.desc()).limit(min(chunk_size, remaining))
+        if last_id is not None:
+            query = query.where(CashflowTransaction.id < last_id)
+        rows = db.session.execute(query).all()
+        if not rows:
+            return
+        yield rows
+        remaining -= len(rows)
+        last_id = rows[-1].id
+
+
+def analyze_rules(limit=ANALYZE_DEFAULT_LIMIT, chunk_size=ANALYZE_CHUNK_SIZE):
+    """
+    Analyze the active rules against each other and the last limit transactions.
+    Returns {'scanned', 'limit', 'rules', 'overlaps'}; rules are in priority order.
+    """
+    compiled_rules = get_compiled_rules()
+    rules = compiled_rules.rules
+    matcher = compiled_rules.matcher
+    shadowing = find_shadowing(rules)
+
+    matched = dict.fromkeys(compiled_rules.by_id, 0)
+    won = dict.fromkeys(compiled_rules.by_id, 0)
+    overlaps = {}  # (winner id, other id) -> transactions
+    scanned = 0
+    if rules:
+        for rows in _recent_chunks(limit, chunk_size):
+            for row in rows:
+                found = matcher.all_matches_normalized(row.description_normalized, row.amount, row.type)
+                if not found:
+                    continue
+                winner = found[0]
+                won[winner.id] += 1
+                for rule in found:
+                    matched[rule.id] += 1
+                for rule in found[1:]:
+                    overlaps[(winner.id, rule.id)] = overlaps.get((winner.id, rule.id), 0) + 1
+            scanned += len(rows)
+
+    report = []
+    for position, rule in enumerate(rules, start=1):
+        if rule.id in shadowing:
+            status = SHADOWED
+        elif not matched[rule.id]:
+            status = UNMATCHED
+        elif not won[rule.id]:
+            status = NEVER_WINS
+        else:
+            status = OK
+        report.append({
+            'position': position,
+            'rule_id': rule.id,
+            'rule': rule.name,
+            'operator': rule.operator,
+            'value': rule.value,
+            'matched': matched[rule.id],
+            'won': won[rule.id],
+            'status': status,
+            'shadowed_by': [higher.name for higher in shadowing.get(rule.id, ())],
+        })
+
+    logger.info(f"Analyzed {len(rules)} rules over {scanned} transactions")
+    return {
+        'scanned': scanned,
+        'limit': limit,
+        'rules': report,
+        'overlaps': [
+            {
+                'rule': compiled_rules.by_id[winner_id].name,
+                'other': compiled_rules.by_id[other_id].name,
+                'count': count,
+            }
+            for (winner_id, other_id), count in sorted(overlaps.items(), key=lambda item: -item[1])
+        ][:MAX_REPORTED_OVERLAPS],
+    }
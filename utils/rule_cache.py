@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Process-level cache of the compiled active categorization rules
+
+Each worker process keeps one snapshot of the active rules (category, tag
+IDs and type override preloaded) and its RuleMatcher. A version token in
+the settings table is replaced in the same transaction as any change to a
+rule, so every worker notices the change on its next import; checking it
+costs one small query per import and categorizing rows never touches the
+database.
+"""
+
+import uuid
+from collections import namedtuple
+from itertools import chain
+from sqlalchemy import event, select, update, insert
+from sqlalchemy.orm import Session, selectinload
+from models import db
+from models.categorization_rule import CategorizationRule
+from models.category import Category
+from models.settings import Settings
+from models.tag import Tag
+from utils.rule_matcher import RuleMatcher
+
+RULES_VERSION_KEY = 'categorization_rules_version'
+
+# Detached copy of a rule with everything categorization needs
+CompiledRule = namedtuple(
+    'CompiledRule',
+    'id name operator value amount_min amount_max condition_type category_id tag_ids type_override',
+)
+
+
+class CompiledRules:
+    """Immutable snapshot of the active rules in priority order"""
+
+    def __init__(self, version, rules):
+        self.version = version
+        self.rules = tuple(rules)
+        self.by_id = {rule.id: rule for rule in self.rules}
+        self.matcher = RuleMatcher(self.rules)
+
+    def match(self, description, amount=None, txn_type=None):
+        return self.matcher.match(description, amount, txn_type)
+
+    def match_normalized(self, desc, amount=None, txn_type=None):
+        return self.matcher.match_normalized(desc, amount, txn_type)
+
+
+_snapshot = None
+
+
+def bump_rules_version(connection):
+    """Replace the rules version token; runs on the caller's connection and transaction"""
+    settings = Settings.__table__
+    token = uuid.uuid4().hex
+    updated = connection.execute(
+        update(settings).where(settings.c.key == RULES_VERSION_KEY).values(value=token)
+    ).rowcount
+    if not updated:
+        connection.execute(insert(settings).values(key=RULES_VERSION_KEY, value=token))
+
+
+def get_rules_version():
+    return db.session.execute(
+        select(Settings.value).where(Settings.key == RULES_VERSION_KEY)
+    ).scalar()
+
+
+def load_compiled_rules(version=None):
+    """Read the active rules with their tags in one round trip per relationship"""
+    rules = CategorizationRule.query.filter_by(is_active=True).order_by(
+        CategorizationRule.priority.asc()
+    ).options(selectinload(CategorizationRule.tags)).all()
+    return CompiledRules(version, [
+        CompiledRule(
+            id=rule.id,
+            name=rule.name,
+            operator=rule.operator,
+            value=rule.value,
+            amount_min=rule.amount_min,
+            amount_max=rule.amount_max,
+            condition_type=rule.condition_type,
+            category_id=rule.category_id,
+            tag_ids=tuple(tag.id for tag in rule.tags),
+            type_override=rule.type_override,
+        )
+        for rule in rules
+    ])
+
+
+def get_compiled_rules():
+    """
+    The cached snapshot if it is still current, otherwise a fresh one.
+    A database without a version token is never cached.
+    """
+    global _snapshot
+    version = get_rules_version()
+    snapshot = _snapshot
+    if version is not None and snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    snapshot = load_compiled_rules(version)
+    if version is not None:
+        _snapshot = snapshot
+    return snapshot
+
+
+def invalidate_rule_cache():
+    """Drop this process's snapshot"""
+    global _snapshot
+    _snapshot = None
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_on_rule_change(session, flush_context):
+    """Bump the version whenever a flush adds, changes or removes a rule (or a category/tag rules point at)"""
+    changed = any(isinstance(obj, CategorizationRule) for obj in chain(session.new, session.dirty, session.deleted))
+    changed = changed or any(isinstance(obj, (Category, Tag)) for obj in session.deleted)
+    if changed:
+        bump_rules_version(session.connection())
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled categorization rule matcher
+
+Active rules are compiled once per import into one structure per operator,
+so each description is normalized once and scanned once per operator
+instead of once per rule:
+- contains: an Aho-Corasick automaton
+- starts_with: a prefix trie
+- ends_with: a trie over reversed values
+- equals: a dict
+- regex: one combined pattern whose alternatives are in priority order
+Amount-range and type conditions are only checked for rules whose
+description condition matched. The rule with the lowest position in
+priority order wins, which is the same result as calling
+CategorizationRule.matches() on each rule in order.
+"""
+
+import re
+from models.categorization_rule import CategorizationRule
+
+# Backreferences would point at the wrong groups once patterns are combined
+_BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+
+
+class _Trie:
+    """Character trie; each node records the rule positions of values ending there"""
+
+    def __init__(self):
+        self.children = [{}]
+        self.terminals = [[]]
+
+    def add(self, word, index):
+        node = 0
+        for char in word:
+            child = self.children[node].get(char)
+            if child is None:
+                child = len(self.children)
+                self.children[node][char] = child
+                self.children.append({})
+                self.terminals.append([])
+            node = child
+        self.terminals[node].append(index)
+        return node
+
+    def walk(self, text):
+        """Rule positions of every value that is a prefix of text"""
+        found = list(self.terminals[0])
+        node = 0
+        for char in text:
+            node = self.children[node].get(char)
+            if node is None:
+                break
+            found.extend(self.terminals[node])
+        return found
+
+
+class _AhoCorasick(_Trie):
+    """Trie with failure links, matching every value that occurs anywhere in a text"""
+
+    def __init__(self):
+        super().__init__()
+        self.fail = None
+        self.outputs = None
+
+    def build(self):
+        """Compute failure links breadth-first and merge outputs along them"""
+        self.fail = [0] * len(self.children)
+        self.outputs = [list(terminals) for terminals in self.terminals]
+        queue = list(self.children[0].values())
+        for node in queue:
+            for char, child in self.children[node].items():
+                fallback = self.fail[node]
+                while fallback and char not in self.children[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.children[fallback].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                self.outputs[child].extend(self.outputs[self.fail[child]])
+                queue.append(child)
+
+    def search(self, text):
+        """Rule positions of every value occurring in text"""
+        found = list(self.outputs[0])
+        node = 0
+        children, fail, outputs = self.children, self.fail, self.outputs
+        for char in text:
+            while node and char not in children[node]:
+                node = fail[node]
+            node = children[node].get(char, 0)
+            if outputs[node]:
+                found.extend(outputs[node])
+        return found
+
+
+class _RegexRules:
+    """
+    Regex rules as one alternation of lookaheads, tried in priority order.
+
+    re tries alternatives left to right at position 0, so the first
+    alternative whose pattern occurs anywhere in the text is the
+    highest-priority matching regex rule; its empty named group r<index>
+    identifies it. Patterns that cannot be combined fall back to one search
+    per rule.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = patterns  # [(index, compiled pattern)] in priority order
+        self.combined = None
+        if patterns and not any(_BACKREFERENCE.search(pattern.pattern) for _, pattern in patterns):
+            try:
+                self.combined = re.compile('(?:' + '|'.join(
+                    f'(?=[\\s\\S]*?(?:{pattern.pattern}))(?P<r{index}>)' for index, pattern in patterns
+                ) + ')', re.IGNORECASE)
+            except re.error:
+                self.combined = None  # e.g. inline global flags, only allowed at the start of a pattern
+
+    def first(self, text):
+        """Position of the highest-priority regex rule matching text, or None"""
+        if self.combined is not None:
+            found = self.combined.match(text)
+            return int(found.lastgroup[1:]) if found else None
+        for index, pattern in self.patterns:
+            if pattern.search(text):
+                return index
+        return None
+
+    def every(self, text, after=-1):
+        """Positions of all regex rules after the given one matching text"""
+        return [index for index, pattern in self.patterns if index > after and pattern.search(text)]
+
+
+class RuleMatcher:
+    """
+    First-match-by-priority matcher for a list of rules.
+    rules must already be in priority order (as loaded for an import).
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self._contains = _AhoCorasick()
+        self._prefixes = _Trie()
+        self._suffixes = _Trie()
+        self._equals = {}
+        self._conditions = {}  # position -> (amount_min, amount_max, type) for rules that have any
+        patterns = []
+
+        for index, rule in enumerate(self.rules):
+            if rule.operator == 'regex':
+                try:
+                    patterns.append((index, CategorizationRule.compile_pattern(rule.value or '')))
+                except re.error:
+                    pass  # never matches, like CategorizationRule.matches()
+            else:
+                value = CategorizationRule.normalize(rule.value or '')
+                if rule.operator == 'contains':
+                    self._contains.add(value, index)
+                elif rule.operator == 'starts_with':
+                    self._prefixes.add(value, index)
+                elif rule.operator == 'ends_with':
+                    self._suffixes.add(value[::-1], index)
+                elif rule.operator == 'equals':
+                    self._equals.setdefault(value, []).append(index)
+
+            if rule.amount_min is not None or rule.amount_max is not None or rule.condition_type:
+                self._conditions[index] = (
+                    float(rule.amount_min) if rule.amount_min is not None else None,
+                    float(rule.amount_max) if rule.amount_max is not None else None,
+                    rule.condition_type,
+                )
+        self._contains.build()
+        self._regex = _RegexRules(patterns)
+
+    def _find(self, desc):
+        found = self._contains.search(desc)
+        found.extend(self._prefixes.walk(desc))
+        found.extend(self._suffixes.walk(desc[::-1]))
+        found.extend(self._equals.get(desc, ()))
+        return found
+
+    def _accepts(self, index, amount, txn_type):
+        conditions = self._conditions.get(index)
+        if conditions is None:
+            return True
+        amount_min, amount_max, condition_type = conditions
+        if condition_type and txn_type != condition_type:
+            return False
+        if amount_min is not None or amount_max is not None:
+            if amount is None:
+                return False
+            amount = abs(float(amount))
+            if amount_min is not None and amount < amount_min:
+                return False
+            if amount_max is not None and amount > amount_max:
+                return False
+        return True
+
+    def all_matches(self, description, amount=None, txn_type=None):
+        """Every rule matching the transaction, in priority order"""
+        if not description:
+            return []
+        return self.all_matches_normalized(CategorizationRule.normalize(description), amount, txn_type)
+
+    def all_matches_normalized(self, desc, amount=None, txn_type=None):
+        """all_matches() for a description already passed through CategorizationRule.normalize()"""
+        if not desc:
+            return []
+        found = set(self._find(desc))
+        found.update(self._regex.every(desc))
+        return [self.rules[index] for index in sorted(found) if self._accepts(index, amount, txn_type)]
+
+    def match(self, description, amount=None, txn_type=None):
+        """The highest-priority rule matching the transaction, or None"""
+        if not description:
+            return None
+        return self.match_normalized(CategorizationRule.normalize(description), amount, txn_type)
+
+    def match_normalized(self, desc, amount=None, txn_type=None):
+        """match() for a description already passed through CategorizationRule.normalize()"""
+        if not desc:
+            return None
+        found = self._find(desc)
+        best_regex = self._regex.first(desc)
+        if best_regex is not None:
+            found.append(best_regex)
+        if not self._conditions:
+            return self.rules[min(found)] if found else None
+
+        candidates = sorted(set(found))
+        while candidates:
+            index = candidates.pop(0)
+            if self._accepts(index, amount, txn_type):
+                return self.rules[index]
+            if index == best_regex:
+                # Its conditions failed: lower-priority regex rules now count too
+                candidates = sorted(set(candidates).union(self._regex.every(desc, after=index)))
+                best_regex = None
+        return None
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Categorization rule hit statistics
+
+Hits are counted in memory while an import categorizes its rows and
+written with one executemany UPDATE at the end, inside the import's
+transaction. The UPDATE goes through Core, so it neither loads rules into
+the session nor invalidates the compiled rule cache.
+"""
+
+from collections import Counter
+from datetime import datetime, timezone
+from sqlalchemy import update, bindparam
+from models import db
+from models.categorization_rule import CategorizationRule
+
+
+class RuleHits:
+    """Per-rule hit counter for one import"""
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def add(self, rule_id, count=1):
+        if rule_id is not None:
+            self.counts[rule_id] += count
+
+    def flush(self, hit_at=None):
+        """Add the counted hits to the rules and reset the counter; the caller commits"""
+        if not self.counts:
+            return
+        hit_at = hit_at or datetime.now(timezone.utc)
+        table = CategorizationRule.__table__
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('rule_id')).values(
+                hit_count=table.c.hit_count + bindparam('hits'),
+                last_hit_at=bindparam('hit_at'),
+            ),
+            [{'rule_id': rule_id, 'hits': hits, 'hit_at': hit_at} for rule_id, hits in self.counts.items()],
+        )
+        self.counts.clear()
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+JSON export and import of whole categorization rule sets
+
+Rules reference categories by name (with the parent name for
+subcategories) and tags by name, so a rule set can move between
+instances whose IDs differ. An import is validated completely before
+anything is written and is then applied in the caller's single
+transaction; hit statistics are not transferred.
+"""
+
+import logging
+import re
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import delete, func
+from sqlalchemy.orm import selectinload, joinedload
+from models import db
+from models.categorization_rule import CategorizationRule, categorization_rule_tags
+from models.category import Category
+from models.tag import Tag
+from utils.rule_cache import bump_rules_version
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMAT_VERSION = 1
+RULE_OPERATORS = ('contains', 'equals', 'starts_with', 'ends_with', 'regex')
+TRANSACTION_TYPES = ('income', 'expense')
+# Missing categories listed in the error message
+MAX_REPORTED_CATEGORIES = 5
+
+
+class RuleImportError(Exception):
+    """Invalid rule set; the message is safe to show to the user"""
+    pass
+
+
+def _amount(value):
+    return str(value) if value is not None else None
+
+
+def export_rules():
+    """All rules (active or not) in priority order as a JSON-serializable dict"""
+    rules = CategorizationRule.query.order_by(CategorizationRule.priority.asc(), CategorizationRule.id.asc()).options(
+        selectinload(CategorizationRule.tags),
+        joinedload(CategorizationRule.category).joinedload(Category.parent),
+    ).all()
+    return {
+        'version': EXPORT_FORMAT_VERSION,
+        'rules': [
+            {
+                'name': rule.name,
+                'is_active': rule.is_active,
+                'operator': rule.operator,
+                'value': rule.value,
+                'amount_min': _amount(rule.amount_min),
+                'amount_max': _amount(rule.amount_max),
+                'condition_type': rule.condition_type,
+                'category': rule.category.name,
+                'parent_category': rule.category.parent.name if rule.category.parent else None,
+                'type_override': rule.type_override,
+                'tags': sorted(tag.name for tag in rule.tags),
+            }
+            for rule in rules
+        ],
+    }
+
+
+def _parse_amount(value, position):
+    if value is None or value == '':
+        return None
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise RuleImportError(f'Rule {position}: invalid amount "{value}".')
+    if not amount.is_finite() or amount < 0:
+        raise RuleImportError(f'Rule {position}: amounts must be positive numbers.')
+    return amount.quantize(Decimal('0.01'))
+
+
+def _parse_rule(item, position):
+    """Validate one exported rule; returns its column values plus category and tag names"""
+    if not isinstance(item, dict):
+        raise RuleImportError(f'Rule {position}: expected an object.')
+    name = str(item.get('name') or '').strip()
+    operator = item.get('operator')
+    value = str(item.get('value') or '').strip()
+    category = str(item.get('category') or '').strip()
+    if not name or not value or not category or operator not in RULE_OPERATORS:
+        raise RuleImportError(f'Rule {position}: name, operator, value and category are required.')
+
+    if operator == 'regex':
+        try:
+            CategorizationRule.compile_pattern(value)
+        except re.error as e:
+            raise RuleImportError(f'Rule {position}: invalid regular expression: {e}')
+    else:
+        value = CategorizationRule.normalize(value)
+
+    amount_min = _parse_amount(item.get('amount_min'), position)
+    amount_max = _parse_amount(item.get('amount_max'), position)
+    if amount_min is not None and amount_max is not None and amount_min > amount_max:
+        raise RuleImportError(f'Rule {position}: the minimum amount cannot be greater than the maximum.')
+
+    tags = item.get('tags') or []
+    if not isinstance(tags, list):
+        raise RuleImportError(f'Rule {position}: tags must be a list of names.')
+
+    return {
+        'name': name[:100],
+        'is_active': bool(item.get('is_active', True)),
+        'operator': operator,
+        'value': value,
+        'amount_min': amount_min,
+        'amount_max': amount_max,
+        'condition_type': item.get('condition_type') if item.get('condition_type') in TRANSACTION_TYPES else None,
+        'type_override': item.get('type_override') if item.get('type_override') in TRANSACTION_TYPES else None,
+        'category_key': (str(item.get('parent_category') or '').strip() or None, category),
+        # Truncated to the column length here so lookups and new tags use the same name
+        'tag_names': list(dict.fromkeys(str(tag).strip()[:50] for tag in tags if str(tag).strip())),
+    }
+
+
+def parse_rule_set(data):
+    """Validate an exported rule set; returns the parsed rules in priority order"""
+    if not isinstance(data, dict) or not isinstance(data.get('rules'), list):
+        raise RuleImportError('Not a rule export: expected an object with a "rules" list.')
+    if data.get('version', EXPORT_FORMAT_VERSION) != EXPORT_FORMAT_VERSION:
+        raise RuleImportError(f"Unsupported rule export version: {data.get('version')}.")
+    return [_parse_rule(item, position) for position, item in enumerate(data['rules'], start=1)]
+
+
+def _category_ids():
+    """(parent name, name) -> category ID for every category"""
+    rows = db.session.query(Category.id, Category.name, Category.parent_id).all()
+    names = {row.id: row.name for row in rows}
+    return {(names.get(row.parent_id), row.name): row.id for row in rows}
+
+
+def import_rules(data, replace=False):
+    """
+    Import a rule set exported by export_rules().
+
+    With replace, existing rules are deleted first; otherwise the imported
+    rules are appended after them in their exported order. Categories must
+    already exist; missing tags are created. Runs in the current session
+    transaction, the caller commits. Returns the number of rules imported.
+    """
+    parsed = parse_rule_set(data)
+
+    category_ids = _category_ids()
+    missing = list(dict.fromkeys(
+        ' / '.join(part for part in rule['category_key'] if part)
+        for rule in parsed if rule['category_key'] not in category_ids
+    ))
+    if missing:
+        shown = ', '.join(missing[:MAX_REPORTED_CATEGORIES])
+        more = f' and {len(missing) - MAX_REPORTED_CATEGORIES} more' if len(missing) > MAX_REPORTED_CATEGORIES else ''
+        raise RuleImportError(f'Unknown categories: {shown}{more}. Create them first.')
+
+    tag_names = {name for rule in parsed for name in rule['tag_names']}
+    tags = {tag.name: tag for tag in Tag.query.filter(Tag.name.in_(tag_names)).all()} if tag_names else {}
+    for name in sorted(tag_names - tags.keys()):
+        tags[name] = Tag(name=name)
+        db.session.add(tags[name])
+
+    if replace:
+        db.session.execute(delete(categorization_rule_tags))
+        db.session.execute(delete(CategorizationRule))
+        first_priority = 0
+    else:
+        first_priority = (db.session.query(func.max(CategorizationRule.priority)).scalar() or 0) + 1
+
+    db.session.add_all([
+        CategorizationRule(
+            name=rule['name'],
+            priority=first_priority + index,
+            is_active=rule['is_active'],
+            field='description',
+            operator=rule['operator'],
+            value=rule['value'],
+            amount_min=rule['amount_min'],
+            amount_max=rule['amount_max'],
+            condition_type=rule['condition_type'],
+            category_id=category_ids[rule['category_key']],
+            type_override=rule['type_override'],
+            tags=[tags[name] for name in rule['tag_names']],
+        )
+        for index, rule in enumerate(parsed)
+    ])
+    db.session.flush()
+    bump_rules_version(db.session.connection())  # the bulk deletes bypass the flush listener
+    logger.info(f"Imported {len(parsed)} categorization rules{' (replacing existing rules)' if replace else ''}")
+    return len(parsed)
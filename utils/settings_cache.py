@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Process-level cache of the settings table
+
+Each worker process keeps every settings row in memory, loaded with one
+query. A version token in the settings table is replaced in the same
+transaction as any ORM write to a setting (Settings.set_setting() included):
+the writing process drops its copy on commit, and the other workers
+compare the token at most once per SETTINGS_CHECK_INTERVAL, so rendering
+a template normally costs no query at all.
+"""
+
+import time
+import uuid
+from collections import namedtuple
+from itertools import chain
+from sqlalchemy import event, select, update, insert
+from sqlalchemy.orm import Session
+from models import db
+from models.settings import Settings
+
+SETTINGS_VERSION_KEY = 'settings_version'
+
+# Seconds a worker serves its copy before checking the version token again
+SETTINGS_CHECK_INTERVAL = 5
+
+_Snapshot = namedtuple('_Snapshot', 'version values checked_at')
+
+_snapshot = None
+
+
+def bump_settings_version(connection):
+    """Replace the settings version token; runs on the caller's connection and transaction"""
+    settings = Settings.__table__
+    token = uuid.uuid4().hex
+    updated = connection.execute(
+        update(settings).where(settings.c.key == SETTINGS_VERSION_KEY).values(value=token)
+    ).rowcount
+    if not updated:
+        connection.execute(insert(settings).values(key=SETTINGS_VERSION_KEY, value=token))
+
+
+def get_settings_version():
+    return db.session.execute(
+        select(Settings.value).where(Settings.key == SETTINGS_VERSION_KEY)
+    ).scalar()
+
+
+def _load():
+    values = dict(db.session.execute(select(Settings.key, Settings.value)).all())
+    return _Snapshot(values.get(SETTINGS_VERSION_KEY), values, time.monotonic())
+
+
+def get_all_settings():
+    """key -> value for every setting, from the cache while it is current"""
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is None:
+        snapshot = _snapshot = _load()
+    elif time.monotonic() - snapshot.checked_at >= SETTINGS_CHECK_INTERVAL:
+        if get_settings_version() == snapshot.version:
+            snapshot = _snapshot = snapshot._replace(checked_at=time.monotonic())
+        else:
+            snapshot = _snapshot = _load()
+    return snapshot.values
+
+
+def get_setting(key, default=None):
+    """Cached Settings.get_setting()"""
+    values = get_all_settings()
+    return values[key] if key in values else default
+
+
+def get_many(defaults):
+    """Several settings at once: {key: default} -> {key: value or default}"""
+    values = get_all_settings()
+    return {key: values[key] if key in values else default for key, default in defaults.items()}
+
+
+def invalidate_settings_cache():
+    """Drop this process's copy"""
+    global _snapshot
+    _snapshot = None
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_on_settings_change(session, flush_context):
+    if any(isinstance(obj, Settings) for obj in chain(session.new, session.dirty, session.deleted)):
+        bump_settings_version(session.connection())
+        session.info['settings_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    if session.info.pop('settings_changed', False):
+        invalidate_settings_cache()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_on_rollback(session):
+    session.info.pop('settings_changed', None)
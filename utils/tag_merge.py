@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Set-based tag merge
+
+Merging a tag into another rewrites its transaction and rule links with
+one INSERT ... SELECT ... ON CONFLICT DO NOTHING and one DELETE per link
+table, so rows already carrying both tags keep a single link. Nothing is
+loaded through the ORM; the tag stats and the rules version are adjusted
+in the caller's transaction.
+"""
+
+import logging
+from sqlalchemy import select, delete, func, exists, literal
+from models import db
+from models.cashflow import CashflowTransaction, cashflow_transaction_tags
+from models.categorization_rule import categorization_rule_tags
+from models.tag import Tag
+from models.tag_stats import TagStats
+from utils.bulk_insert import dialect_insert
+from utils.rule_cache import bump_rules_version
+from utils.transaction_stats import TagDeltas, apply_stats_deltas
+
+logger = logging.getLogger(__name__)
+
+
+class TagMergeError(Exception):
+    """The merge is not possible; the message is safe to show to the user"""
+    pass
+
+
+def _gained_by_target(source_id, target_id):
+    """Deltas for the transactions tagged with source but not yet with target"""
+    links = cashflow_transaction_tags
+    target_link = links.alias('target_link')
+    deltas = TagDeltas()
+    rows = db.session.execute(
+        select(CashflowTransaction.type, func.count(CashflowTransaction.id),
+               func.coalesce(func.sum(CashflowTransaction.amount), 0))
+        .join(links, links.c.cashflow_transaction_id == CashflowTransaction.id)
+        .where(links.c.tag_id == source_id, ~exists().where(
+            target_link.c.cashflow_transaction_id == links.c.cashflow_transaction_id,
+            target_link.c.tag_id == target_id,
+        ))
+        .group_by(CashflowTransaction.type)
+    ).all()
+    for txn_type, count, total in rows:
+        deltas.add(target_id, txn_type, total, count)
+    return deltas
+
+
+def _move_links(table, owner_column, source_id, target_id):
+    """Point every link of source at target, skipping owners already linked to target"""
+    db.session.execute(
+        dialect_insert(table).from_select(
+            [owner_column, 'tag_id'],
+            select(table.c[owner_column], literal(target_id)).where(table.c.tag_id == source_id),
+        ).on_conflict_do_nothing()
+    )
+    return db.session.execute(delete(table).where(table.c.tag_id == source_id)).rowcount
+
+
+def merge_tag(source, target):
+    """
+    Move every transaction and rule link of source to target and delete source.
+    Returns the number of transaction and rule links moved; the caller commits.
+    """
+    if source.id == target.id:
+        raise TagMergeError('Pick a different tag to merge into.')
+
+    deltas = _gained_by_target(source.id, target.id)
+    moved = {
+        'transactions': _move_links(cashflow_transaction_tags, 'cashflow_transaction_id', source.id, target.id),
+        'rules': _move_links(categorization_rule_tags, 'categorization_rule_id', source.id, target.id),
+    }
+
+    connection = db.session.connection()
+    apply_stats_deltas(connection, deltas)
+    stats_table = TagStats.__table__
+    connection.execute(delete(stats_table).where(stats_table.c.tag_id == source.id))
+    if moved['rules']:
+        bump_rules_version(connection)  # compiled rules carry their tag IDs
+
+    db.session.execute(delete(Tag).where(Tag.id == source.id))
+    logger.info(f"Merged tag {source.id} into {target.id}: {moved}")
+    return moved
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+Denormalized transaction statistics
+
+category_stats and tag_stats hold, per category and per tag, the count
+and sum of income and expense transactions. They are kept current in the
+writing transaction:
+- ORM writes (forms, bulk edit, deletes, tag assignment) through Session
+  flush listeners that diff the old and new category, type, amount and
+  tags of every flushed CashflowTransaction;
+- set-based writes (bulk insert, import rollback, re-applying rules) by
+  calling apply_stats_deltas() with the changes they already know about.
+Deltas are accumulated in memory and written with one upsert and one
+executemany UPDATE per table per flush or statement batch.
+"""
+
+from decimal import Decimal
+from sqlalchemy import event, inspect, update, delete, bindparam, select, func, case
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from models.cashflow import CashflowTransaction, cashflow_transaction_tags
+from models.category import Category
+from models.category_stats import CategoryStats
+from models.tag import Tag
+from models.tag_stats import TagStats
+
+INCOME = 'income'
+EXPENSE = 'expense'
+
+
+class StatsDeltas:
+    """Pending changes to a stats table: key -> [income n, expense n, income sum, expense sum]"""
+    table = None
+    key = None
+
+    def __init__(self):
+        self.changes = {}
+
+    def add(self, key, txn_type, amount, count=1):
+        """Count count transactions (negative to remove) of total amount under key"""
+        if key is None or txn_type not in (INCOME, EXPENSE) or not count:
+            return
+        amount = Decimal(str(amount or 0))
+        change = self.changes.setdefault(key, [0, 0, Decimal('0'), Decimal('0')])
+        if txn_type == INCOME:
+            change[0] += count
+            change[2] += amount if count > 0 else -amount
+        else:
+            change[1] += count
+            change[3] += amount if count > 0 else -amount
+
+    def remove(self, key, txn_type, amount, count=1):
+        self.add(key, txn_type, amount, -count)
+
+    def __bool__(self):
+        return any(any(change) for change in self.changes.values())
+
+
+class CategoryDeltas(StatsDeltas):
+    table = CategoryStats.__table__
+    key = 'category_id'
+
+
+class TagDeltas(StatsDeltas):
+    table = TagStats.__table__
+    key = 'tag_id'
+
+
+def _dialect_insert(connection, table):
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(table)
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+    return sqlite_insert(table)
+
+
+def apply_stats_deltas(connection, *all_deltas):
+    """Write pending deltas on the given connection (the caller's transaction)"""
+    for deltas in all_deltas:
+        changes = {key: change for key, change in deltas.changes.items() if any(change)}
+        if not changes:
+            continue
+        table, key = deltas.table, deltas.key
+        connection.execute(
+            _dialect_insert(connection, table).on_conflict_do_nothing(index_elements=[key]),
+            [{key: value} for value in changes],
+        )
+        connection.execute(
+            update(table).where(table.c[key] == bindparam('stats_key')).values(
+                income_count=table.c.income_count + bindparam('income_count_delta'),
+                expense_count=table.c.expense_count + bindparam('expense_count_delta'),
+                income_total=table.c.income_total + bindparam('income_total_delta'),
+                expense_total=table.c.expense_total + bindparam('expense_total_delta'),
+            ),
+            [
+                {
+                    'stats_key': value,
+                    'income_count_delta': change[0],
+                    'expense_count_delta': change[1],
+                    'income_total_delta': change[2],
+                    'expense_total_delta': change[3],
+                }
+                for value, change in changes.items()
+            ],
+        )
+
+
+def _per_type_sums(key_column):
+    return (
+        key_column,
+        CashflowTransaction.type,
+        func.count(CashflowTransaction.id),
+        func.coalesce(func.sum(CashflowTransaction.amount), 0),
+    )
+
+
+def stats_deltas_for(session, filters, sign=-1):
+    """
+    Category and tag deltas for the transactions matching filters, from one
+    GROUP BY query each (sign -1 to take them out, before deleting them).
+    """
+    category_deltas = CategoryDeltas()
+    rows = session.execute(
+        select(*_per_type_sums(CashflowTransaction.category_id))
+        .where(*filters).group_by(CashflowTransaction.category_id, CashflowTransaction.type)
+    ).all()
+    for category_id, txn_type, count, total in rows:
+        category_deltas.add(category_id, txn_type, total, sign * count)
+
+    tag_deltas = TagDeltas()
+    tag_id = cashflow_transaction_tags.c.tag_id
+    rows = session.execute(
+        select(*_per_type_sums(tag_id))
+        .join(cashflow_transaction_tags, cashflow_transaction_tags.c.cashflow_transaction_id == CashflowTransaction.id)
+        .where(*filters).group_by(tag_id, CashflowTransaction.type)
+    ).all()
+    for tag, txn_type, count, total in rows:
+        tag_deltas.add(tag, txn_type, total, sign * count)
+    return category_deltas, tag_deltas
+
+
+def _load_stats(session, table, key):
+    return {
+        row[key]: {
+            'income': row.income_count,
+            'expense': row.expense_count,
+            'income_total': row.income_total,
+            'expense_total': row.expense_total,
+        }
+        for row in session.execute(select(table)).mappings()
+    }
+
+
+def load_category_stats(session):
+    """category ID -> {'income', 'expense', 'income_total', 'expense_total'} for categories with stats"""
+    return _load_stats(session, CategoryStats.__table__, 'category_id')
+
+
+def load_tag_stats(session):
+    """tag ID -> {'income', 'expense', 'income_total', 'expense_total'} for tags with stats"""
+    return _load_stats(session, TagStats.__table__, 'tag_id')
+
+
+def _rebuild(session, table, key, key_column, join=None):
+    session.execute(delete(table))
+    query = select(
+        key_column,
+        func.sum(case((CashflowTransaction.type == INCOME, 1), else_=0)),
+        func.sum(case((CashflowTransaction.type == EXPENSE, 1), else_=0)),
+        func.coalesce(func.sum(case((CashflowTransaction.type == INCOME, CashflowTransaction.amount), else_=0)), 0),
+        func.coalesce(func.sum(case((CashflowTransaction.type == EXPENSE, CashflowTransaction.amount), else_=0)), 0),
+    )
+    if join is not None:
+        query = query.join(*join)
+    rows = session.execute(query.group_by(key_column)).all()
+    if rows:
+        session.execute(table.insert(), [
+            {
+                key: value,
+                'income_count': income_count,
+                'expense_count': expense_count,
+                'income_total': income_total,
+                'expense_total': expense_total,
+            }
+            for value, income_count, expense_count, income_total, expense_total in rows
+        ])
+
+
+def rebuild_stats(session):
+    """Recompute category_stats and tag_stats from the transaction table (repairs drift; normally unnecessary)"""
+    _rebuild(session, CategoryStats.__table__, 'category_id', CashflowTransaction.category_id)
+    _rebuild(session, TagStats.__table__, 'tag_id', cashflow_transaction_tags.c.tag_id, join=(
+        cashflow_transaction_tags, cashflow_transaction_tags.c.cashflow_transaction_id == CashflowTransaction.id,
+    ))
+
+
+# The old category, type and amount must be known when they change, even if never loaded
+@event.listens_for(CashflowTransaction.category_id, 'set', active_history=True)
+@event.listens_for(CashflowTransaction.type, 'set', active_history=True)
+@event.listens_for(CashflowTransaction.amount, 'set', active_history=True)
+def _keep_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+def _old_value(state, key):
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(state.obj(), key)
+
+
+def _old_and_new_tags(state):
+    history = state.attrs.tags.history
+    unchanged = list(history.unchanged)
+    return unchanged + list(history.deleted), unchanged + list(history.added)
+
+
+def _stats_changed(state):
+    return any(state.attrs[key].history.has_changes() for key in ('category_id', 'type', 'amount', 'tags'))
+
+
+def _tags_needed(state):
+    """A changed type or amount moves the tags' stats; a category-only change does not touch them"""
+    return 'tags' in state.unloaded and any(state.attrs[key].history.has_changes() for key in ('type', 'amount'))
+
+
+def _load_tags(session, transactions):
+    """Populate the tags of transactions (ID -> object) with one IN (...) query instead of one per row"""
+    tags_by_txn = {txn_id: [] for txn_id in transactions}
+    txn_id = cashflow_transaction_tags.c.cashflow_transaction_id
+    rows = session.execute(
+        select(txn_id, Tag).join(Tag, Tag.id == cashflow_transaction_tags.c.tag_id).where(txn_id.in_(transactions))
+    )
+    for transaction_id, tag in rows:
+        tags_by_txn[transaction_id].append(tag)
+    for transaction_id, obj in transactions.items():
+        set_committed_value(obj, 'tags', tags_by_txn[transaction_id])
+
+
+@event.listens_for(Session, 'before_flush')
+def _load_for_stats(session, flush_context, instances):
+    """Load what the stats need while it can still be read, and drop rows of deleted categories/tags"""
+    tags_to_load = {}
+    for obj in session.deleted:
+        if isinstance(obj, CashflowTransaction):
+            obj.category_id, obj.type, obj.amount  # noqa: B018 - loads expired attributes
+            if 'tags' in inspect(obj).unloaded:
+                tags_to_load[obj.id] = obj
+        elif isinstance(obj, Category):
+            table = CategoryStats.__table__
+            session.connection().execute(delete(table).where(table.c.category_id == obj.id))
+        elif isinstance(obj, Tag):
+            table = TagStats.__table__
+            session.connection().execute(delete(table).where(table.c.tag_id == obj.id))
+    for obj in session.dirty:
+        if isinstance(obj, CashflowTransaction) and _tags_needed(inspect(obj)):
+            tags_to_load[obj.id] = obj
+    if tags_to_load:
+        _load_tags(session, tags_to_load)
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_stats_on_flush(session, flush_context):
+    category_deltas = CategoryDeltas()
+    tag_deltas = TagDeltas()
+    for obj in session.new:
+        if isinstance(obj, CashflowTransaction):
+            category_deltas.add(obj.category_id, obj.type, obj.amount)
+            for tag in obj.tags:
+                tag_deltas.add(tag.id, obj.type, obj.amount)
+    for obj in session.deleted:
+        if isinstance(obj, CashflowTransaction):
+            state = inspect(obj)
+            old_type, old_amount = _old_value(state, 'type'), _old_value(state, 'amount')
+            category_deltas.remove(_old_value(state, 'category_id'), old_type, old_amount)
+            for tag in _old_and_new_tags(state)[0]:
+                tag_deltas.remove(tag.id, old_type, old_amount)
+    for obj in session.dirty:
+        if not isinstance(obj, CashflowTransaction):
+            continue
+        state = inspect(obj)
+        if not _stats_changed(state):
+            continue
+        old_type, old_amount = _old_value(state, 'type'), _old_value(state, 'amount')
+        category_deltas.remove(_old_value(state, 'category_id'), old_type, old_amount)
+        category_deltas.add(obj.category_id, obj.type, obj.amount)
+        old_tags, new_tags = _old_and_new_tags(state)
+        for tag in old_tags:
+            tag_deltas.remove(tag.id, old_type, old_amount)
+        for tag in new_tags:
+            tag_deltas.add(tag.id, obj.type, obj.amount)
+    if category_deltas or tag_deltas:
+        apply_stats_deltas(session.connection(), category_deltas, tag_deltas)
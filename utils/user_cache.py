@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Process-level cache of the logged-in user for Flask-Login
+
+load_user() runs before every authenticated request. Each worker keeps a
+detached copy of the user row for USER_CACHE_TTL seconds and attaches it
+to the request's session with merge(load=False), which issues no query;
+routes can still change and commit the user as usual. Any flushed change
+to a user (password or username change) drops the copy on commit; other
+workers pick up a new username when their copy expires. The password hash
+is never cached, so re-authentication always checks the stored one.
+"""
+
+import time
+from itertools import chain
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+from models import db
+from models.user import User
+
+# Seconds a worker trusts its copy of a user row
+USER_CACHE_TTL = 60
+
+_users = {}  # user ID -> (detached User, expires at)
+
+
+def _detached_copy(user):
+    # password_hash is left out: it stays expired on the copy, so check_password()
+    # reads the current hash, even when another worker just changed it
+    copy = User(id=user.id, username=user.username)
+    make_transient_to_detached(copy)
+    return copy
+
+
+def load_user(user_id):
+    """The user with this ID attached to the current session, or None"""
+    entry = _users.get(user_id)
+    if entry is not None and entry[1] > time.monotonic():
+        return db.session.merge(entry[0], load=False)
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        _users.pop(user_id, None)
+        return None
+    _users[user_id] = (_detached_copy(user), time.monotonic() + USER_CACHE_TTL)
+    return user
+
+
+def invalidate_user_cache(user_id=None):
+    """Drop this process's copy of one user, or of all users"""
+    if user_id is None:
+        _users.clear()
+    else:
+        _users.pop(user_id, None)
+
+
+@event.listens_for(Session, 'after_flush')
+def _note_user_changes(session, flush_context):
+    for obj in chain(session.dirty, session.deleted):
+        if isinstance(obj, User):
+            session.info.setdefault('changed_user_ids', set()).add(obj.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    for user_id in session.info.pop('changed_user_ids', ()):
+        invalidate_user_cache(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_on_rollback(session):
+    session.info.pop('changed_user_ids', None)